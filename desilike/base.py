@@ -1,8 +1,10 @@
 import os
 import re
 import sys
+import time
 import copy
 import warnings
+import itertools
 import traceback
 
 import numpy as np
@@ -190,6 +192,25 @@ def _concatenate_results(results, shape, add_dims=True):
     return results
 
 
+def _reshape_batch_results(results, shape):
+
+    def reshape(result):
+        if isinstance(result, Samples):
+            return result.reshape(shape)
+        if result is None or not hasattr(result, 'reshape'):
+            return result
+        return result.reshape(shape + result.shape[1:])
+
+    if isinstance(results, (tuple, list)):
+        return type(results)(reshape(result) for result in results)
+    return reshape(results)
+
+
+def _is_batchable(calculate):
+    # Whether input calculate is a calculator which pipeline can be run in batch mode
+    return isinstance(calculate, BaseCalculator) and calculate.runtime_info.pipeline.batchable
+
+
 def _check_states(states):
     ref, results, errors = None, [], {}
     for state in states:
@@ -212,13 +233,56 @@ def _check_states(states):
 import functools
 # Set map routines
 
-def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_size=100, **kwargs):
+def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_size=100, mpi_schedule='static', mpi_batch_size=1, monitor=None, **kwargs):
+    """
+    Vectorize input function or calculator ``calculate``, which takes a dictionary of parameter values as input.
+
+    Parameters
+    ----------
+    calculate : callable, BaseCalculator
+        Function or calculator to vectorize.
+
+    backend : str, default=None
+        Vectorization backend: ``None`` (standard map, or batch calculation if :attr:`BasePipeline.batchable`),
+        'jax' (:func:`jax.vmap`) or 'mpi' (distribute calculations over MPI processes).
+
+    errors : str, default='raise'
+        If 'raise', raise errors. If 'return', return errors as a dictionary mapping point index to (exception, traceback).
+
+    mpicomm : MPI communicator, default=None
+        For backend 'mpi', MPI communicator. Defaults to ``calculate``'s MPI communicator.
+
+    mpi_max_chunk_size : int, default=100
+        For backend 'mpi' and ``mpi_schedule`` 'static', maximum number of points to scatter at once.
 
+    mpi_schedule : str, default='static'
+        For backend 'mpi', 'static' to scatter equal-size chunks of points to all processes,
+        or 'dynamic' to have the root process send mini-batches of points to processes as soon as they are idle
+        (better load-balancing if calculation time varies much from one point to another; the root process does not calculate).
+
+    mpi_batch_size : int, default=1
+        For backend 'mpi' and ``mpi_schedule`` 'dynamic', number of points sent at once to an idle process.
+
+    monitor : Monitor, default=None
+        For backend 'mpi', :class:`Monitor` in which to count time spent in MPI communications (and, for ``mpi_schedule`` 'dynamic', waiting), as 'mpi_time'.
+        Defaults to ``calculate``'s :attr:`RuntimeInfo.monitor`, if ``calculate`` is a calculator.
+
+    **kwargs : dict
+        Optional arguments for ``calculate``.
+
+    Returns
+    -------
+    wrapper : callable
+    """
     __wrapped__vmap__ = getattr(calculate, '__wrapped__vmap__', None)
     __wrapped__errors__ = getattr(calculate, '__wrapped__errors__', None)
     errors = str(errors)
+    mpi_schedule = str(mpi_schedule)
+    if mpi_schedule not in ['static', 'dynamic']:
+        raise ValueError('mpi_schedule must be one of ["static", "dynamic"], found {}'.format(mpi_schedule))
+    mpi_batch_size = max(int(mpi_batch_size), 1)
 
-    def _calculate_map(params, **kw):
+    def _calculate_map(params, catch=False, **kw):
         for value in params.values():
             size = len(value)
             break
@@ -228,7 +292,7 @@ def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_si
             try:
                 state[0] = calculate({name: value[ivalue] for name, value in params.items()}, **kw)
             except Exception as exc:
-                if errors == 'raise':
+                if errors == 'raise' and not catch:
                     raise exc
                 state[1] = (exc, traceback.format_exc())
             finally:
@@ -243,6 +307,19 @@ def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_si
         def wrapper(params, **kw):
             kw = {**kwargs, **kw}
             params, shape = _check_params(params)
+            if np.prod(shape, dtype='i') and _is_batchable(calculate):
+                # All calculators accept arrays of parameter values: one single call
+                try:
+                    results = calculate(params, batch=True, **kw)
+                except Exception as exc:
+                    if errors == 'raise':
+                        raise exc
+                    # Else, fall back to point-by-point calculation, to locate errors
+                else:
+                    results = _reshape_batch_results(results, shape)
+                    if errors == 'return':
+                        return results, {}
+                    return results
             states = _calculate_map(params, **kw)
             results, errs = _check_states(states)
             results = _concatenate_results(results, shape, add_dims=True)
@@ -269,6 +346,9 @@ def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_si
     if backend == 'mpi':
 
         mpicomm_main = mpicomm
+        if monitor is None:
+            runtime_info = getattr(calculate if __wrapped__vmap__ is None else __wrapped__vmap__, 'runtime_info', None)
+            if runtime_info is not None: monitor = runtime_info.monitor
 
         @functools.wraps(calculate)
         def wrapper(params, mpicomm=None, **kw):
@@ -285,22 +365,14 @@ def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_si
             shape = mpicomm.bcast(shape if mpicomm.rank == 0 else None, root=0)
             all_size = np.prod(shape, dtype='i')
 
-            nchunks = (all_size // mpi_max_chunk_size) + 1
-            all_states = []
-            for ichunk in range(nchunks):  # divide in chunks to save memory for MPI comm
-                chunk_offset = all_size * ichunk // nchunks
-                chunk_params = {}
-                for name in params:
-                    chunk_params[name] = mpi.scatter(params[name][chunk_offset:all_size * (ichunk + 1) // nchunks] if mpicomm.rank == 0 else None, mpicomm=mpicomm, mpiroot=0)
-                if not has_input_mpicomm:
-                    calculate.mpicomm = mpi.COMM_SELF
-                states = []
+            def _calculate_states(chunk_params, chunk_offset, catch=False):
+                # Return list of states, and first error (if any)
                 error = None
                 if __wrapped__vmap__ is None:
-                    states = _calculate_map(chunk_params, **kw)
+                    states = _calculate_map(chunk_params, catch=catch, **kw)
                 else:  # calculate already vmap
                     states = calculate(chunk_params, **kw)
-                    local_chunk_size = len(chunk_params[name])
+                    local_chunk_size = len(next(iter(chunk_params.values()), []))
                     if local_chunk_size:
                         if __wrapped__errors__ != 'return':
                             states = (states, {})  # adding empty error
@@ -310,13 +382,71 @@ def vmap(calculate, backend=None, errors='raise', mpicomm=None, mpi_max_chunk_si
                         states = [states]
                     else:
                         states = []
-                tmp_states = mpicomm.reduce(states, root=0)
+                return states, error
+
+            all_states = []
+            if mpi_schedule == 'dynamic' and mpicomm.size > 1:
+                # Root process sends mini-batches of points to idle processes
+                tasks = None
                 if mpicomm.rank == 0:
-                    all_states += tmp_states
+                    tasks = [(offset, {name: value[offset:offset + mpi_batch_size] for name, value in params.items()}) for offset in range(0, all_size, mpi_batch_size)]
+
+                calculation_time = [0.]
+
+                def _calculate_task(task):
+                    offset, chunk_params = task
+                    t0 = time.time()
+                    try:
+                        states, error = _calculate_states(chunk_params, offset, catch=True)
+                    except Exception as exc:  # not to leave the root process waiting
+                        return [], (exc, traceback.format_exc()), True
+                    finally:
+                        calculation_time[0] += time.time() - t0
+                    if __wrapped__vmap__ is None:
+                        for state in states:
+                            if state[1] is not None:
+                                error = state[1]
+                                break
+                    return states, error, False
+
+                if not has_input_mpicomm:
+                    calculate.mpicomm = mpi.COMM_SELF
+                t0 = time.time()
+                results = mpi.dynamic_map(_calculate_task, tasks, mpiroot=0, mpicomm=mpicomm)
+                if monitor is not None: monitor.increment('mpi_time', time.time() - t0 - calculation_time[0])
                 if not has_input_mpicomm:
                     calculate.mpicomm = mpicomm
-                if errors == 'raise' and error:
+                error = None
+                if mpicomm.rank == 0:
+                    for states, err, failed in results:
+                        all_states += states
+                        # If the full task failed, points are missing: raise anyway
+                        if err is not None and (failed or errors == 'raise') and error is None:
+                            error = err
+                error = mpicomm.bcast(error, root=0)
+                if error is not None:
                     raise PipelineError('found error: {}'.format(error))
+            else:
+                nchunks = (all_size // mpi_max_chunk_size) + 1
+                for ichunk in range(nchunks):  # divide in chunks to save memory for MPI comm
+                    chunk_offset = all_size * ichunk // nchunks
+                    chunk_params = {}
+                    t0 = time.time()
+                    for name in params:
+                        chunk_params[name] = mpi.scatter(params[name][chunk_offset:all_size * (ichunk + 1) // nchunks] if mpicomm.rank == 0 else None, mpicomm=mpicomm, mpiroot=0)
+                    if not has_input_mpicomm:
+                        calculate.mpicomm = mpi.COMM_SELF
+                    t1 = time.time()
+                    states, error = _calculate_states(chunk_params, chunk_offset)
+                    t2 = time.time()
+                    tmp_states = mpicomm.reduce(states, root=0)
+                    if monitor is not None: monitor.increment('mpi_time', t1 - t0 + time.time() - t2)
+                    if mpicomm.rank == 0:
+                        all_states += tmp_states
+                    if not has_input_mpicomm:
+                        calculate.mpicomm = mpicomm
+                    if errors == 'raise' and error:
+                        raise PipelineError('found error: {}'.format(error))
 
             if __wrapped__vmap__ is None:
                 results, errs = _check_states(all_states)
@@ -471,13 +601,25 @@ class BasePipeline(BaseClass):
         for calculator in self.calculators:
             calculator._mpicomm = mpicomm
 
-    def calculate(self, *args, force=None, return_derived=False, **kwargs):
+    @property
+    def batchable(self):
+        """
+        Whether the pipeline can be run in batch mode, i.e. all calculators accept arrays of parameter values
+        (with a leading batch axis, see :attr:`BaseCalculator._calculate_with_batch`), and no parameter is solved.
+        """
+        return all(getattr(calculator, '_calculate_with_batch', False) for calculator in self.calculators) and not self.params.select(solved=True)
+
+    def calculate(self, *args, force=None, return_derived=False, batch=False, **kwargs):
         """
         Calculate, i.e. call calculators' :meth:`BaseCalculator.calculate` if their parameters are updated,
         or if they depend on previous calculation that has been updated.
         Derived parameter values are stored in :attr:`derived`.
+        If ``batch`` is ``True``, input parameter values are 1D arrays (of the same size),
+        which are passed as such to all calculators (which requires :attr:`batchable`).
         """
         params = _params_args_or_kwargs(args, kwargs)
+        if batch and not self.batchable:
+            raise PipelineError('cannot run pipeline in batch mode: all calculators must accept arrays of parameter values (_calculate_with_batch = True), and no parameter be solved')
         if not self._initialized:
             if self.more_initialize is not None: self.more_initialize()
             self._initialized = True
@@ -503,7 +645,7 @@ class BasePipeline(BaseClass):
             runtime_info = calculator.runtime_info
             derived = Samples()
             try:
-                result = runtime_info.calculate(params, force=force)
+                result = runtime_info.calculate(params, force=force, batch=batch)
                 if self.derived is not None:
                     derived = runtime_info.derived
             except Exception:  # we want to keep track of the Exception class, so do not raise PipelineError
@@ -517,15 +659,70 @@ class BasePipeline(BaseClass):
         if self.more_derived and self.derived is not None:
             tmp = self.more_derived()
             if tmp is not None: self.derived.update(tmp)
-        # Now we update self.input_values only with non-traced arrays
-        for name, value in self.input_values.items():
-            value = jax.to_nparray(value)
-            if value is not None: bak_input_values[name] = value
+        # Now we update self.input_values only with non-traced arrays (and not batches of values)
+        if not batch:
+            for name, value in self.input_values.items():
+                value = jax.to_nparray(value)
+                if value is not None: bak_input_values[name] = value
         self.input_values = bak_input_values
         if return_derived:
             return result, self.derived
         return result
 
+    def compile(self, batch_sizes=(1,), return_derived=True):
+        """
+        Compile ahead-of-time (with :mod:`jax`) the vectorized calculation of the pipeline, for batches of ``batch_sizes`` points
+        (input as a dictionary of varied parameter name: array of shape ``(batch_size,)``).
+        Compiled functions are then used (e.g. by samplers) for matching batch sizes, skipping tracing and compilation.
+        With the :mod:`jax` persistent compilation cache (see :meth:`Installer.set_jax_cache_dir`),
+        they are reloaded from disk in subsequent runs (and by other MPI processes), without compilation.
+
+        Parameters
+        ----------
+        batch_sizes : int, list, default=(1,)
+            Batch size(s) to compile the pipeline for.
+
+        return_derived : bool, default=True
+            Whether compiled functions return derived parameters.
+
+        Returns
+        -------
+        compiled : dict
+            Dictionary mapping (batch size, return_derived) to compiled functions.
+        """
+        if jax.jax is None:
+            raise PipelineError('jax is required to compile the pipeline')
+        if np.ndim(batch_sizes) == 0:
+            batch_sizes = [batch_sizes]
+        calculator = self.calculators[-1]
+        calculator()  # initialize before tracing
+        func = vmap(calculator, backend='jax', errors='return', return_derived=return_derived)
+        self._compiled = getattr(self, '_compiled', {})
+        for batch_size in batch_sizes:
+            batch_size = int(batch_size)
+            params = {param.name: jax.jax.ShapeDtypeStruct((batch_size,), 'f8') for param in self.varied_params}
+            t0 = time.time()
+            self._compiled[batch_size, bool(return_derived)] = jax.compile_aot(func, params)
+            self.monitor.increment('jax_compile')
+            self.monitor.increment('jax_compile_time', time.time() - t0)
+        return self._compiled
+
+    def get_compiled(self, params, return_derived=True):
+        """
+        Return function compiled with :meth:`compile` for input ``params`` (dictionary of varied parameter name: array of values),
+        ``None`` if there is none for this batch size.
+        """
+        compiled = getattr(self, '_compiled', {})
+        if not compiled or set(params) != set(self.varied_params.names()):
+            return None
+        shapes = set(np.shape(value) for value in params.values())
+        if len(shapes) != 1:
+            return None
+        shape = shapes.pop()
+        if len(shape) != 1:
+            return None
+        return compiled.get((shape[0], bool(return_derived)), None)
+
     def get_cosmo_requires(self):
         """Return a dictionary mapping section to method's name and arguments,
         e.g. 'background': {'comoving_radial_distance': {'z': z}}."""
@@ -551,6 +748,7 @@ class BasePipeline(BaseClass):
                 #if set(cosmo_requires.keys()) != {'params'}:  # requires a :class:`cosmoprimo.Cosmology` instance as ``cosmo`` attribute
                 calculator.cosmo = cosmo
                 calculator.runtime_info.tocalculate = True
+                calculator.runtime_info.clear_cache()  # state does not only depend on input parameters
 
     def _classify_derived(self, calculators=None, niterations=3, seed=42):
         """
@@ -809,6 +1007,132 @@ class BasePipeline(BaseClass):
             oversample_factors = np.concatenate([np.full(size, factor, dtype='f8') for factor, size in zip(oversample_factors, np.diff(split_block_slices, axis=-1))])
         return sorted_blocks, oversample_factors
 
+    def set_slow_cache(self, params, cache_size=2):
+        """
+        Keep in cache (see :attr:`RuntimeInfo.cache_size`) the last ``cache_size`` states of "slow" calculators,
+        i.e. those that do not depend on (fast) parameters ``params``, either directly or through their requirements,
+        and which state can be restored from cache (``_cache_state = True``, see :class:`BaseCalculator`).
+        This way, alternating between slow parameter values (e.g. between the current and proposed points when dragging fast parameters)
+        does not trigger new calculations of the slow calculators.
+
+        Parameters
+        ----------
+        params : list, ParameterCollection
+            Fast parameters.
+
+        cache_size : int, default=2
+            Minimum number of states to keep in cache for slow calculators.
+
+        Returns
+        -------
+        calculators : list
+            Slow calculators which states are kept in cache.
+        """
+        fast = self._get_dependent_calculators(params)
+        slow = [calculator for calculator in self.calculators if calculator not in fast and calculator._cache_state]
+        for calculator in slow:
+            calculator.runtime_info.cache_size = max(calculator.runtime_info.cache_size, int(cache_size))
+        return slow
+
+    def _get_dependent_calculators(self, params):
+        # Calculators that depend on parameters params, either directly or through their requirements
+        params = [self.params[param] for param in params]
+        toret = []
+        for calculator in self.calculators:  # requirements come first
+            if any(param in calculator.runtime_info.params for param in params) or any(require in toret for require in calculator.runtime_info.requires):
+                toret.append(calculator)
+        return toret
+
+    @property
+    def monitor(self):
+        """
+        Pipeline-level :class:`Monitor` (that of the last calculator, e.g. the likelihood), which also counts calls to (and time in) jax-compiled functions
+        ('jax_compile', 'jax_compile_time', 'jax_run', 'jax_run_time') and time spent in MPI communications in :func:`vmap` ('mpi_time').
+        """
+        return self.calculators[-1].runtime_info.monitor
+
+    def reset_monitor(self, quantities=None):
+        """
+        Reset monitors of all calculators.
+
+        Parameters
+        ----------
+        quantities : str, list, default=None
+            Quantities to monitor, e.g. ``['time', 'mem']`` to also track memory variations (requires package psutil).
+            If ``None``, keep current ones.
+        """
+        for calculator in self.calculators:
+            runtime_info = calculator.runtime_info
+            if quantities is not None:
+                runtime_info.monitor = Monitor(quantities=quantities, max_samples=runtime_info.monitor.max_samples)
+            else:
+                runtime_info.monitor.reset()
+
+    def profile_report(self, percentiles=(50, 90), mpicomm=None):
+        """
+        Return a report of the time spent in each calculator, as tracked by :attr:`RuntimeInfo.monitor` (since the last :meth:`reset_monitor`):
+        number of calls, of calculations (calls for which :meth:`BaseCalculator.calculate` was run), of calls skipped as input parameters did not change,
+        of cache hits (see :attr:`RuntimeInfo.cache_size`), mean and percentiles of the calculation time, total calculation time (and its fraction),
+        memory variations (if monitored, see :meth:`reset_monitor`); then compilation and run time of jax-compiled functions,
+        and time spent in MPI communications (see :attr:`monitor`).
+        This helps deciding which calculators to emulate, or how to set ``oversample_power`` in e.g. :class:`MCMCSampler`.
+
+        Parameters
+        ----------
+        percentiles : tuple, default=(50, 90)
+            Percentiles of the calculation time to report.
+
+        mpicomm : MPI communicator, default=None
+            If not ``None``, sum counts and times over all processes of ``mpicomm`` (which must all call this method).
+
+        Returns
+        -------
+        report : str
+        """
+        percentiles = list(percentiles)
+
+        def reduce(value):
+            if mpicomm is None: return value
+            return mpicomm.allreduce(value)
+
+        rows = []
+        for calculator in self.calculators:
+            monitor = calculator.runtime_info.monitor
+            row = {name: reduce(monitor.count(name)) for name in ['calls', 'skips', 'hits']}
+            row['name'] = calculator.__class__.__name__
+            row['calculated'] = reduce(monitor.counter)
+            row['total'] = reduce(monitor.get('time', average=False))
+            times = monitor.get('time', average=None)
+            if mpicomm is not None: times = np.concatenate(mpicomm.allgather(times))
+            row['mean'] = row['total'] / row['calculated'] if row['calculated'] else np.nan
+            row['percentiles'] = np.percentile(times, percentiles) if times.size else np.full(len(percentiles), np.nan)
+            row['mem'] = reduce(monitor.get('mem', average=False)) if 'mem' in monitor.quantities else None
+            rows.append(row)
+        total = sum(row['total'] for row in rows)
+        with_mem = any(row['mem'] is not None for row in rows)
+        namesize = max([len('calculator')] + [len(row['name']) for row in rows])
+        header = ['{:<{}}'.format('calculator', namesize)] + ['{:>10}'.format(name) for name in ['calls', 'calculated', 'skips', 'hits', 'mean[ms]']]
+        header += ['{:>10}'.format('p{:g}[ms]'.format(q)) for q in percentiles] + ['{:>10}'.format('total[s]'), '{:>8}'.format('frac')]
+        if with_mem: header.append('{:>10}'.format('mem[MB]'))
+        lines = [' '.join(header)]
+        for row in rows:
+            line = ['{:<{}}'.format(row['name'], namesize)] + ['{:>10d}'.format(row[name]) for name in ['calls', 'calculated', 'skips', 'hits']]
+            line += ['{:>10.3f}'.format(1e3 * value) for value in [row['mean']] + list(row['percentiles'])]
+            line += ['{:>10.3f}'.format(row['total']), '{:>8.3f}'.format(row['total'] / total if total else np.nan)]
+            if with_mem: line.append('{:>10.1f}'.format(np.nan if row['mem'] is None else row['mem']))
+            lines.append(' '.join(line))
+        monitor = self.monitor
+        counts = {name: reduce(monitor.count(name)) for name in ['jax_compile', 'jax_compile_time', 'jax_run', 'jax_run_time', 'mpi_time']}
+        if counts['jax_compile'] or counts['jax_run']:
+            lines.append('jax: {:d} compilations in {:.3f} s; {:d} calls in {:.3f} s ({:.3f} ms per call).'.format(counts['jax_compile'], counts['jax_compile_time'], counts['jax_run'],
+                         counts['jax_run_time'], 1e3 * counts['jax_run_time'] / counts['jax_run'] if counts['jax_run'] else np.nan))
+        if counts['mpi_time']:
+            lines.append('MPI communications (scatter / reduce) in vmap: {:.3f} s.'.format(counts['mpi_time']))
+        return '\n'.join(lines)
+
+
+_cache_versions = itertools.count()
+
 
 class RuntimeInfo(BaseClass):
     """
@@ -821,6 +1145,17 @@ class RuntimeInfo(BaseClass):
 
     speed : float
         Inverse of number of iterations per second.
+
+    cache_size : int
+        Maximum number of calculator states (:meth:`BaseCalculator.__getstate__`) to keep in memory,
+        to be restored (with :meth:`BaseCalculator.__setstate__`) when the calculator is called again
+        with the same input parameter values (and same state of the calculators it depends on);
+        :meth:`BaseCalculator.get` is then called on the restored state. Defaults to 0 (no cache). Number of cache hits / misses are tracked by :attr:`monitor`.
+        Only relevant for calculators which :meth:`BaseCalculator.__getstate__` returns their full state.
+
+    monitor : Monitor
+        Monitor of calculation time, number of calls ('calls'), of calls skipped as input parameters did not change ('skips'),
+        and cache 'hits' and 'misses'. See :meth:`BasePipeline.profile_report`.
     """
     installer = None
 
@@ -847,6 +1182,8 @@ class RuntimeInfo(BaseClass):
         self._initialized = False
         self._initialized_for_pipeline = []
         self._tocalculate = True
+        self._batch = False
+        self.cache_size = 0
         self.calculated = False
         self.name = self.calculator.__class__.__name__
         self._initialize_with_namespace = False
@@ -893,7 +1230,7 @@ class RuntimeInfo(BaseClass):
                     if name in state: value = state[name]
                     else: value = getattr(self.calculator, name)
                     array = ParameterArray(value, param=param)
-                    array.param._shape = array.shape  # a bit hacky, but no need to update parameters for this...
+                    array.param._shape = array.shape[1:] if self._batch else array.shape  # a bit hacky, but no need to update parameters for this...
                     self._derived.set(array)
         return self._derived
 
@@ -980,6 +1317,40 @@ class RuntimeInfo(BaseClass):
                         self._requires.append(value)
         return self.calculator
 
+    @property
+    def cache_size(self):
+        """Maximum number of calculator states to keep in cache."""
+        return self._cache_size
+
+    @cache_size.setter
+    def cache_size(self, cache_size):
+        """Set maximum number of calculator states to keep in cache."""
+        self._cache_size = int(cache_size)
+        if getattr(self, '_cache', None) is None:
+            self.clear_cache()
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """Clear cache of calculator states."""
+        from collections import OrderedDict
+        self._cache = OrderedDict()
+        # Unique version, such that states of calculators depending on this one are not wrongly retrieved from cache
+        self._cache_version = next(_cache_versions)
+
+    def _get_state_key(self):
+        # Hashable key identifying the calculator state, given its input values and the state of the calculators it depends on
+        keys = [self._cache_version]
+        for require in self.requires:
+            key = getattr(require.runtime_info, '_state_key', None)
+            if key is None: return None
+            keys.append(key)
+        for name, value in self.input_values.items():
+            value = jax.to_nparray(value)
+            if value is None: return None  # jax tracer
+            keys.append((name, value.dtype.str, value.shape, value.tobytes()))
+        return tuple(keys)
+
     @property
     def tocalculate(self):
         """Should calculator's :class:`BaseCalculator.calculate` be called?"""
@@ -989,12 +1360,14 @@ class RuntimeInfo(BaseClass):
     def tocalculate(self, tocalculate):
         self._tocalculate = tocalculate
 
-    def calculate(self, params, force=None):
+    def calculate(self, params, force=None, batch=False):
         """
         If calculator's :class:`BaseCalculator.calculate` has not be called with input parameter values, call it,
         keeping track of running time with :attr:`monitor`.
+        If ``batch`` is ``True``, input parameter values are arrays with a leading batch axis.
         """
         self.params
+        self.monitor.increment('calls')
         #print('calculate', force, type(self.calculator), self.tocalculate, self._tocalculate, any(require.runtime_info.calculated for require in self.requires))
         for name, value in params.items():
             name = str(name)
@@ -1007,23 +1380,43 @@ class RuntimeInfo(BaseClass):
                     if value is not self.input_values[basename]:  # jax
                         self._tocalculate = True
                 else:
-                    if type(invalue) != type(self.input_values[basename]) or invalue != self.input_values[basename]:
+                    refvalue = self.input_values[basename]
+                    if type(invalue) != type(refvalue) or invalue.shape != np.shape(refvalue) or np.any(invalue != refvalue):
                         self._tocalculate = True
                         #print(self.calculator, invalue, self.input_values[basename], type(invalue), type(self.input_values[basename]), invalue == self.input_values[basename])
                 if invalue is not None:
                     value = invalue
                 self.input_values[basename] = value
-        if self.tocalculate:
+        tocalculate = self.tocalculate
+        if tocalculate:
+            # If cache is disabled, unique key (new calculation), only used by calculators depending on this one
+            self._state_key = self._get_state_key() if self._cache_size else next(_cache_versions)
+        if tocalculate and self._cache_size and self._state_key is not None and self._state_key in self._cache:
+            self.monitor.increment('hits')
+            self._cache.move_to_end(self._state_key)
+            state, self._batch = self._cache[self._state_key]
+            self.calculator.__setstate__(dict(state))
+            self._derived = None
+            self.calculated = True
+            self._get = self.calculator.get()  # get() may have side effects, e.g. likelihood's logprior
+        elif tocalculate:
             #print(self.calculator, self.input_values)
             self._calculation = True
             self.monitor.start()
             self.calculator.calculate(**self.input_values)
             self._derived = None
+            self._batch = batch
             self.calculated = True
             self._get = self.calculator.get()
             self.monitor.stop()
             self._calculation = False
+            if self._cache_size and self._state_key is not None:
+                self.monitor.increment('misses')
+                self._cache[self._state_key] = (dict(self.calculator.__getstate__()), self._batch)
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)  # remove least recently used
         else:
+            self.monitor.increment('skips')
             self.calculated = False
         self._tocalculate = False
         return self._get
@@ -1033,9 +1426,10 @@ class RuntimeInfo(BaseClass):
         return self.__dict__.copy()
 
     def clear(self, **kwargs):
-        calculator, init = self.calculator, self.init
+        calculator, init, cache_size = self.calculator, self.init, getattr(self, '_cache_size', 0)
         self.__dict__.clear()
         self.__init__(calculator, init=init)
+        self.cache_size = cache_size  # user setting, kept
         self.update(**kwargs)
 
     def update(self, *args, **kwargs):
@@ -1064,7 +1458,17 @@ class BaseCalculator(BaseClass):
     - :meth:`calculate`: takes in parameter values, and do some calculation
     - :meth:`get`: returns the quantity of interest
 
+    Calculators which :meth:`calculate` accepts arrays of parameter values (with a leading batch axis),
+    and sets attributes accordingly, can declare ``_calculate_with_batch = True``;
+    pipelines made of such calculators only are evaluated in one call by :func:`vmap`.
+
+    Calculators which :meth:`__getstate__` returns their full state, such that it can be restored on the calculator itself
+    with :meth:`__setstate__`, can declare ``_cache_state = True``; the states of such "slow" calculators
+    are kept in cache by :meth:`BasePipeline.set_slow_cache`.
     """
+    _calculate_with_batch = False
+    _cache_state = False
+
     def __new__(cls, *args, **kwargs):
         cls_info = Info(getattr(cls, '_info', {}))
         cls_init = InitConfig(data=getattr(cls, '_init', {}))
@@ -182,11 +182,49 @@ def deriv_grid(grids, current_order=0):
     return toret
 
 
+def sparse_deriv_grid(grids, is_needed):
+    """
+    Return grid of points where to compute function to estimate the derivatives selected by ``is_needed``.
+    Contrary to :func:`deriv_grid`, only the points of the stencils of the required derivatives are returned;
+    points shared between stencils appear once.
+
+    Parameters
+    ----------
+    grids : list
+        List of tuples (1D grid coordinates, array of (minimum) derivative orders corresponding to 1D grid, derivative accuracy).
+
+    is_needed : callable
+        Function taking a list of derivative orders (one for each grid) and returning ``True`` if the corresponding derivative is to be estimated.
+        If ``False`` for some orders, it must be ``False`` for all orders larger than or equal to these (for all grids).
+
+    Returns
+    -------
+    grid : list
+        List of coordinates.
+    """
+    ngrids = len(grids)
+    toret = []
+
+    def callback(igrid, orders, points):
+        if igrid == ngrids:
+            toret.extend(list(point) for point in itertools.product(*points))
+            return
+        grid, gorders = grids[igrid][:2]
+        for order in np.unique(gorders):
+            norders = orders + [order]
+            if not is_needed(norders + [0] * (ngrids - igrid - 1)):
+                continue  # and the same for any higher orders
+            callback(igrid + 1, norders, points + [grid[gorders == order]])
+
+    callback(0, [], [])
+    return toret
+
+
 class Differentiation(BaseClass):
 
     """Estimate derivatives of ``calculator`` quantities, with auto- or finite-differentiation."""
 
-    def __init__(self, calculator, getter=None, order=1, method=None, accuracy=2, delta_scale=1., mpicomm=None):
+    def __init__(self, calculator, getter=None, order=1, method=None, accuracy=2, delta_scale=1., total_order=None, cross_order=None, mpicomm=None):
         """
         Initialize differentiation.
 
@@ -219,6 +257,17 @@ class Differentiation(BaseClass):
             Parameter grid ranges for the estimation of finite derivatives are inferred from parameters' :attr:`Parameter.delta`.
             These values are then scaled by ``delta_scale`` (< 1. means smaller ranges).
 
+        total_order : int, default=None
+            If not ``None``, maximum total order of derivatives (e.g. 2 for :math:`\\partial_{x}^{2}` and :math:`\\partial_{x} \\partial_{y}`).
+            Derivatives w.r.t. parameter ``x`` are anyway limited to total order ``order[x]``.
+
+        cross_order : int, dict, default=None
+            A dictionary mapping parameter name (including wildcard) to maximum total order of mixed derivatives involving this parameter.
+            A mixed derivative w.r.t. ``x`` and ``y`` is estimated if its total order is less than or equal to both ``cross_order[x]`` and ``cross_order[y]``.
+            If a single value is provided, applies to all varied parameters. If ``None``, no additional restriction.
+            Finite differentiation is then only performed on the points required to estimate the selected derivatives,
+            which reduces the number of calculator evaluations when many parameters are varied.
+
         mpicomm : mpi.COMM_WORLD, default=None
             MPI communicator. If ``None``, defaults to ``calculator``'s :attr:`BaseCalculator.mpicomm`.
         """
@@ -244,6 +293,11 @@ class Differentiation(BaseClass):
             if value is None: value = 0
             self.order[param] = int(value)
 
+        self.total_order = None if total_order is None else int(total_order)
+        self.cross_order = expand_dict(cross_order, self.varied_params.names())
+        for param, value in self.cross_order.items():
+            self.cross_order[param] = None if value is None else int(value)
+
         self.getter = getter
 
         if getter is None:
@@ -281,7 +335,7 @@ class Differentiation(BaseClass):
                 continue
             if method in [None, 'auto']:
                 try:
-                    self._calculate({param: [self.pipeline.input_values[param]]}, autoderivs=[(), (param,)])  # This takes time because the model is evaluated for each parameter
+                    self._calculate({param: [self.pipeline.input_values[param]]}, autoderivs=[(), (param,)], batch=False)  # This takes time because the model is evaluated for each parameter
                 except Exception as exc:
                     if method is None:
                         method = 'finite'
@@ -339,7 +393,15 @@ class Differentiation(BaseClass):
 
         self._grid_samples = self._grid_cidx = None
         if mpicomm.rank == 0:
-            samples = np.array(deriv_grid(grids)).T
+
+            def is_needed(orders):
+                orders = dict(zip(self.varied_params.names(), orders))
+                total = sum(orders.values())
+                if total and total > min(self.order[param] for param, order in orders.items() if order):
+                    return False
+                return self._is_needed(orders)
+
+            samples = np.array(sparse_deriv_grid(grids, is_needed)).T
             self._grid_samples = Samples(samples, params=self.varied_params)
             self._grid_cidx = True
             for array, grid in zip(self._grid_samples, grids):
@@ -349,7 +411,10 @@ class Differentiation(BaseClass):
                 self._grid_cidx &= np.isclose(array, center, rtol=0., atol=atol)
             self._grid_cidx = tuple(np.flatnonzero(self._grid_cidx))
             assert len(self._grid_cidx) == 1
-            self.log_info('Differentiation will evaluate {:d} points.'.format(len(self._grid_samples)))
+            if self.total_order is not None or any(order is not None for order in self.cross_order.values()):
+                self.log_info('Differentiation will evaluate {:d} points (instead of {:d} without restrictions on total and cross orders).'.format(len(self._grid_samples), len(deriv_grid(grids))))
+            else:
+                self.log_info('Differentiation will evaluate {:d} points.'.format(len(self._grid_samples)))
         self._grid_cidx = mpicomm.bcast(self._grid_cidx, root=0)
         autoparams, autoorder, self.autoderivs = [], [], []
         for param, method in self.method.items():
@@ -376,7 +441,42 @@ class Differentiation(BaseClass):
                 if grid_samples is not None: self._grid_samples = grid_samples
         self._mpicomm = mpicomm
 
-    def _calculate(self, params, autoderivs=None):
+    def _is_needed(self, degree):
+        # Whether derivative of degree (dict mapping parameter names to orders) is allowed by total_order and cross_order
+        degree = {param: order for param, order in degree.items() if order}
+        total = sum(degree.values())
+        if self.total_order is not None and total > self.total_order:
+            return False
+        for param1, param2 in itertools.combinations(degree, 2):
+            for param in [param1, param2]:
+                if self.cross_order[param] is not None and total > self.cross_order[param]:
+                    return False
+        return True
+
+    @staticmethod
+    def _get_batch_calculate(calculate, names, autoderivs):
+        # Return function computing calculate and its (nested) Jacobians w.r.t. autoderivs, jitted and vmapped over input points,
+        # and dictionary filled in at tracing time with the getter output and size
+        info = {}
+
+        def func(*values):
+            toret = [calculate(*values)]
+            info['getter_inst'] = dict.fromkeys(getter_inst) if isinstance(getter_inst, dict) else None  # tracers not needed
+            info['getter_size'] = getter_size
+            size = sum(int(np.prod(jnp.shape(value), dtype='i8')) for value in toret[0])
+            jac = calculate
+            for autoderiv in autoderivs[1:]:
+                argnums = [names.index(p) for p in autoderiv]
+                # Forward-mode takes one pass per input, reverse-mode one pass per output
+                funcname = 'jacrev' if size < len(argnums) else 'jacfwd'
+                jac = getattr(jax, funcname)(jac, argnums=argnums, has_aux=False, holomorphic=False)
+                toret.append(jac(*values))
+                size *= len(argnums)
+            return toret
+
+        return jax.jit(jax.vmap(func)), info
+
+    def _calculate(self, params, autoderivs=None, batch=True):
         if autoderivs is None:
             autoderivs = self.autoderivs
 
@@ -414,6 +514,15 @@ class Differentiation(BaseClass):
         nchunks = (csize // max_chunk_size) + 1
         import traceback
 
+        batch_key = batch_calculate = None
+        if batch and jax is not None:
+            # Try to evaluate all points of a chunk in one call; the jitted function is kept for later calls
+            batch_key = (tuple(names), tuple(tuple(autoderiv) for autoderiv in autoderivs))
+            self._batch_calculate = getattr(self, '_batch_calculate', {})
+            if batch_key not in self._batch_calculate:
+                self._batch_calculate[batch_key] = self._get_batch_calculate(__calculate, names, autoderivs)
+            batch_calculate = self._batch_calculate[batch_key]
+
         for ichunk in range(nchunks):  # divide in chunks to save memory for MPI comm
             self.pipeline.mpicomm = mpi.COMM_SELF
             chunk_params = {}
@@ -422,6 +531,20 @@ class Differentiation(BaseClass):
                 chunk_size = len(chunk_params[name])
 
             tmp_samples, errors = [], []
+            if batch_calculate is not None and chunk_size:
+                try:
+                    results = batch_calculate[0](*[jnp.asarray(chunk_params[name]) for name in names])
+                    results = jax.tree_util.tree_map(np.asarray, results)
+                except Exception:
+                    self.log_debug('Could not jit and vmap calculation, falling back to point-by-point calculation. Error was {}.'.format(traceback.format_exc()))
+                    batch_calculate = self._batch_calculate[batch_key] = None
+                else:
+                    for ivalue in range(chunk_size):
+                        tmp_samples.append(jax.tree_util.tree_map(lambda array: array[ivalue], results))
+                    getter_inst, getter_size = batch_calculate[1]['getter_inst'], batch_calculate[1]['getter_size']
+                    # Calculators hold jax tracers after the batched call: recalculate at a concrete point (the last one, as point-by-point)
+                    self.pipeline.calculate({name: chunk_params[name][-1] for name in names})
+                    chunk_size = 0  # all done
             for ivalue in range(chunk_size):
                 chunk_values = [chunk_params[name][ivalue] for name in chunk_params]
                 tmp_i_samples = []
@@ -511,7 +634,7 @@ class Differentiation(BaseClass):
                         else:
                             nautodegree = autodegree
                             nautoindex = autoindex
-                        if nautodegree in degrees:
+                        if nautodegree in degrees or not self._is_needed(nautodegree):
                             continue
                         nautodegrees.append(nautodegree)
                         nautoindices.append(nautoindex)
@@ -529,7 +652,7 @@ class Differentiation(BaseClass):
                                 if sum(orders) + autoorder > min(order for o, order in zip(orders, finiteorder) if o):
                                     continue
                                 degree = nautodegree + Deriv(dict(zip(finiteparams, orders)))
-                                if degree in degrees:
+                                if degree in degrees or not self._is_needed(degree):
                                     continue
                                 orders = [(iparam, order, accuracy) for iparam, (order, accuracy) in enumerate(zip(orders, finiteaccuracy)) if order > 0]
                                 dx = [deriv_nd(X, y, orders, center=center, atol=0.) for y in Y]
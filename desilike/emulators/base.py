@@ -9,6 +9,7 @@ from desilike.jax import numpy as jnp
 from desilike.utils import BaseClass, serialize_class, import_class, expand_dict
 from desilike.io import BaseConfig
 from desilike.parameter import Parameter, ParameterArray, Samples, ParameterCollection, ParameterConfig
+from desilike.samples import SampleStore
 
 
 def find_uniques(li):
@@ -190,7 +191,7 @@ class Emulator(BaseClass):
             return [name for name in self.varied_params if name in self.yaml_data[index]['params']]
         return self.varied_params.copy()
 
-    def set_samples(self, name=None, samples=None, **kwargs):
+    def set_samples(self, name=None, samples=None, store=None, **kwargs):
         """
         Set samples for :meth:`fit`.
 
@@ -204,6 +205,10 @@ class Emulator(BaseClass):
             Samples containing ``calculator.varied_params`` and calculator's derived attributes :attr:`varied`.
             If ``None``, samples will be generated using engines' :meth:`BaseEmulatorEngine.get_default_samples` methods.
 
+        store : str, Path, SampleStore, default=None
+            If ``samples`` is ``None``, optionally, path to (or) :class:`SampleStore` where calculator evaluations are saved on the fly.
+            If the store already contains evaluations (e.g. from an interrupted run), these are not computed again.
+
         **kwargs : dict
             If ``samples`` is ``None``, optional arguments for :meth:`BaseEmulatorEngine.get_default_samples`.
         """
@@ -218,7 +223,17 @@ class Emulator(BaseClass):
         else:
             engine = name
         if self.mpicomm.bcast(samples is None, root=0):
-            samples = engine.get_default_samples(self.calculator, **kwargs)
+            if store is not None and self.mpicomm.rank == 0 and not isinstance(store, SampleStore):
+                store = SampleStore(store)
+            if getattr(engine, '_samples_with_store', False):
+                samples = engine.get_default_samples(self.calculator, store=store, **kwargs)
+            elif self.mpicomm.bcast(store is not None and len(store) > 0 if self.mpicomm.rank == 0 else None, root=0):
+                # Samples are computed all at once (e.g. derivatives): simply reload them
+                samples = store.load(mmap=False) if self.mpicomm.rank == 0 else None
+            else:
+                samples = engine.get_default_samples(self.calculator, **kwargs)
+                if self.mpicomm.rank == 0 and store is not None:
+                    store.append(samples)
         elif self.mpicomm.rank == 0:
             samples = samples if isinstance(samples, Samples) else Samples.load(samples)
         tmp = None
@@ -272,7 +287,10 @@ class Emulator(BaseClass):
 
         for name in names:
             self.engines[name] = engine = self.engines[name].copy()
-            engine.fit(*_get_X_Y(self.samples[name], name, getattr(engine, '_samples_with_derivs', False)), **kwargs)
+            engine_kwargs = dict(kwargs)
+            if getattr(engine, '_fit_with_params', False):
+                engine_kwargs['params'] = ParameterCollection([self.params[param] for param in self._get_varied_params(name)])
+            engine.fit(*_get_X_Y(self.samples[name], name, getattr(engine, '_samples_with_derivs', False)), **engine_kwargs)
 
     def predict(self, **params):
         X = jnp.array([params[name] for name in self.varied_params])
@@ -397,6 +415,133 @@ class Emulator(BaseClass):
 
         return self.mpicomm.bcast(toret, root=0)
 
+    def active_learning(self, likelihood, chi2_target=0.1, niterations=10, nsamples=100, ncandidates=10, delta_chi2=25., chain=None, fit_kwargs=None, seed=None):
+        r"""
+        Iteratively add training samples where the emulator is likely to be worst, and refit, until the error on the likelihood is small enough.
+        At each iteration:
+
+        - ``ncandidates * nsamples`` candidate points are drawn, from ``chain`` if provided, else with QMC (same box as :class:`QMCSampler`)
+        - candidates are evaluated with the emulated likelihood (cheap); among those with :math:`\chi^{2}` within ``delta_chi2`` of the minimum,
+          the ``nsamples`` points furthest from the current training samples are selected
+        - the likelihood with the original calculator is evaluated at these points, with :func:`vmap` (MPI backend);
+          the :math:`\chi^{2}` error of the emulated likelihood, :math:`2 |\Delta \ln \mathcal{L}|`, is computed at these points
+        - if the maximum error is below ``chi2_target``, stop; else add these points to the training samples and call :meth:`fit`
+
+        Parameters
+        ----------
+        likelihood : callable
+            Function that takes a calculator as input (input calculator or its emulator), and returns the corresponding likelihood.
+
+        chi2_target : float, default=0.1
+            Target maximum :math:`\chi^{2}` error of the emulated likelihood.
+
+        niterations : int, default=10
+            Maximum number of iterations.
+
+        nsamples : int, default=100
+            Number of points to add to training samples at each iteration.
+
+        ncandidates : int, default=10
+            Number of candidate points drawn for each point to add.
+
+        delta_chi2 : float, default=25.
+            Candidate points are selected within ``delta_chi2`` of the minimum (emulated) :math:`\chi^{2}`.
+
+        chain : Samples, Chain, default=None
+            Optionally, chain (e.g. obtained with the current emulator) to draw candidate points from.
+
+        fit_kwargs : dict, default=None
+            Optional arguments for :meth:`fit`.
+
+        seed : int, default=None
+            Random seed.
+
+        Returns
+        -------
+        converged : bool
+            ``True`` if the :math:`\chi^{2}` error target is met.
+        """
+        if self.is_calculator_sequence:
+            raise ValueError('active learning is not implemented for a sequence of calculators; use one emulator per calculator')
+        names = list(self.engines.keys())
+        if any(getattr(engine, '_samples_with_derivs', False) for engine in self.engines.values()):
+            raise ValueError('active learning requires engines fitted on samples without derivatives, e.g. {}'.format(get_engine('mlp').__class__.__name__))
+        unique_samples = find_uniques(self.samples.values())
+        if len(unique_samples) != 1 or any(name not in self.samples for name in names):
+            raise ValueError('active learning requires the same samples for all engines; call set_samples() first')
+        fit_kwargs = dict(fit_kwargs or {})
+        from scipy import spatial
+        from scipy.stats import qmc
+        from desilike.samplers.qmc import get_qmc_engine
+
+        derived_params = self.pipeline.params.select(name=names, derived=True)
+        reference = likelihood(self.calculator)
+        # Parameters of the calculators of the user's pipeline, restored at the end
+        params_bak = [(calculator, calculator.runtime_info.params.deepcopy()) for calculator in reference.runtime_info.pipeline.calculators]
+        try:
+            # To get calculator's quantities to emulate, for training
+            reference.runtime_info.pipeline._set_derived([self.calculator], params=[[param.basename for param in derived_params]])
+            emulated = likelihood(self.to_calculator())
+            vreference = vmap(reference, backend='mpi', return_derived=True)
+            vemulated = vmap(emulated, backend='mpi')
+            varied_params = [self.params[name] for name in self.varied_params]
+            scale = np.array([param.proposal for param in varied_params], dtype='f8')
+            lower, upper = [param.value - param.proposal for param in varied_params], [param.value + param.proposal for param in varied_params]
+            rng = np.random.RandomState(seed=seed)
+            qmc_engine = get_qmc_engine('rqrs')(d=len(varied_params))
+            converged = False
+
+            for iteration in range(niterations):
+                samples = self.samples[names[0]]
+                candidates = None
+                if self.mpicomm.rank == 0:
+                    ntotal = ncandidates * nsamples
+                    if chain is not None:
+                        weight = np.ravel(getattr(chain, 'weight', np.ones(chain.size)))
+                        indices = rng.choice(chain.size, size=ntotal, replace=True, p=weight / weight.sum())
+                        candidates = np.column_stack([np.ravel(chain[name])[indices] for name in self.varied_params])
+                    else:
+                        candidates = qmc.scale(qmc_engine.random(n=ntotal), lower, upper)
+                logl = vemulated({name: candidates[:, iparam] if self.mpicomm.rank == 0 else None for iparam, name in enumerate(self.varied_params)})
+                points = None
+                if self.mpicomm.rank == 0:
+                    logl = np.ravel(logl)
+                    mask = np.isfinite(logl)
+                    mask &= logl >= np.max(logl[mask]) - delta_chi2 / 2.
+                    candidates = candidates[mask]
+                    # Select points furthest away from current training samples
+                    training = np.column_stack([np.ravel(samples[name]) for name in self.varied_params]) / scale
+                    distances = spatial.cKDTree(training).query(candidates / scale, k=1)[0]
+                    points = candidates[np.argsort(distances)[::-1][:nsamples]]
+                points = {name: points[:, iparam] if self.mpicomm.rank == 0 else None for iparam, name in enumerate(self.varied_params)}
+                logl_reference, derived = vreference(points)
+                logl_emulated = vemulated(points)
+                if self.mpicomm.rank == 0:
+                    chi2_error = 2. * np.abs(np.ravel(logl_emulated) - np.ravel(logl_reference))
+                    chi2_error = chi2_error[np.isfinite(chi2_error)]
+                    converged = chi2_error.size > 0 and np.max(chi2_error) < chi2_target
+                    self.diagnostics['chi2_error'] = self.diagnostics.get('chi2_error', []) + [np.max(chi2_error)]
+                    self.log_info('Active learning iteration {:d}: chi2 error mean = {:.3g}, max = {:.3g} (target {:.3g}) with {:d} training samples.'.format(iteration, np.mean(chi2_error), np.max(chi2_error), chi2_target, samples.size))
+                converged = self.mpicomm.bcast(converged, root=0)
+                if converged:
+                    break
+                if self.mpicomm.rank == 0:
+                    new = Samples(attrs=samples.attrs)
+                    for param in varied_params:
+                        new[param] = points[param.name]
+                    for param in derived_params:
+                        new[param.clone(namespace=None)] = derived[param.name]
+                    samples = Samples.concatenate(samples, new)
+                for name in names:
+                    self.samples[name] = samples if self.mpicomm.rank == 0 else None
+                self.fit(name=names, **fit_kwargs)
+        finally:
+            for calculator, params in params_bak:
+                calculator.runtime_info.params = params
+        if self.mpicomm.rank == 0 and not converged:
+            self.log_warning('Active learning did not reach chi2 error target {:.3g} after {:d} iterations.'.format(chi2_target, niterations))
+        return converged
+
     def plot(self, name=None, nmax=100, fn=None, kw_save=None, show=False, **kwargs):
         """
         Plot comparison between input calculator and its emulator.
@@ -579,10 +724,11 @@ class PointEmulatorEngine(BaseEmulatorEngine):
 
     """Basic emulator that returns constant prediction."""
     name = 'point'
+    _samples_with_store = True
 
-    def get_default_samples(self, calculator):
+    def get_default_samples(self, calculator, store=None):
         from desilike.samplers import GridSampler
-        sampler = GridSampler(calculator, size=1)
+        sampler = GridSampler(calculator, size=1, store=store)
         sampler.run()
         return sampler.samples
 
@@ -4,7 +4,6 @@ from desilike import utils
 from desilike.jax import numpy as jnp
 from desilike.jax import jit
 from .base import BaseEmulatorEngine
-from desilike import mpi
 
 
 def _make_tuple(obj, length=None):
@@ -50,6 +49,7 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
         By default, all components are kept.
     """
     name = 'mlp'
+    _samples_with_store = True
 
     def initialize(self, varied_params, nhidden=(100, 100, 100), ytransform='', npcs=None, engine='rqrs', niterations=int(1e5)):
         self.nhidden = tuple(nhidden)
@@ -57,7 +57,7 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
         self.ytransform = str(ytransform)
         self.sampler_options = dict(engine=engine, niterations=niterations)
 
-    def get_default_samples(self, calculator, **kwargs):
+    def get_default_samples(self, calculator, store=None, **kwargs):
         """
         Returns samples.
 
@@ -72,16 +72,19 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
 
         niterations : int, default=300
             Number of samples to draw.
+
+        store : SampleStore, default=None
+            If not ``None``, store where calculator evaluations are appended on the fly, see :class:`QMCSampler`.
         """
         from desilike.samplers import QMCSampler
         options = {**self.sampler_options, **kwargs}
-        sampler = QMCSampler(calculator, engine=options['engine'], mpicomm=self.mpicomm)
+        sampler = QMCSampler(calculator, engine=options['engine'], mpicomm=self.mpicomm, store=store)
         sampler.run(niterations=options['niterations'])
         return sampler.samples
 
-    def fit(self, X, Y, validation_frac=0.2, optimizer='adam', batch_sizes=(320, 640, 1280, 2560, 5120), epochs=1000, learning_rates=(1e-2, 1e-3, 1e-4, 1e-5, 1e-6), seed=None):
+    def fit(self, X, Y, validation_frac=0.2, optimizer='adam', batch_sizes=(320, 640, 1280, 2560, 5120), epochs=1000, learning_rates=(1e-2, 1e-3, 1e-4, 1e-5, 1e-6), patience=50, seed=None):
         """
-        Fit.
+        Fit, with :mod:`jax`. Training is data-parallel: each minibatch is split between MPI processes, and gradients are summed over processes.
 
         Parameters
         ----------
@@ -89,7 +92,7 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
             Fraction of the training sample to use for validation.
 
         optimizer : str, default='adam'
-            Tensorflow optimizer to use.
+            Optimizer to use, only 'adam' is supported.
 
         batch_sizes : tuple, list, default=(320, 640, 1280, 2560, 5120)
             Optimization batch sizes.
@@ -99,101 +102,51 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
 
         learning_rates : float, tuple, list, default=(1e-2, 1e-3, 1e-4, 1e-5, 1e-6)
             Learning rate, a float or a list of such float for each batch.
+            If ``None``, keep the previous learning rate (initially, 1e-3).
+
+        patience : int, default=50
+            For each batch size, stop optimization if validation loss has not improved for ``patience`` epochs,
+            and restore the weights with the lowest validation loss.
 
         seed : int, default=None
             Random seed.
         """
         optimizer = str(optimizer)
+        if optimizer != 'adam':
+            raise ValueError('Unknown optimizer {}; only "adam" is supported'.format(optimizer))
         validation_frac = float(validation_frac)
         batch_sizes = _make_tuple(batch_sizes, length=1)
         epochs = _make_tuple(epochs, length=len(batch_sizes))
         learning_rates = _make_tuple(learning_rates, length=len(batch_sizes))
         rng = np.random.RandomState(seed=seed)
 
-        self.operations = None
-
-        import tensorflow as tf
-        from tensorflow.keras.callbacks import EarlyStopping
-
-        class TFModel(tf.keras.Model):
-
-            def __init__(self, architecture, eigenvectors=None, mean=None, sigma=None):
-                super(TFModel, self).__init__()
-                self.architecture = architecture
-                self.nlayers = len(self.architecture) - 1
-                self.mean = mean
-                self.sigma = sigma
-                self.eigenvectors = eigenvectors
-
-                self.W, self.b, self.alpha, self.beta = [], [], [], []
-                for i in range(self.nlayers):
-                    self.W.append(tf.Variable(tf.random.normal([self.architecture[i], self.architecture[i + 1]], 0., np.sqrt(2. / self.architecture[0])), name='W_{:d}'.format(i), trainable=True))
-                    self.b.append(tf.Variable(tf.zeros([self.architecture[i + 1]]), name='b_{:d}'.format(i), trainable=True))
-                for i in range(self.nlayers - 1):
-                    self.alpha.append(tf.Variable(tf.random.normal([self.architecture[i + 1]]), name='alpha_{:d}'.format(i), trainable=True))
-                    self.beta.append(tf.Variable(tf.random.normal([self.architecture[i + 1]]), name='beta_{:d}'.format(i), trainable=True))
-
-            @tf.function
-            def call(self, x):
-                for i in range(self.nlayers):
-                    # linear network operation
-                    x = tf.add(tf.matmul(x, self.W[i]), self.b[i])
-                    # non-linear activation function
-                    if i < self.nlayers - 1:
-                        x = tf.multiply(tf.add(self.beta[i], tf.multiply(tf.sigmoid(tf.multiply(self.alpha[i], x)), tf.subtract(1., self.beta[i]))), x)
-                # linear output layer
-                if self.eigenvectors is not None:
-                    x = tf.matmul(tf.add(tf.multiply(x, self.sigma), self.mean), self.eigenvectors)
-                return x
-
-            def operations(self):
-                operations = []
-                for i in range(self.nlayers):
-                    # linear network operation
-                    operations.append({'eval': 'x @ W + b', 'locals': {'W': self.W[i].numpy(), 'b': self.b[i].numpy()}})
-                    # non-linear activation function
-                    if i < self.nlayers - 1:
-                        operations.append({'eval': '(beta + (1 - beta) / (1 + np.exp(-alpha * x))) * x', 'locals': {'alpha': self.alpha[i].numpy(), 'beta': self.beta[i].numpy()}})
-                # linear output layer
-                if self.eigenvectors is not None:
-                    operations.append({'eval': '(x * sigma + mean) @ eigenvectors', 'locals': {'eigenvectors': eigenvectors, 'mean': mean, 'sigma': sigma}})
-                return operations
-
-            def __getstate__(self):
-                state = {}
-                for name in ['W', 'b', 'alpha', 'beta']:
-                    state[name] = [value.numpy() for value in getattr(self, name)]
-                return state
-
-            def __setstate__(self, state):
-                for name in ['W', 'b', 'alpha', 'beta']:
-                    for tfvalue, npvalue in zip(getattr(self, name), state[name]):
-                        tfvalue.assign(npvalue)
+        from desilike.jax import jax
+        if jax is None:
+            raise ImportError('jax is required to fit {}'.format(self.__class__.__name__))
 
         nsamples = self.mpicomm.bcast(len(X) if self.mpicomm.rank == 0 else None)
         nvalidation = int(nsamples * validation_frac + 0.5)
         if nvalidation >= nsamples:
             raise ValueError('Cannot use {:d} validation samples (>= {:d} total samples)'.format(nvalidation, nsamples))
 
+        samples, operations, pca, architecture = None, None, None, None
         if self.mpicomm.rank == 0:
             samples = {'X': X, 'Y': Y}
-            self.operations = {}
+            operations = {}
             for name, value in samples.items():
                 mean, sigma = np.mean(value, axis=0), np.std(value, ddof=1, axis=0)
-                self.operations[name] = [{'eval': 'x * sigma + mean' if name == 'Y' else '(x - mean) / sigma',
-                                          'locals': {'mean': mean, 'sigma': sigma}}]
+                operations[name] = [{'op': 'denormalize' if name == 'Y' else 'normalize', 'locals': {'mean': mean, 'sigma': sigma}}]
                 samples[name] = (value - mean) / sigma
             if 'arcsinh' in self.ytransform:
                 Y = np.arcsinh(samples['Y'])
                 mean, sigma = np.mean(Y, axis=0), np.std(Y, ddof=1, axis=0)
                 samples['Y'] = (Y - mean) / sigma
-                self.operations['Y'].insert(0, {'eval': 'np.sinh(x) * sigma + mean', 'locals': {'mean': mean, 'sigma': sigma}})
+                operations['Y'].insert(0, {'op': 'sinh', 'locals': {'mean': mean, 'sigma': sigma}})
             mask = np.zeros(nsamples, dtype='?')
             mask[rng.choice(nsamples, size=nvalidation, replace=False)] = True
             for name, value in list(samples.items()):
                 samples['{}_validation'.format(name)] = value[mask]
                 samples['{}_training'.format(name)] = value[~mask]
-            eigenvectors, mean, sigma = None, None, None
             architecture = [X.shape[-1]] + list(self.nhidden)
             if self.npcs is not None:
                 ndim = samples['Y_training'].shape[-1]
@@ -204,51 +157,174 @@ class MLPEmulatorEngine(BaseEmulatorEngine):
                 tmp = samples['Y_training'].dot(eigenvectors)
                 eigenvectors = eigenvectors.T
                 mean, sigma = np.mean(tmp, axis=0), np.std(tmp, ddof=1, axis=0)
+                pca = {'eigenvectors': eigenvectors, 'mean': mean, 'sigma': sigma}
                 architecture += [len(mean)]
             else:
                 architecture += [samples['Y'].shape[1]]
-
-            tfmodel = TFModel(architecture, eigenvectors=eigenvectors, mean=mean, sigma=sigma)
-            state = getattr(self, 'tfmodel', None)
-            if state is not None:
-                if not isinstance(state, dict):
-                    state = state.__getstate__()
-                tfmodel.__setstate__(state)
-            self.tfmodel = tfmodel
-            self.tfmodel.compile(optimizer=optimizer, loss='mse', metrics=['mse'])
-            es = EarlyStopping(monitor='val_loss', mode='min', verbose=1, patience=50)
-
-            for batch_size, epoch, lr in zip(batch_sizes, epochs, learning_rates):
-                if lr is None:
-                    lr = self.tfmodel.optimizer.lr.numpy()
-                else:
-                    self.tfmodel.optimizer.lr.assign(lr)
+            samples = {name: value for name, value in samples.items() if name.endswith('_training') or name.endswith('_validation')}
+        # All processes take part in the training
+        samples = self.mpicomm.bcast(samples, root=0)
+        pca = self.mpicomm.bcast(pca, root=0)
+        architecture = self.mpicomm.bcast(architecture, root=0)
+        ntraining = len(samples['X_training'])
+
+        weights = getattr(self, 'weights', None)
+        if weights is None or [w.shape for w in weights['W']] != [(a, b) for a, b in zip(architecture[:-1], architecture[1:])]:
+            weights = _init_weights(architecture, rng=rng)
+        weights = self.mpicomm.bcast(weights, root=0)
+        weights = jax.tree_util.tree_map(jnp.asarray, weights)
+        # Same random state on all processes, to draw the same batches
+        rng = np.random.RandomState(seed=self.mpicomm.bcast(rng.randint(0, 2**31 - 1) if self.mpicomm.rank == 0 else None, root=0))
+
+        def loss(weights, x, y):
+            # Sum (not mean) of squared errors, to be summed over processes
+            return jnp.sum((_forward(weights, x, pca=pca) - y)**2)
+
+        grad = jax.jit(jax.value_and_grad(loss))
+        loss = jax.jit(loss)
+        # Adam optimizer
+        beta1, beta2, eps = 0.9, 0.999, 1e-7
+        moments = jax.tree_util.tree_map(jnp.zeros_like, weights), jax.tree_util.tree_map(jnp.zeros_like, weights)
+        step, lr = 0, 1e-3
+
+        @jax.jit
+        def update(weights, moments, grads, step, lr):
+            m, v = moments
+            m = jax.tree_util.tree_map(lambda m, g: beta1 * m + (1. - beta1) * g, m, grads)
+            v = jax.tree_util.tree_map(lambda v, g: beta2 * v + (1. - beta2) * g**2, v, grads)
+            lr = lr * jnp.sqrt(1. - beta2**step) / (1. - beta1**step)
+            weights = jax.tree_util.tree_map(lambda w, m, v: w - lr * m / (jnp.sqrt(v) + eps), weights, m, v)
+            return weights, (m, v)
+
+        def allreduce(tree):
+            return jax.tree_util.tree_map(lambda value: jnp.asarray(self.mpicomm.allreduce(np.asarray(value))), tree)
+
+        size, rank = self.mpicomm.size, self.mpicomm.rank
+        # Validation loss is computed on a subset of the validation sample on each process
+        xval, yval = samples['X_validation'][rank::size], samples['Y_validation'][rank::size]
+        nval = len(samples['X_validation']) * samples['Y_validation'].shape[-1]
+
+        for batch_size, epoch, lr_ in zip(batch_sizes, epochs, learning_rates):
+            if lr_ is not None: lr = lr_
+            if self.mpicomm.rank == 0:
                 self.log_info('Using (batch size, epochs, learning rate) = ({:d}, {:d}, {:.2e})'.format(batch_size, epoch, lr))
-                self.tfmodel.fit(samples['X_training'], samples['Y_training'], batch_size=batch_size, epochs=epoch,
-                                 validation_data=(samples['X_validation'], samples['Y_validation']), callbacks=[es], verbose=2)
-                self.operations['M'] = self.tfmodel.operations()
-            self.operations = self.operations['X'] + self.operations['M'] + self.operations['Y']
-
-        mpi.barrier_idle(self.mpicomm)  # we rely on keras parallelisation; here we make MPI processes idle
-
+            best, nbest = (np.inf, weights), 0
+            for iepoch in range(epoch):
+                # Same permutation on all processes, each process takes its share of each batch
+                indices = rng.permutation(ntraining)
+                for start in range(0, ntraining, batch_size):
+                    batch = indices[start:start + batch_size]
+                    value, grads = grad(weights, samples['X_training'][batch[rank::size]], samples['Y_training'][batch[rank::size]])
+                    norm = batch.size * samples['Y_training'].shape[-1]
+                    grads = jax.tree_util.tree_map(lambda g: g / norm, allreduce(grads))
+                    step += 1
+                    weights, moments = update(weights, moments, grads, step, lr)
+                val_loss = self.mpicomm.allreduce(float(loss(weights, xval, yval))) / nval
+                if val_loss < best[0]:
+                    best, nbest = (val_loss, weights), 0
+                else:
+                    nbest += 1
+                if self.mpicomm.rank == 0 and (iepoch % 100 == 0 or iepoch == epoch - 1):
+                    self.log_info('Epoch {:d}: validation loss = {:.4e}.'.format(iepoch, val_loss))
+                if nbest >= patience:
+                    if self.mpicomm.rank == 0:
+                        self.log_info('Early stopping at epoch {:d}, with validation loss = {:.4e}.'.format(iepoch, best[0]))
+                    break
+            weights = best[1]
+
+        self.weights = jax.tree_util.tree_map(np.asarray, weights)
+        self.operations = None
+        if self.mpicomm.rank == 0:
+            self.operations = operations['X'] + _get_operations(self.weights, pca=pca) + operations['Y']
         self.operations = self.mpicomm.bcast(self.operations, root=0)
 
     @jit(static_argnums=[0])
     def predict(self, X):
         x = X
         for operation in self.operations:
-            x = eval(operation['eval'], {'np': jnp}, {'x': x, **operation['locals']})
+            x = _operations[operation['op']](x, **operation['locals'])
         return x
 
     def __getstate__(self):
         state = {}
-        for name in ['operations', 'tfmodel']:
+        for name in ['operations', 'weights']:
             if hasattr(self, name):
-                tmp = getattr(self, name)
-                if hasattr(tmp, '__getstate__'): tmp = tmp.__getstate__()
-                state[name] = tmp
+                state[name] = getattr(self, name)
         return state
 
+    def __setstate__(self, state):
+        state = dict(state)
+        if 'tfmodel' in state:  # legacy, tensorflow-trained
+            state.setdefault('weights', state.pop('tfmodel'))
+        if state.get('operations', None) is not None:
+            state['operations'] = [_convert_operation(operation) for operation in state['operations']]
+        super(MLPEmulatorEngine, self).__setstate__(state)
+
     @classmethod
     def install(cls, config):
-        config.pip('tensorflow')
+        config.pip('jax')
+
+
+def _activation(x, alpha, beta):
+    return (beta + (1 - beta) / (1 + jnp.exp(-alpha * x))) * x
+
+
+# Operations applied in sequence in :meth:`MLPEmulatorEngine.predict`
+_operations = {'normalize': lambda x, mean, sigma: (x - mean) / sigma,
+               'denormalize': lambda x, mean, sigma: x * sigma + mean,
+               'sinh': lambda x, mean, sigma: jnp.sinh(x) * sigma + mean,
+               'dense': lambda x, W, b: x @ W + b,
+               'activation': _activation,
+               'pca': lambda x, eigenvectors, mean, sigma: (x * sigma + mean) @ eigenvectors}
+
+# Previous (tensorflow-trained) emulators stored operations as strings to evaluate
+_legacy_operations = {'(x - mean) / sigma': 'normalize',
+                      'x * sigma + mean': 'denormalize',
+                      'np.sinh(x) * sigma + mean': 'sinh',
+                      'x @ W + b': 'dense',
+                      '(beta + (1 - beta) / (1 + np.exp(-alpha * x))) * x': 'activation',
+                      '(x * sigma + mean) @ eigenvectors': 'pca'}
+
+
+def _convert_operation(operation):
+    if 'eval' in operation:
+        try:
+            return {'op': _legacy_operations[operation['eval']], 'locals': operation['locals']}
+        except KeyError as exc:
+            raise ValueError('Unknown operation {}'.format(operation['eval'])) from exc
+    return operation
+
+
+def _init_weights(architecture, rng=None):
+    # Same initialization as the previous tensorflow implementation
+    if rng is None: rng = np.random.RandomState()
+    nlayers = len(architecture) - 1
+    weights = {'W': [], 'b': [], 'alpha': [], 'beta': []}
+    for i in range(nlayers):
+        weights['W'].append(rng.normal(0., np.sqrt(2. / architecture[0]), size=(architecture[i], architecture[i + 1])))
+        weights['b'].append(np.zeros(architecture[i + 1], dtype='f8'))
+    for i in range(nlayers - 1):
+        weights['alpha'].append(rng.normal(size=architecture[i + 1]))
+        weights['beta'].append(rng.normal(size=architecture[i + 1]))
+    return weights
+
+
+def _get_operations(weights, pca=None):
+    operations = []
+    nlayers = len(weights['W'])
+    for i in range(nlayers):
+        # linear network operation
+        operations.append({'op': 'dense', 'locals': {'W': weights['W'][i], 'b': weights['b'][i]}})
+        # non-linear activation function
+        if i < nlayers - 1:
+            operations.append({'op': 'activation', 'locals': {'alpha': weights['alpha'][i], 'beta': weights['beta'][i]}})
+    # linear output layer
+    if pca is not None:
+        operations.append({'op': 'pca', 'locals': dict(pca)})
+    return operations
+
+
+def _forward(weights, x, pca=None):
+    for operation in _get_operations(weights, pca=pca):
+        x = _operations[operation['op']](x, **operation['locals'])
+    return x
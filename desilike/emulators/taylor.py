@@ -2,7 +2,7 @@ import itertools
 
 import numpy as np
 
-from desilike import mpi
+from desilike import mpi, utils
 from desilike.jax import numpy as jnp
 from desilike.jax import jit
 from desilike.utils import expand_dict
@@ -10,17 +10,65 @@ from desilike.parameter import Deriv
 from .base import BaseEmulatorEngine
 
 
+def _get_monomial_tree(powers):
+    """
+    Return the evaluation scheme of monomials ``prod(x**powers)``, such that each monomial of degree :math:`d`
+    is obtained by multiplying a monomial of degree :math:`d - 1` by one coordinate.
+
+    Returns
+    -------
+    levels : list
+        For each degree :math:`d > 0`, tuple of arrays (indices of parent monomials, indices of coordinates);
+        monomials are ordered by degree, starting with the constant monomial.
+
+    terms : array
+        Index of each of input ``powers`` in the list of monomials.
+    """
+    powers = np.asarray(powers, dtype='i4')
+    ndim = powers.shape[-1]
+    monomials = {(0,) * ndim: None}
+
+    def add(power):
+        if power in monomials: return
+        # Parent: decrease power of last coordinate with non-zero power
+        idim = max(i for i, p in enumerate(power) if p)
+        parent = list(power)
+        parent[idim] -= 1
+        parent = tuple(parent)
+        add(parent)
+        monomials[power] = (parent, idim)
+
+    for power in powers: add(tuple(power.tolist()))
+    monomials = sorted(monomials.items(), key=lambda item: sum(item[0]))
+    index = {power: i for i, (power, _) in enumerate(monomials)}
+    levels = []
+    for degree in range(1, max(sum(power) for power, _ in monomials) + 1):
+        level = [parent for power, parent in monomials if sum(power) == degree]
+        levels.append((np.array([index[parent] for parent, idim in level], dtype='i4'), np.array([idim for parent, idim in level], dtype='i4')))
+    terms = np.array([index[tuple(power.tolist())] for power in powers], dtype='i4')
+    return levels, terms
+
+
 class TaylorEmulatorEngine(BaseEmulatorEngine):
     """
     Taylor expansion emulator engine, based on Stephen Chen and Mark Maus' velocileptors' Taylor expansion:
     https://github.com/cosmodesi/desi-y1-kp45/tree/main/ShapeFit_Velocileptors
+
+    Parameters
+    ----------
+    npcs : int, default=None
+        If not ``None``, number of principal components used to compress the output:
+        derivatives are stored in this reduced basis, which reduces memory, file size and prediction time for large outputs.
+        See :meth:`fit` for other parameters.
     """
     name = 'taylor'
     _samples_with_derivs = True
+    _fit_with_params = True
 
-    def initialize(self, varied_params, order=3, accuracy=2, method=None, delta_scale=1.):
+    def initialize(self, varied_params, order=3, accuracy=2, method=None, delta_scale=1., total_order=None, cross_order=None, npcs=None):
         self.varied_params = varied_params
-        self.sampler_options = dict(order=order, accuracy=accuracy, method=method, delta_scale=delta_scale)
+        self.npcs = npcs
+        self.sampler_options = dict(order=order, accuracy=accuracy, method=method, delta_scale=delta_scale, total_order=total_order, cross_order=cross_order)
 
     def get_default_samples(self, calculator, **kwargs):
         """
@@ -40,13 +88,38 @@ class TaylorEmulatorEngine(BaseEmulatorEngine):
         delta_scale : float, default=1.
             Parameter grid ranges for the estimation of finite derivatives are inferred from parameters' :attr:`Parameter.delta`.
             These values are then scaled by ``delta_scale`` (< 1. means smaller ranges).
+
+        total_order : int, default=None
+            If not ``None``, maximum total order of derivatives, hence of the Taylor expansion.
+
+        cross_order : int, dict, default=None
+            A dictionary mapping parameter name (including wildcard) to maximum total order of mixed derivatives involving this parameter.
+            If a single value is provided, applies to all varied parameters.
+            With ``total_order``, this reduces the number of calculator evaluations; see :class:`Differentiation`.
         """
         from desilike import Differentiation
         options = {**self.sampler_options, **kwargs}
         differentiation = Differentiation(calculator, **options, mpicomm=self.mpicomm)
         return differentiation(**differentiation._grid_center)
 
-    def fit(self, X, Y):
+    def fit(self, X, Y, params=None, prune=None, prune_delta=None):
+        """
+        Fit, i.e. set Taylor expansion coefficients.
+
+        Parameters
+        ----------
+        params : ParameterCollection, default=None
+            Varied parameters, used to set the default ``prune_delta``. Provided by :meth:`Emulator.fit`.
+
+        prune : float, default=None
+            If not ``None``, remove terms of the Taylor expansion with negligible contributions within ``center +/- prune_delta``:
+            terms are removed (starting from the smallest contributions) as long as the sum of their maximum absolute contributions
+            is less than ``prune`` times the absolute value of the prediction at the center (for each output element).
+
+        prune_delta : float, dict, default=None
+            A dictionary mapping parameter name (including wildcard) to the half-width of the parameter range in which to estimate contributions,
+            for ``prune``. If a single value is provided, applies to all varied parameters. Defaults to 3 times :attr:`Parameter.proposal`.
+        """
         if self.mpicomm.bcast(Y.derivs is None if self.mpicomm.rank == 0 else None, root=0):
             raise ValueError('Please provide samples with derivatives computed')
         self.center, self.derivatives, self.powers = None, None, None
@@ -60,7 +133,7 @@ class TaylorEmulatorEngine(BaseEmulatorEngine):
                 for iparam, param in enumerate(self.varied_params):
                     max_param_order[iparam] = max(max_param_order[iparam], deriv[param])
                     max_order = max(max_order, deriv.total())
-            prefactor, degrees = 1., []
+            prefactor, degrees, missing = 1., [], []
             for order in range(0, max_order + 1):
                 if order: prefactor /= order
                 for indices in itertools.product(range(ndim), repeat=order):
@@ -69,8 +142,7 @@ class TaylorEmulatorEngine(BaseEmulatorEngine):
                         continue
                     degree = Deriv(dict(zip(self.varied_params, orders)))
                     if degree not in Y.derivs:
-                        import warnings
-                        warnings.warn("Derivative {} is missing, let's assume it is 0".format(degree))
+                        if degree not in missing: missing.append(degree)
                         continue
                     value = prefactor * Y[degree]
                     if degree in degrees:
@@ -79,21 +151,95 @@ class TaylorEmulatorEngine(BaseEmulatorEngine):
                         degrees.append(degree)
                         self.powers.append(orders)
                         self.derivatives.append(value)
+            if missing:
+                import warnings
+                warnings.warn("Derivatives {} are missing, let's assume they are 0".format(missing))
             self.derivatives, self.powers = np.array(self.derivatives), np.array(self.powers)
+            delta = None
+            if prune is not None or self.npcs is not None:
+                delta = self._get_delta(prune_delta, params=params)
+            if prune is not None:
+                self._prune(prune, delta)
+            self.eigenvectors = None
+            if self.npcs is not None:
+                self._compress(self.npcs, delta)
         self.derivatives = mpi.bcast(self.derivatives if self.mpicomm.rank == 0 else None, mpicomm=self.mpicomm, mpiroot=0)
+        self.eigenvectors = self.mpicomm.bcast(self.eigenvectors if self.mpicomm.rank == 0 else None, root=0)  # may be None
         self.powers = self.mpicomm.bcast(self.powers, root=0)
         self.center = self.mpicomm.bcast(self.center, root=0)
 
+    def _get_delta(self, delta=None, params=None):
+        # Half-width of the parameter range where to estimate contributions of each term
+        if delta is None:
+            if params is None:
+                raise ValueError('Provide prune_delta or params')
+            return np.array([3. * params[name].proposal for name in self.varied_params], dtype='f8')
+        delta = expand_dict(delta, self.varied_params)
+        return np.array([delta[name] for name in self.varied_params], dtype='f8')
+
+    def _prune(self, prune, delta):
+        # Remove terms with negligible contributions within center +/- delta
+        yshape = self.derivatives.shape[1:]
+        derivatives = self.derivatives.reshape(len(self.derivatives), -1)
+        # Maximum absolute contribution of each term
+        contributions = np.abs(derivatives) * np.prod(delta**self.powers, axis=-1)[:, None]
+        iconstant = np.flatnonzero(self.powers.sum(axis=-1) == 0)
+        scale = np.abs(derivatives[iconstant[0]]) if iconstant.size else np.zeros(derivatives.shape[-1], dtype='f8')
+        scale = np.where(scale > 0., scale, np.max(contributions, axis=0))
+        scale[scale == 0.] = 1.
+        relative = contributions / scale
+        order = [i for i in np.argsort(np.max(relative, axis=-1)) if i not in iconstant]
+        if not order: return
+        cumulative = np.max(np.cumsum(relative[order], axis=0), axis=-1)
+        npruned = np.searchsorted(cumulative, prune, side='right')
+        error = cumulative[npruned - 1] if npruned else 0.
+        mask = np.ones(len(self.powers), dtype='?')
+        mask[order[:npruned]] = False
+        self.log_info('Pruning {:d} / {:d} Taylor expansion terms, with maximum relative error {:.3e} (budget {:.3e}) within +/- {}.'.format(npruned, len(self.powers), error, prune, dict(zip(self.varied_params, delta))))
+        self.derivatives, self.powers = derivatives[mask].reshape((-1,) + yshape), self.powers[mask]
+
+    def _compress(self, npcs, delta):
+        # Express derivatives in a reduced basis: derivatives = coefficients @ eigenvectors
+        yshape = self.derivatives.shape[1:]
+        derivatives = self.derivatives.reshape(len(self.derivatives), -1)
+        nterms, ndim = derivatives.shape
+        if npcs >= min(nterms, ndim) - 1:
+            self.log_warning('Number of requested components is {:d}, but number of terms is {:d} and dimension is {:d}; no compression.'.format(npcs, nterms, ndim))
+            return
+        # Scale each term by its typical contribution, such that the basis is optimized for the prediction
+        scale = np.prod(delta**self.powers, axis=-1)[:, None]
+        scaled = derivatives * scale
+        mean = np.mean(scaled, axis=0)
+        eigenvectors = utils.subspace(scaled, npcs=npcs)
+        coefficients = (scaled - mean).dot(eigenvectors)
+        error = np.max(np.abs(mean + coefficients.dot(eigenvectors.T) - scaled)) / max(np.max(np.abs(scaled)), np.finfo(scaled.dtype).tiny)
+        self.log_info('Compressing {:d} output elements into {:d} principal components, with maximum relative error {:.3e}.'.format(ndim, npcs, error))
+        self.derivatives = np.concatenate([np.ones((nterms, 1), dtype=coefficients.dtype), coefficients], axis=-1) / scale
+        self.eigenvectors = np.concatenate([mean[None, :], eigenvectors.T], axis=0).reshape((npcs + 1,) + yshape)
+
+    def _get_monomial_tree(self):
+        # Cache evaluation scheme of monomials
+        cache = getattr(self, '_monomial_tree', None)
+        if cache is None or cache[0] is not self.powers:
+            cache = self._monomial_tree = (self.powers, _get_monomial_tree(self.powers))
+        return cache[1]
+
     @jit(static_argnums=[0])
     def predict(self, X):
-        diffs = jnp.array(X - self.center)
-        #diffs = jnp.where(self.powers > 0, diffs, 0.)  # a trick to avoid NaNs in the derivation
-        #powers = jnp.prod(jnp.power(diffs, self.powers), axis=-1)
-        powers = jnp.prod(jnp.where(self.powers > 0, diffs ** self.powers, 1.), axis=-1)
-        return jnp.tensordot(self.derivatives, powers, axes=(0, 0))
+        # X may have leading batch dimensions
+        diffs = jnp.asarray(X - self.center)
+        levels, terms = self._get_monomial_tree()
+        # Monomials of degree d are obtained from those of degree d - 1, starting from the constant one
+        monomials = jnp.ones(diffs.shape[:-1] + (1,), dtype=diffs.dtype)
+        for parents, dims in levels:
+            monomials = jnp.concatenate([monomials, monomials[..., parents] * diffs[..., dims]], axis=-1)
+        toret = jnp.tensordot(monomials[..., terms], self.derivatives, axes=(-1, 0))
+        if getattr(self, 'eigenvectors', None) is not None:
+            toret = jnp.tensordot(toret, self.eigenvectors, axes=(-1, 0))
+        return toret
 
     def __getstate__(self):
         state = {}
-        for name in ['center', 'derivatives', 'powers']:
-            state[name] = getattr(self, name)
+        for name in ['center', 'derivatives', 'powers', 'eigenvectors']:
+            state[name] = getattr(self, name, None)
         return state
@@ -41,6 +41,44 @@ def test_mlp_linear(plot=False):
         plt.show()
 
 
+def test_active_learning():
+    from desilike.likelihoods import BaseGaussianLikelihood
+
+    class Likelihood(BaseGaussianLikelihood):
+
+        def initialize(self, theory=None):
+            self.theory = theory
+            x = np.linspace(0.1, 1.1, 11)
+            super(Likelihood, self).initialize(0.5 * x + 0.5, covariance=0.1**2 * np.eye(x.size))
+
+        @property
+        def flattheory(self):
+            return self.theory.model
+
+    calculator = LinearModel()
+    emulator = Emulator(calculator, engine=MLPEmulatorEngine(nhidden=(20,)))
+    emulator.set_samples(niterations=100)
+    emulator.fit(batch_sizes=(100,), epochs=100)
+    nsamples = emulator.samples['model'].size
+    emulator.active_learning(lambda theory: Likelihood(theory=theory), chi2_target=1e-3, niterations=2, nsamples=20, fit_kwargs={'batch_sizes': (100,), 'epochs': 100})
+    assert emulator.samples['model'].size > nsamples
+    assert len(emulator.diagnostics['chi2_error']) >= 1
+
+
+def test_legacy():
+    rng = np.random.RandomState(seed=42)
+    W, b = rng.normal(size=(2, 3)), rng.normal(size=3)
+    alpha, beta = rng.normal(size=3), rng.normal(size=3)
+    operations = [{'eval': 'x @ W + b', 'locals': {'W': W, 'b': b}},
+                  {'eval': '(beta + (1 - beta) / (1 + np.exp(-alpha * x))) * x', 'locals': {'alpha': alpha, 'beta': beta}},
+                  {'eval': 'x * sigma + mean', 'locals': {'mean': 1., 'sigma': 2.}}]
+    engine = MLPEmulatorEngine.from_state({'operations': operations})
+    X = rng.normal(size=(4, 2))
+    x = X @ W + b
+    ref = ((beta + (1 - beta) / (1 + np.exp(-alpha * x))) * x) * 2. + 1.
+    assert np.allclose(engine.predict(X), ref)
+
+
 def test_mlp(plot=False):
     from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
     calculator = KaiserTracerPowerSpectrumMultipoles(template=ShapeFitPowerSpectrumTemplate())
@@ -87,6 +87,54 @@ def test_taylor_power(plot=False):
                 plt.show()
 
 
+def test_monomials():
+    from desilike.emulators.taylor import _get_monomial_tree
+
+    rng = np.random.RandomState(seed=42)
+    powers = np.array([[0, 0, 0], [2, 0, 1], [0, 3, 0], [1, 1, 1], [0, 0, 1]])
+    levels, terms = _get_monomial_tree(powers)
+    X = rng.uniform(-1., 1., size=(4, 3))
+    monomials = np.ones(X.shape[:-1] + (1,))
+    for parents, dims in levels:
+        monomials = np.concatenate([monomials, monomials[..., parents] * X[..., dims]], axis=-1)
+    assert np.allclose(monomials[..., terms], np.prod(X[:, None, :]**powers, axis=-1))
+
+
+def test_prune():
+    calculator = PowerModel()
+    emulator = Emulator(calculator, engine=TaylorEmulatorEngine(order=4))
+    emulator.set_samples()
+    emulator.fit()
+    engine = emulator.engines['model']
+    nterms = len(engine.powers)
+    emulator.fit(prune=1e-3, prune_delta=0.05)
+    pruned_engine = emulator.engines['model']
+    assert len(pruned_engine.powers) < nterms
+    X = np.array([emulator.params[name].value for name in emulator.varied_params]) + np.array([[0.01, -0.02], [0.04, 0.03]])
+    ref = engine.predict(X)
+    assert ref.shape == (2,) + engine.derivatives.shape[1:]
+    assert np.allclose(pruned_engine.predict(X), ref, rtol=2e-3, atol=0.)
+    assert np.allclose(engine.predict(X[0]), ref[0])
+
+
+def test_pca():
+    calculator = PowerModel(order=3)
+    emulator = Emulator(calculator, engine=TaylorEmulatorEngine(order=2))
+    emulator.set_samples()
+    emulator.fit()
+    reference = emulator.to_calculator()
+    emulator = Emulator(calculator, engine=TaylorEmulatorEngine(order=2, npcs=1))
+    emulator.set_samples()
+    emulator.fit()
+    assert emulator.engines['model'].eigenvectors.shape == (2, calculator.x.size)
+    compressed = emulator.to_calculator()
+    for scale in [1., 1.05]:
+        params = {str(param): param.value * scale for param in calculator.varied_params}
+        reference(**params)
+        compressed(**params)
+        assert np.allclose(compressed.model, reference.model)
+
+
 def test_taylor(plot=False):
     from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
     calculator = KaiserTracerPowerSpectrumMultipoles(template=ShapeFitPowerSpectrumTemplate())
@@ -143,5 +191,6 @@ if __name__ == '__main__':
 
     setup_logging()
     test_taylor_power(plot=True)
+    #test_pca()
     #test_taylor(plot=True)
     #test_likelihood()
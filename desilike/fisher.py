@@ -15,6 +15,7 @@ class PriorCalculator(BaseCalculator):
 
     _initialize_with_namespace = True
     _calculate_with_namespace = True
+    _calculate_with_batch = True
 
     """Calculator that computes the logprior."""
 
@@ -32,6 +33,7 @@ class FisherGaussianLikelihood(BaseGaussianLikelihood):
 
     _initialize_with_namespace = True
     _calculate_with_namespace = True
+    _calculate_with_batch = True
 
     def initialize(self, fisher):
         data = fisher.mean()
@@ -48,7 +50,7 @@ class FisherGaussianLikelihood(BaseGaussianLikelihood):
         super(FisherGaussianLikelihood, self).initialize(data=data, precision=precision)
 
     def calculate(self, **params):
-        self.flattheory = jnp.array([params[name] for name in self.quantities])
+        self.flattheory = jnp.stack(jnp.broadcast_arrays(*[params[name] for name in self.quantities]), axis=-1)
         super(FisherGaussianLikelihood, self).calculate()
         self.loglikelihood += self.offset
 
@@ -216,6 +216,10 @@ class Installer(BaseClass):
     >>> installer(MinuitProfiler)
     >>> installer(EmceeSampler)
     >>> installer(MLPEmulatorEngine)
+
+    To save :mod:`jax` compiled functions on disk, and reuse them across runs (see :func:`jax.set_compilation_cache`):
+
+    >>> installer.set_jax_cache_dir('/path/to/jax/cache')
     """
     home_dir = os.path.expanduser('~')
 
@@ -420,7 +424,29 @@ class Installer(BaseClass):
             for src in config.get('source', []):
                 file.write('source {}'.format(src))
 
+    def set_jax_cache_dir(self, cache_dir=None):
+        """
+        Set directory for :mod:`jax` persistent compilation cache, saved in :attr:`config_fn`
+        (and used in subsequent runs).
+
+        Parameters
+        ----------
+        cache_dir : str, Path, default=None
+            Cache directory. Defaults to 'jax_cache' in :meth:`data_dir`.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(self.data_dir(), 'jax_cache')
+        cache_dir = str(cache_dir)
+        self.config['jax_cache_dir'] = cache_dir
+        self.write({'jax_cache_dir': cache_dir})
+        from . import jax
+        jax.set_compilation_cache(cache_dir)
+
     def setenv(self):
-        """Set environment (i.e. set paths). Called in desilike's __init__.py."""
+        """Set environment (i.e. set paths, and :mod:`jax` compilation cache). Called in desilike's __init__.py."""
         if os.path.isfile(self.profile_fn):
             source(self.profile_fn)
+        cache_dir = self.get('jax_cache_dir', None)
+        if cache_dir:
+            from . import jax
+            jax.set_compilation_cache(cache_dir)
@@ -1,8 +1,11 @@
+import os
+import time
 import functools
 import logging
 import warnings
 import traceback
 
+logger = logging.getLogger('Compile')
 logging.getLogger('jax._src.lib.xla_bridge').addFilter(logging.Filter('No GPU/TPU found, falling back to CPU.'))
 
 
@@ -52,6 +55,47 @@ def jit(*args, **kwargs):
     return get_wrapper(args[0])
 
 
+def set_compilation_cache(cache_dir, min_compile_time_secs=1.):
+    """
+    Set :mod:`jax` persistent compilation cache, such that compiled functions are saved on disk
+    and reused across runs (and MPI processes), instead of being compiled again.
+
+    Parameters
+    ----------
+    cache_dir : str, Path
+        Directory where compiled functions are saved.
+
+    min_compile_time_secs : float, default=1.
+        Only functions which take longer than this time to compile are saved.
+    """
+    if jax is None:
+        return
+    cache_dir = os.path.expanduser(str(cache_dir))
+    config.update('jax_compilation_cache_dir', cache_dir)
+    config.update('jax_persistent_cache_min_compile_time_secs', float(min_compile_time_secs))
+    try:  # cache entries of all sizes
+        config.update('jax_persistent_cache_min_entry_size_bytes', -1)
+    except AttributeError:  # older jax versions
+        pass
+
+
+def compile_aot(func, *args, **kwargs):
+    """
+    Lower and compile ahead-of-time (:func:`jax.jit`) function ``func`` for input ``args`` and ``kwargs``,
+    which may be :class:`jax.ShapeDtypeStruct` instances.
+    Compilation time is logged.
+
+    Returns
+    -------
+    compiled : callable
+        Compiled function, which only accepts inputs with the same structure, shapes and dtypes as ``args``, ``kwargs``.
+    """
+    t0 = time.time()
+    toret = jax.jit(func).lower(*args, **kwargs).compile()
+    logger.info('Compiled {} in {:.2f} s.'.format(getattr(func, '__name__', func), time.time() - t0))
+    return toret
+
+
 def use_jax(array):
     """Whether to use jax.numpy depending on whether array is jax's object."""
     return isinstance(array, tuple(array_types))
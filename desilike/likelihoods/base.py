@@ -5,15 +5,86 @@ import numpy as np
 from desilike.base import BaseCalculator, Parameter, ParameterCollection, ParameterArray
 from desilike.observables import ObservableCovariance
 from desilike.jax import numpy as jnp
-from desilike.jax import jit
+from desilike.jax import jit, to_nparray
 from desilike import plotting, utils
 
 
 @jit
 def chi2(flatdiff, precision):
+    # flatdiff may have a leading batch axis
     if precision.ndim == 1:
-        return (flatdiff * precision).dot(flatdiff.T)
-    return flatdiff.dot(precision).dot(flatdiff.T)
+        return jnp.sum(flatdiff * precision * flatdiff, axis=-1)
+    return jnp.sum(flatdiff.dot(precision) * flatdiff, axis=-1)
+
+
+@jit
+def chi2_factor(flatdiff, factor):
+    # flatdiff may have a leading batch axis; precision = factor.dot(factor.T) (or factor**2 if diagonal)
+    if factor.ndim == 1:
+        return jnp.sum((flatdiff * factor)**2, axis=-1)
+    return jnp.sum(flatdiff.dot(factor)**2, axis=-1)
+
+
+def _check_positive(eigenvalues, rtol=1e-8, check_valid='warn'):
+    # Check that eigenvalues of the precision matrix are positive, within relative tolerance rtol
+    if check_valid == 'ignore':
+        return
+    vmin = np.min(eigenvalues, initial=0.)
+    if vmin < -rtol * np.max(np.abs(eigenvalues), initial=0.):
+        msg = 'Precision matrix is not positive semi-definite (min eigenvalue {:.4g}); negative eigenvalues are set to 0.'.format(vmin)
+        if check_valid == 'raise':
+            raise np.linalg.LinAlgError(msg)
+        elif check_valid == 'warn':
+            warnings.warn(msg)
+        else:
+            raise ValueError('check_valid must be one of ["raise", "warn", "ignore"]')
+
+
+def precision_factor(precision, sizes=None, check_valid='warn'):
+    """
+    Return whitening factors of the precision matrix, for each diagonal block if the precision matrix is block-diagonal.
+
+    Parameters
+    ----------
+    precision : array
+        Precision matrix (or its diagonal).
+
+    sizes : list, default=None
+        Sizes of the (potentially) independent blocks, e.g. of the different observables.
+        If the precision matrix is not block-diagonal w.r.t. these blocks, it is taken as a single block.
+
+    check_valid : str, default='warn'
+        If the precision matrix is not positive semi-definite (its negative eigenvalues are then set to 0), 'raise' a :class:`LinAlgError`,
+        'warn' or 'ignore'.
+
+    Returns
+    -------
+    factors : list
+        List of (slice, factor), with ``precision[sl, sl] = factor.dot(factor.T)``
+        (lower Cholesky factor, or ``factor**2`` if diagonal).
+    """
+    precision = np.asarray(precision)
+    if precision.ndim == 1:
+        _check_positive(precision, check_valid=check_valid)
+        return [(slice(0, precision.size), np.sqrt(np.clip(precision, 0., None)))]
+    size = precision.shape[0]
+    slices = [slice(0, size)]
+    if sizes is not None and len(sizes) > 1:
+        cumsizes = np.insert(np.cumsum(sizes), 0, 0)
+        blocks = [slice(start, stop) for start, stop in zip(cumsizes[:-1], cumsizes[1:])]
+        if not any(np.any(precision[sl1, sl2]) for i1, sl1 in enumerate(blocks) for i2, sl2 in enumerate(blocks) if i2 != i1):
+            slices = blocks
+    toret = []
+    for sl in slices:
+        block = precision[sl, sl]
+        try:
+            factor = np.linalg.cholesky(block)
+        except np.linalg.LinAlgError:  # e.g. analytically marginalized precision, only positive semi-definite
+            eigenvalues, eigenvectors = np.linalg.eigh(block)
+            _check_positive(eigenvalues, check_valid=check_valid)
+            factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0., None))
+        toret.append((sl, factor))
+    return toret
 
 
 class BaseLikelihood(BaseCalculator):
@@ -187,32 +258,74 @@ class BaseLikelihood(BaseCalculator):
                     values = {param.name: pipeline.input_values[param.name] for param in input_params}
                     solve_likelihood.runtime_info.pipeline.input_values = values
 
-                def fisher(params):
+                def evaluate(params, values):
+                    solve_likelihood({**params, **dict(zip(solved_params.names(), values))})
+                    return [likelihood.flatdiff for likelihood in solve_likelihood.likelihoods]
 
+                def jacobian(params, values):
                     import jax
+                    flatderivs = jax.jacfwd(lambda values: evaluate(params, values), argnums=0, has_aux=False, holomorphic=False)(values)
+                    flatdiffs = evaluate(params, values)  # to set calculator states to actual values (not jax tracers)
+                    return flatdiffs, flatderivs
+
+                def allclose(arrays1, arrays2):
+                    return all(np.allclose(array1, array2, rtol=1e-6, atol=1e-10 * np.max(np.abs(array2))) for array1, array2 in zip(arrays1, arrays2))
+
+                def get_key(params):
+                    # If flatdiff is linear in solved parameters, its derivatives only depend on the state of the requirements
+                    # of the calculators that depend on solved parameters, and on the other input parameters of these calculators
+                    key = []
+                    for require in fisher.requires:
+                        state_key = getattr(require.runtime_info, '_state_key', None)
+                        if state_key is None: return None
+                        key.append(state_key)
+                    for name in fisher.depends:
+                        value = to_nparray(params[name])
+                        if value is None: return None  # jax tracer
+                        key.append(tuple(np.ravel(value).tolist()))
+                    return tuple(key)
+
+                def fisher(params):
+
                     names = solved_params.names()
                     values = jnp.array([params[name] for name in names])
-
-                    def getter(values):
-                        solve_likelihood({**params, **dict(zip(names, values))})
-                        return [likelihood.flatdiff for likelihood in solve_likelihood.likelihoods]
-
-                    #flatdiffs = [likelihood.flatdiff for likelihood in solve_likelihood.likelihoods]
-                    #print('deriv')
-                    flatderivs = jax.jacfwd(getter, argnums=0, has_aux=False, holomorphic=False)(values)
-                    #print('diff')
-                    flatdiffs = getter(values)
-                    #print(values)
-                    likelihoods_gradient, likelihoods_hessian = [], []
-                    for ilike, likelihood in enumerate(solve_likelihood.likelihoods):
-                        flatdiff, flatderiv = flatdiffs[ilike], flatderivs[ilike].T
-                        precision = likelihood.precision
-                        if precision.ndim == 1:
-                            derivp = flatderiv * precision
-                        else:
-                            derivp = flatderiv.dot(precision)
-                        likelihoods_gradient.append(- derivp.dot(flatdiff.T))
-                        likelihoods_hessian.append(- derivp.dot(flatderiv.T))
+                    key = get_key(params) if fisher.linear is not False else None
+                    if key is not None and fisher.linear and fisher.cache[0] == key and all(np.ndim(likelihood.flatdiff) == 1 for likelihood in solve_likelihood.likelihoods):
+                        self.runtime_info.monitor.increment('solve_hits')
+                        flatdiffs = [likelihood.flatdiff for likelihood in solve_likelihood.likelihoods]  # just computed by the pipeline
+                        derivps, likelihoods_hessian = fisher.cache[1]
+                    else:
+                        flatdiffs, flatderivs = jacobian(params, values)
+                        if key is not None and fisher.linear is None:
+                            # Check (once) whether flatdiff is linear in solved parameters
+                            shift = 1. + jnp.abs(values)
+                            fisher.linear = allclose(evaluate(params, values + shift), [flatdiff + flatderiv.dot(shift) for flatdiff, flatderiv in zip(flatdiffs, flatderivs)])
+                            if fisher.linear:
+                                # Check (once) which other input parameters derivatives actually depend on
+                                depends = []
+                                for name in fisher.depends:
+                                    value = params[name]
+                                    if not allclose(jacobian({**params, name: value + 1e-3 * (1. + np.abs(value))}, values)[1], flatderivs):
+                                        depends.append(name)
+                                fisher.depends = depends
+                                key = get_key(params)
+                            evaluate(params, values)  # to set calculator states to actual values
+                            if self.mpicomm.rank == 0:
+                                self.log_debug('Model is {}linear in solved parameters {}{}.'.format('' if fisher.linear else 'not ', names, ', with derivatives depending on {}'.format(fisher.depends) if fisher.linear else ''))
+                        derivps, likelihoods_hessian = [], []
+                        for ilike, likelihood in enumerate(solve_likelihood.likelihoods):
+                            flatderiv = flatderivs[ilike].T
+                            precision = likelihood.precision
+                            if precision.ndim == 1:
+                                derivp = flatderiv * precision
+                            else:
+                                derivp = flatderiv.dot(precision)
+                            derivps.append(derivp)
+                            likelihoods_hessian.append(- derivp.dot(flatderiv.T))
+                        if key is not None and fisher.linear:
+                            self.runtime_info.monitor.increment('solve_misses')
+                            fisher.cache = (key, (derivps, likelihoods_hessian))
+                    likelihoods_gradient = [- derivp.dot(flatdiff.T) for derivp, flatdiff in zip(derivps, flatdiffs)]
 
                     prior_gradient, prior_hessian = [], []
                     for param, value in zip(solved_params, values):
@@ -249,6 +362,12 @@ class BaseLikelihood(BaseCalculator):
                 """
                 fisher.input_params = input_params
                 fisher.mpicomm = self.mpicomm
+                fisher.linear, fisher.cache = None, (None, None)
+                dependent = solve_likelihood.runtime_info.pipeline._get_dependent_calculators(solved_params)
+                fisher.requires = []
+                for calculator in dependent:
+                    fisher.requires += [require for require in calculator.runtime_info.requires if require not in dependent and require not in fisher.requires]
+                fisher.depends = [param.name for param in input_params if param not in solved_params and any(param in calculator.runtime_info.params for calculator in dependent)]
                 self.fisher = fisher
                 #self.fisher.varied_params = solved_params  # just to get same _derived attribute for solved_params != self.fisher.varied_params not to fail
                 #assert self.fisher.varied_params == solved_params
@@ -327,7 +446,9 @@ class BaseLikelihood(BaseCalculator):
             derived.set(ParameterArray(self.loglikelihood, param=self._param_loglikelihood, derivs=derivs))
             derived.set(ParameterArray(self.logprior, param=self._param_logprior, derivs=derivs))
 
-        return self.loglikelihood.ravel()[0] + self.logprior.ravel()[0]
+        if solved_params and derived is not None:
+            return self.loglikelihood.ravel()[0] + self.logprior.ravel()[0]
+        return self.loglikelihood + self.logprior
 
     @classmethod
     def sum(cls, *others):
@@ -400,9 +521,25 @@ class BaseGaussianLikelihood(BaseLikelihood):
             self.precision = np.atleast_1d(np.array(precision, dtype='f8'))
         super(BaseGaussianLikelihood, self).initialize(**kwargs)
 
+    @property
+    def precision_factor(self):
+        """
+        Whitening factors of :attr:`precision` (for each of its diagonal blocks), see :func:`precision_factor`;
+        only recomputed when a new :attr:`precision` is set (to change the precision matrix, do not modify it in place, but set a new array).
+        """
+        cache = getattr(self, '_precision_factor', None)
+        if cache is None or cache[0] is not self.precision:  # identity check only, comparing content would be as costly as the chi2
+            cache = self._precision_factor = (self.precision, precision_factor(self.precision, sizes=self._precision_block_sizes))
+        return cache[1]
+
+    @property
+    def _precision_block_sizes(self):
+        # Sizes of independent blocks of data vector, if any
+        return None
+
     def calculate(self):
         self.flatdiff = self.flattheory - self.flatdata
-        self.loglikelihood = -0.5 * chi2(self.flatdiff, self.precision)
+        self.loglikelihood = -0.5 * sum(chi2_factor(self.flatdiff[..., sl], factor) for sl, factor in self.precision_factor)
 
     def __getstate__(self):
         state = {}
@@ -438,6 +575,8 @@ class ObservablesGaussianLikelihood(BaseGaussianLikelihood):
     precision : array, default=None
         Precision matrix to be used instead of the inverse covariance.
     """
+    _calculate_with_batch = True
+
     def initialize(self, observables, covariance=None, scale_covariance=1., correct_covariance='hartlap-percival2014', precision=None, **kwargs):
         if not utils.is_sequence(observables):
             observables = [observables]
@@ -548,13 +687,14 @@ class ObservablesGaussianLikelihood(BaseGaussianLikelihood):
                 self.log_info('...resulting in a Percival 2014 factor of {:.4f}.'.format(self.percival2014_factor))
             self.precision = self.precision_hartlap2007 / self.percival2014_factor
 
-    def calculate(self):
-        self.flatdiff = self.flattheory - self.flatdata
-        self.loglikelihood = -0.5 * chi2(self.flatdiff, self.precision)
+    @property
+    def _precision_block_sizes(self):
+        # Observables may be independent
+        return [len(obs.flatdata) for obs in self.observables]
 
     @property
     def flattheory(self):
-        return jnp.concatenate([obs.flattheory for obs in self.observables], axis=0)
+        return jnp.concatenate([obs.flattheory for obs in self.observables], axis=-1)
 
     def to_covariance(self):
         from desilike.observables import ObservableCovariance
@@ -602,6 +742,7 @@ class ObservablesGaussianLikelihood(BaseGaussianLikelihood):
 class SumLikelihood(BaseLikelihood):
 
     _attrs = ['loglikelihood', 'logprior']
+    _calculate_with_batch = True
 
     def initialize(self, likelihoods, **kwargs):
         if not utils.is_sequence(likelihoods): likelihoods = [likelihoods]
@@ -508,6 +508,64 @@ def recv(source=ANY_SOURCE, tag=ANY_TAG, mpicomm=None):
     return data
 
 
+@CurrentMPIComm.enable
+def dynamic_map(func, tasks=None, mpiroot=0, mpicomm=None, tag=0):
+    """
+    Apply ``func`` to ``tasks``, with dynamic load-balancing: process ``mpiroot`` sends tasks
+    one by one to the other processes, as soon as they are idle. Process ``mpiroot`` does not call ``func``
+    (except if ``mpicomm.size == 1``).
+
+    Parameters
+    ----------
+    func : callable
+        Function to apply to each task.
+
+    tasks : list, default=None
+        List of tasks, only required on process ``mpiroot``.
+
+    mpiroot : int, default=0
+        Rank of process that distributes the tasks.
+
+    mpicomm : MPI communicator, default=None
+        Communicator. Defaults to current communicator.
+
+    tag : int, default=0
+        Message identifier.
+
+    Returns
+    -------
+    results : list
+        On process ``mpiroot``, list of ``func`` results, in the same order as ``tasks``; ``None`` on other processes.
+    """
+    if mpicomm.size == 1:
+        return [func(task) for task in tasks]
+    if mpicomm.rank == mpiroot:
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        status = Status()
+        itask, nworkers = 0, mpicomm.size - 1
+        while nworkers:
+            # Worker is idle, and sends back the result of its previous task (if any)
+            result = mpicomm.recv(source=ANY_SOURCE, tag=tag, status=status)
+            if result is not None:
+                results[result[0]] = result[1]
+            if itask < len(tasks):
+                mpicomm.send((itask, tasks[itask]), dest=status.Get_source(), tag=tag)
+                itask += 1
+            else:
+                mpicomm.send(None, dest=status.Get_source(), tag=tag)  # no more tasks
+                nworkers -= 1
+        return results
+    result = None
+    while True:
+        mpicomm.send(result, dest=mpiroot, tag=tag)
+        task = mpicomm.recv(source=mpiroot, tag=tag)
+        if task is None:
+            break
+        result = (task[0], func(task[1]))
+    return None
+
+
 @CurrentMPIComm.enable
 def bcast_seed(seed=None, mpicomm=None, size=None):
     """
@@ -5,6 +5,7 @@ from desilike.jax import numpy as jnp
 from desilike.jax import jit
 from desilike.base import BaseCalculator
 from desilike import plotting, utils
+from desilike.utils import sparsify_matrix, sparse_dot
 
 
 def window_matrix_bininteg(list_edges, resolution=1):
@@ -49,16 +50,8 @@ def window_matrix_bininteg(list_edges, resolution=1):
             line[ibin * resolution:(ibin + 1) * resolution] = tmp / tmp.sum()
             w.append(line)
         matrices.append(utils.matrix_lininterp(xin, np.concatenate(x)).dot(np.column_stack(w)))  # linear interpolation * integration weights
-    full_matrix = []
-    for iin, matin in enumerate(matrices):
-        line = []
-        for i, mat in enumerate(matrices):
-            if i == iin:
-                line.append(mat)
-            else:
-                line.append(np.zeros_like(mat))
-        full_matrix.append(line)
-    full_matrix = np.bmat(full_matrix).A
+    from scipy import linalg
+    full_matrix = linalg.block_diag(*matrices)
     return xin, full_matrix
 
 
@@ -132,6 +125,39 @@ def window_matrix_RR(soutedges, sedges, muedges, wcounts, ellsin=(0, 2, 4), reso
     return sin, full_matrix.T
 
 
+def trim_matrix(xin, matrix, rtol=0.):
+    """
+    Remove input coordinates at the edges of ``xin`` for which ``matrix`` is (close to) zero.
+
+    Parameters
+    ----------
+    xin : array
+        Input coordinates (the same for all input multipoles).
+
+    matrix : array
+        Matrix of shape ``(nout, nellsin * len(xin))``.
+
+    rtol : float, default=0.
+        Entries with absolute value less than or equal to ``rtol`` times the maximum absolute value of the row are considered zero.
+
+    Returns
+    -------
+    xin : array
+        Trimmed input coordinates.
+
+    matrix : array
+        Matrix restricted to trimmed input coordinates.
+    """
+    nout, nin = matrix.shape[0], len(xin)
+    absmatrix = np.abs(matrix)
+    used = np.any((absmatrix > rtol * np.max(absmatrix, axis=-1)[:, None]).reshape(nout, -1, nin), axis=(0, 1))
+    if not used.any():
+        return xin, matrix
+    start, stop = np.flatnonzero(used)[[0, -1]]
+    sl = slice(start, stop + 1)
+    return xin[sl], matrix.reshape(nout, -1, nin)[..., sl].reshape(nout, -1)
+
+
 def unpack(x, flatarray):
     toret = []
     nout = 0
@@ -197,8 +223,13 @@ class WindowedPowerSpectrumMultipoles(BaseCalculator):
 
     theory : BaseTheoryPowerSpectrumMultipoles
         Theory power spectrum multipoles, defaults to :class:`KaiserTracerPowerSpectrumMultipoles`.
+
+    wmatrix_rtol : float, default=1e-8
+        Window matrix entries with absolute value less than or equal to ``wmatrix_rtol`` times the maximum absolute value of the row are considered zero.
+        Input wavenumbers ``kin`` at the edges for which the window matrix is zero are removed (if no ``fiber_collisions``),
+        and the window matrix is stored in sparse format if it is sparse enough.
     """
-    def initialize(self, klim=None, k=None, kedges=None, ells=None, wmatrix=None, kin=None, kinrebin=1, kinlim=None, ellsin=None, shotnoise=None, wshotnoise=None, fiber_collisions=None, systematic_templates=None, theory=None):
+    def initialize(self, klim=None, k=None, kedges=None, ells=None, wmatrix=None, kin=None, kinrebin=1, kinlim=None, ellsin=None, shotnoise=None, wshotnoise=None, fiber_collisions=None, systematic_templates=None, theory=None, wmatrix_rtol=1e-8):
         from scipy import linalg
 
         _default_step = 0.01
@@ -382,6 +413,8 @@ class WindowedPowerSpectrumMultipoles(BaseCalculator):
                 self.matrix_full = self.matrix_full.dot(wmatrix_rebin.T)
             else:
                 assert all(np.allclose(xin, self.kin) for xin in wmatrix.xin), 'input coordinates of "wmatrix" are not the same for all multipoles; pass an k-coordinate array to "kin"'
+        if self.matrix_full is not None and fiber_collisions is None:
+            self.kin, self.matrix_full = trim_matrix(self.kin, self.matrix_full, rtol=wmatrix_rtol)
         if fiber_collisions is not None:
             self.theory.init.update(k=self.kin, ells=self.ellsin)  # fiber_collisions takes kin, ellsin from theory
             fiber_collisions.init.update(k=self.kin, ells=self.ellsin, theory=self.theory)
@@ -405,6 +438,10 @@ class WindowedPowerSpectrumMultipoles(BaseCalculator):
             shotnoise = float(shotnoise)
             if 'shotnoise' in getattr(self.theory, '_default_options', {}):
                 self.theory.init.update(shotnoise=shotnoise)
+        self.matrix_sparse = None
+        if self.matrix_full is not None:
+            self.matrix_sparse = sparsify_matrix(self.matrix_full, rtol=wmatrix_rtol)
+            if self.matrix_sparse is not None: self.matrix_full = None
         self.shotnoisein = np.array([shotnoise * (ell == 0) for ell in self.ellsin])
         wshotnoisebase = np.concatenate([np.full_like(k, (ell == 0), dtype='f8') for ell, k in zip(self.ells, self.k)])
         self.shotnoiseout = shotnoise * wshotnoisebase
@@ -415,13 +452,17 @@ class WindowedPowerSpectrumMultipoles(BaseCalculator):
 
     @jit(static_argnums=[0])
     def _apply(self, theory):
-        theory = jnp.ravel(theory)
-        if self.matrix_full is not None:
-            theory = jnp.dot(self.matrix_full, theory)
+        # theory of shape (..., len(ellsin), len(kin)), with optional batch dimensions
+        theory = jnp.asarray(theory)
+        theory = theory.reshape(theory.shape[:-2] + (-1,))
+        if self.matrix_sparse is not None:
+            theory = sparse_dot(self.matrix_sparse, theory)
+        elif self.matrix_full is not None:
+            theory = theory.dot(self.matrix_full.T)
         if self.offset is not None:
             theory = theory + self.offset
         if self.kmask is not None:
-            theory = theory[self.kmask]
+            theory = theory[..., self.kmask]
         return theory
 
     def calculate(self):
@@ -438,7 +479,7 @@ class WindowedPowerSpectrumMultipoles(BaseCalculator):
 
     def __getstate__(self):
         state = {}
-        for name in ['kin', 'ellsin', 'k', 'kedges', 'ells', 'fiducial', 'matrix_full', 'kmask', 'offset', 'flatpower', 'shotnoisein', 'shotnoiseout']:
+        for name in ['kin', 'ellsin', 'k', 'kedges', 'ells', 'fiducial', 'matrix_full', 'matrix_sparse', 'kmask', 'offset', 'flatpower', 'shotnoisein', 'shotnoiseout']:
             if hasattr(self, name):
                 state[name] = getattr(self, name)
         return state
@@ -524,8 +565,13 @@ class WindowedCorrelationFunctionMultipoles(BaseCalculator):
 
     theory : BaseTheoryCorrelationFunctionMultipoles
         Theory correlation function multipoles, defaults to :class:`KaiserTracerCorrelationFunctionMultipoles`.
+
+    wmatrix_rtol : float, default=1e-8
+        Window matrix entries with absolute value less than or equal to ``wmatrix_rtol`` times the maximum absolute value of the row are considered zero.
+        Input separations ``sin`` at the edges for which the window matrix is zero are removed (if no ``fiber_collisions``),
+        and the window matrix is stored in sparse format if it is sparse enough.
     """
-    def initialize(self, slim=None, s=None, sedges=None, ells=None, wmatrix=None, sin=None, sinrebin=1, sinlim=None, ellsin=None, fiber_collisions=None, systematic_templates=None, theory=None):
+    def initialize(self, slim=None, s=None, sedges=None, ells=None, wmatrix=None, sin=None, sinrebin=1, sinlim=None, ellsin=None, fiber_collisions=None, systematic_templates=None, theory=None, wmatrix_rtol=1e-8):
         from scipy import linalg
         _default_step = 5.
 
@@ -636,6 +682,8 @@ class WindowedCorrelationFunctionMultipoles(BaseCalculator):
             self.matrix_full = matrix_full.dot(wmatrix_rebin.T)
         else:
             raise ValueError('unrecognized wmatrix {}'.format(wmatrix))
+        if self.matrix_full is not None and fiber_collisions is None:
+            self.sin, self.matrix_full = trim_matrix(self.sin, self.matrix_full, rtol=wmatrix_rtol)
         if fiber_collisions is not None:
             self.theory.init.update(s=self.sin, ells=self.ellsin)  # fiber_collisions takes sin, ellsin from theory
             fiber_collisions.init.update(ells=self.ellsin, theory=self.theory)
@@ -654,6 +702,10 @@ class WindowedCorrelationFunctionMultipoles(BaseCalculator):
                 if fiber_collisions.with_uncorrelated: self.offset = self.matrix_full.dot(fiber_collisions.kernel_uncorrelated.ravel())
                 self.matrix_full = self.matrix_full.dot(np.bmat([[np.diag(kk) for kk in kernel] for kernel in fiber_collisions.kernel_correlated]).A)
                 self.ellsin, self.sin = fiber_collisions.ellsin, fiber_collisions.sin
+        self.matrix_sparse = None
+        if self.matrix_full is not None:
+            self.matrix_sparse = sparsify_matrix(self.matrix_full, rtol=wmatrix_rtol)
+            if self.matrix_sparse is not None: self.matrix_full = None
         self.theory.init.update(s=self.sin, ells=self.ellsin)
         if systematic_templates is not None:
             if not isinstance(systematic_templates, SystematicTemplateCorrelationFunctionMultipoles):
@@ -667,15 +719,19 @@ class WindowedCorrelationFunctionMultipoles(BaseCalculator):
 
     @jit(static_argnums=[0])
     def _apply(self, theory):
+        # theory of shape (..., len(ellsin), len(sin)), with optional batch dimensions
+        theory = jnp.asarray(theory)
         if self.matrix_diag is not None:
-            theory = jnp.sum(self.matrix_diag * theory[None, ...], axis=1)
-        theory = jnp.ravel(theory)
-        if self.matrix_full is not None:
-            theory = jnp.dot(self.matrix_full, theory)
+            theory = jnp.sum(self.matrix_diag * theory[..., None, :, :], axis=-2)
+        theory = theory.reshape(theory.shape[:-2] + (-1,))
+        if self.matrix_sparse is not None:
+            theory = sparse_dot(self.matrix_sparse, theory)
+        elif self.matrix_full is not None:
+            theory = theory.dot(self.matrix_full.T)
         if self.offset is not None:
             theory = theory + self.offset
         if self.smask is not None:
-            theory = theory[self.smask]
+            theory = theory[..., self.smask]
         return theory
 
     def calculate(self):
@@ -692,7 +748,7 @@ class WindowedCorrelationFunctionMultipoles(BaseCalculator):
 
     def __getstate__(self):
         state = {}
-        for name in ['sin', 'ellsin', 's', 'ells', 'sedges', 'matrix_diag', 'matrix_full', 'smask', 'offset', 'flatcorr']:
+        for name in ['sin', 'ellsin', 's', 'ells', 'sedges', 'matrix_diag', 'matrix_full', 'matrix_sparse', 'smask', 'offset', 'flatcorr']:
             if hasattr(self, name):
                 state[name] = getattr(self, name)
         return state
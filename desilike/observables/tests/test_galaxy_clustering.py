@@ -674,6 +674,27 @@ def test_integral_cosn():
         assert np.abs(test / ref - 1.) < 1e-6
 
 
+def test_sparse_window():
+
+    from desilike.observables.galaxy_clustering.window import trim_matrix, sparsify_matrix, sparse_dot
+
+    nout, nells, xin = 20, 3, np.linspace(0., 0.4, 80)
+    x = np.linspace(0.01, 0.2, nout)
+    matrix = np.exp(-(x[:, None] - xin)**2 / (2. * 0.01**2))
+    matrix = np.concatenate([matrix * (ill + 1) for ill in range(nells)], axis=-1)
+    trimmed_xin, trimmed_matrix = trim_matrix(xin, matrix, rtol=1e-8)
+    assert len(trimmed_xin) < len(xin)
+    theory = np.random.RandomState(seed=42).uniform(size=(4, nells, len(xin)))
+    mask = np.isin(xin, trimmed_xin)
+    assert np.allclose(theory[..., mask].reshape(4, -1).dot(trimmed_matrix.T), theory.reshape(4, -1).dot(matrix.T), rtol=1e-6)
+    sparse = sparsify_matrix(trimmed_matrix, rtol=1e-8)
+    assert sparse is not None
+    theory = theory[..., mask].reshape(4, -1)
+    assert np.allclose(sparse_dot(sparse, theory), theory.dot(trimmed_matrix.T), rtol=1e-6)
+    assert np.allclose(sparse_dot(sparse, theory[0]), trimmed_matrix.dot(theory[0]), rtol=1e-6)
+    assert sparsify_matrix(np.ones((nout, 10))) is None
+
+
 def test_fiber_collisions():
 
     from matplotlib import pyplot as plt
@@ -1112,6 +1133,7 @@ if __name__ == '__main__':
     # test_covariance_matrix_mocks()
     # test_compression()
     # test_integral_cosn()
+    # test_sparse_window()
     # test_fiber_collisions()
     # test_compression_window()
     # test_shapefit(run=False)
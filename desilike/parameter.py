@@ -2142,9 +2142,22 @@ class Samples(BaseParameterCollection):
         else:
             super(Samples, self).__init__(data=data, attrs=attrs)
 
-    def save(self, filename):
-        """Save samples to disk."""
+    def save(self, filename, columnar=False):
+        """
+        Save samples to disk.
+        If ``columnar``, save in a columnar format (directory ``filename``), see :class:`SampleStore`,
+        that can be opened with memory maps, i.e. reading only accessed arrays;
+        else, if ``filename`` ends with '.npz', save in numpy's compressed format,
+        otherwise in numpy's (pickled) format.
+        """
         filename = str(filename)
+        if columnar:
+            from desilike.samples.store import SampleStore
+            self.log_info('Saving {}.'.format(filename))
+            store = SampleStore(filename)
+            store.clear()
+            store.append(self)
+            return
         state = self.__getstate__()
         for array in state['data']: array['value'] = np.asarray(array['value'])  # could be jax
         state = {'__class__': utils.serialize_class(self.__class__), **state}
@@ -2166,6 +2179,10 @@ class Samples(BaseParameterCollection):
     def load(cls, filename):
         """Load samples from disk."""
         filename = str(filename)
+        if os.path.isdir(filename):  # columnar format, arrays are memory-mapped
+            from desilike.samples.store import SampleStore
+            cls.log_info('Loading {}.'.format(filename))
+            return SampleStore(filename).load()
         cls.log_info('Loading {}.'.format(filename))
         state = np.load(filename, allow_pickle=True)
         if filename.endswith('.npz'):
@@ -1,3 +1,4 @@
+import time
 import functools
 import logging
 import warnings
@@ -8,7 +9,7 @@ import numpy as np
 from desilike import utils, mpi, PipelineError
 from desilike.utils import BaseClass, expand_dict, TaskManager
 from desilike.samples import load_source
-from desilike.samples.profiles import Profiles, ParameterBestFit, ParameterGrid, ParameterProfiles
+from desilike.samples.profiles import Profiles, ParameterBestFit, ParameterCovariance, ParameterGrid, ParameterProfiles
 from desilike.parameter import ParameterPriorError, Samples, ParameterCollection, is_parameter_sequence
 from desilike.jax import jit
 from desilike.jax import numpy as jnp
@@ -266,6 +267,7 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
         try:
             import jax
             _vchi2 = jax.jit(chi2)
+            t0 = time.time()
             _vchi2(start[1], **aux)
             #raise ValueError
         except:
@@ -276,7 +278,7 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
             vchi2(start[0], **aux)
         else:
             if self.mpicomm.rank == 0:
-                self.log_info('Successfully jit input likelihood.')
+                self.log_info('Successfully jit input likelihood (compilation took {:.2f} s).'.format(time.time() - t0))
             vchi2 = _vchi2
         gchi2 = None
         if getattr(self, 'with_gradient', False):
@@ -292,6 +294,7 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
                 gchi2 = _gchi2
                 try:
                     _gchi2 = jax.jit(gchi2)
+                    t0 = time.time()
                     _gchi2(start[2], **aux)
                 except:
                     if self.mpicomm.rank == 0:
@@ -299,7 +302,7 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
                     gchi2(start[0], **aux)
                 else:
                     if self.mpicomm.rank == 0:
-                        self.log_info('Successfully jit input gradient.')
+                        self.log_info('Successfully jit input gradient (compilation took {:.2f} s).'.format(time.time() - t0))
                     gchi2 = _gchi2
         if chi2 is self.chi2:
             self._vchi2, self._gchi2 = vchi2, gchi2
@@ -359,7 +362,37 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
     def mpicomm(self, mpicomm):
         self._mpicomm = mpicomm
 
-    def maximize(self, niterations=None, start=None, **kwargs):
+    def _maximize_batch(self, start, chi2, varied_params, max_iterations=int(1e5), tol=None, **kwargs):
+        # Maximize from all starting points at once, with jax's BFGS vectorized over starting points
+        import jax
+        from jax.scipy import optimize
+
+        def minimize(start):
+            return optimize.minimize(chi2, start, method='BFGS', tol=tol, options={'maxiter': int(max_iterations)})
+
+        t0 = time.time()
+        result = jax.jit(jax.vmap(minimize))(jnp.asarray(start, dtype='f8'))
+        result = jax.tree_util.tree_map(np.asarray, result)
+        if self.mpicomm.rank == 0:
+            self.log_info('Batch maximization of {:d} starting points took {:.2f} s.'.format(len(start), time.time() - t0))
+        list_profiles = []
+        for ii in range(len(start)):
+            profiles = Profiles()
+            attrs = {'nfev': int(result.nfev[ii]), 'njev': int(result.njev[ii]), 'nit': int(result.nit[ii]), 'success': bool(result.success[ii]), 'status': int(result.status[ii])}
+            x, fun = result.x[ii], result.fun[ii]
+            if not np.isfinite(fun) or not np.all(np.isfinite(x)):
+                if self.mpicomm.rank == 0:
+                    self.log_warning('maximize failed for starting point {:d}: {}'.format(ii, attrs))
+                list_profiles.append(profiles)
+                continue
+            profiles.set(bestfit=ParameterBestFit([np.atleast_1d(xx) for xx in x] + [- 0.5 * np.atleast_1d(fun)], params=varied_params + ['logposterior'], attrs=attrs))
+            cov = 2. * result.hess_inv[ii]  # chi2 = -2 logposterior
+            profiles.set(error=Samples(np.diag(cov)**0.5, params=varied_params, attrs=attrs))
+            profiles.set(covariance=ParameterCovariance(cov, params=varied_params, attrs=attrs))
+            list_profiles.append(profiles)
+        return list_profiles
+
+    def maximize(self, niterations=None, start=None, batch=False, **kwargs):
         """
         Maximize :attr:`likelihood`.
         The following attributes are added to :attr:`profiles`:
@@ -378,6 +411,12 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
             Number of iterations, i.e. of runs of the profiler from independent starting points.
             If ``None``, defaults to :attr:`mpicomm.size` (if > 0, else 1).
 
+        batch : bool, default=False
+            If ``True``, all ``niterations`` maximizations are run in lock-step, with a :mod:`jax` BFGS minimizer
+            vectorized (:func:`jax.vmap`) over starting points, such that trial points of all starts are evaluated in a single likelihood call.
+            This requires the likelihood to be :mod:`jax`-differentiable; parameter limits are not enforced (other than through an infinite :math:`\chi^{2}`).
+            Only ``max_iterations`` and ``tol`` profiler-specific arguments are used.
+
         **kwargs : dict
             Optional profiler-specific arguments.
         """
@@ -389,47 +428,58 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
         if niterations is None: niterations = max(self.mpicomm.size, 1)
         niterations = int(niterations)
         start = self._get_start(start=start, niterations=niterations)
-        chi2, gradient = self._get_vchi2()
-        if gradient is not None:
-            kwargs['gradient'] = gradient
-        nprocs_per_iteration = max(self.mpicomm.size // niterations, 1)
         list_profiles = [None] * niterations
         mpicomm_bak = self.mpicomm
         from desilike import vmap
         vlikelihood = vmap(self.likelihood, backend=None, errors='return', return_derived=True)
-        with TaskManager(nprocs_per_task=nprocs_per_iteration, use_all_nprocs=True, mpicomm=self.mpicomm) as tm:
-            self.mpicomm = tm.mpicomm
-            for ii in tm.iterate(range(niterations)):
-                logposterior = -0.5 * self.chi2(start[ii])
-                p = self._maximize_one(start[ii], chi2, self.transformed_params, **kwargs)
-                if self.mpicomm.rank == 0:
-                    profiles = Profiles(start=Samples(start[ii][..., None], params=self.varied_params),
-                                        bestfit=ParameterBestFit(start[ii][..., None], params=self.varied_params,
-                                                                 loglikelihood=self.likelihood._param_loglikelihood, logprior=self.likelihood._param_logprior))
-                    profiles.bestfit.logposterior[...] = logposterior
-                    profiles.update(p)
-                    profiles = _profiles_transform(self, profiles)
-                    for param in self.likelihood.all_params.select(fixed=True, derived=False):
-                        profiles.bestfit[param] = np.array([param.value], dtype='f8')
-                    derived = vlikelihood(profiles.bestfit.to_dict(params=profiles.bestfit.params(input=True)))[0][1]
-                    #index_in_profile, index = self.derived[0].match(profiles.bestfit, params=profiles.start.params())
-                    #assert index_in_profile[0].size == 1
-                    #logposterior = -(self.derived[1][self.likelihood._param_loglikelihood][index] + self.derived[1][self.likelihood._param_logprior][index])
-                    #covariance = []
-                    #if logposterior.derivs:
-                    #    from desilike.parameter import ParameterPrecision
-                    #    solved_params = ParameterCollection([self.likelihood.all_params[param] for deriv in logposterior.derivs for param in deriv.keys()])
-                    #    covariance = ParameterPrecision(logposterior[0], params=solved_params).to_covariance()
-                    for array in derived:
-                        profiles.bestfit.set(array)
-                        #if array.param in covariance:
-                        #    profiles.error[array.param] = covariance.std([array.param])
-                    if profiles.bestfit._logposterior not in profiles.bestfit:
-                        profiles.bestfit.logposterior = profiles.bestfit[profiles.bestfit._loglikelihood] + profiles.bestfit[profiles.bestfit._logprior]
-                    profiles.bestfit.logposterior.param.update(derived=True, latex=utils.outputs_to_latex(profiles.bestfit._logposterior))
-                else:
-                    profiles = None
-                list_profiles[ii] = profiles
+
+        def get_profiles(ii, p):
+            logposterior = -0.5 * self.chi2(start[ii])
+            if self.mpicomm.rank == 0:
+                profiles = Profiles(start=Samples(start[ii][..., None], params=self.varied_params),
+                                    bestfit=ParameterBestFit(start[ii][..., None], params=self.varied_params,
+                                                             loglikelihood=self.likelihood._param_loglikelihood, logprior=self.likelihood._param_logprior))
+                profiles.bestfit.logposterior[...] = logposterior
+                profiles.update(p)
+                profiles = _profiles_transform(self, profiles)
+                for param in self.likelihood.all_params.select(fixed=True, derived=False):
+                    profiles.bestfit[param] = np.array([param.value], dtype='f8')
+                derived = vlikelihood(profiles.bestfit.to_dict(params=profiles.bestfit.params(input=True)))[0][1]
+                #index_in_profile, index = self.derived[0].match(profiles.bestfit, params=profiles.start.params())
+                #assert index_in_profile[0].size == 1
+                #logposterior = -(self.derived[1][self.likelihood._param_loglikelihood][index] + self.derived[1][self.likelihood._param_logprior][index])
+                #covariance = []
+                #if logposterior.derivs:
+                #    from desilike.parameter import ParameterPrecision
+                #    solved_params = ParameterCollection([self.likelihood.all_params[param] for deriv in logposterior.derivs for param in deriv.keys()])
+                #    covariance = ParameterPrecision(logposterior[0], params=solved_params).to_covariance()
+                for array in derived:
+                    profiles.bestfit.set(array)
+                    #if array.param in covariance:
+                    #    profiles.error[array.param] = covariance.std([array.param])
+                if profiles.bestfit._logposterior not in profiles.bestfit:
+                    profiles.bestfit.logposterior = profiles.bestfit[profiles.bestfit._loglikelihood] + profiles.bestfit[profiles.bestfit._logprior]
+                profiles.bestfit.logposterior.param.update(derived=True, latex=utils.outputs_to_latex(profiles.bestfit._logposterior))
+            else:
+                profiles = None
+            return profiles
+
+        if batch:
+            with TaskManager(nprocs_per_task=self.mpicomm.size, use_all_nprocs=True, mpicomm=self.mpicomm) as tm:
+                self.mpicomm = tm.mpicomm
+                list_p = self._maximize_batch(start, self.chi2, self.transformed_params, **kwargs)
+                for ii, p in enumerate(list_p):
+                    list_profiles[ii] = get_profiles(ii, p)
+        else:
+            chi2, gradient = self._get_vchi2()
+            if gradient is not None:
+                kwargs['gradient'] = gradient
+            nprocs_per_iteration = max(self.mpicomm.size // niterations, 1)
+            with TaskManager(nprocs_per_task=nprocs_per_iteration, use_all_nprocs=True, mpicomm=self.mpicomm) as tm:
+                self.mpicomm = tm.mpicomm
+                for ii in tm.iterate(range(niterations)):
+                    p = self._maximize_one(start[ii], chi2, self.transformed_params, **kwargs)
+                    list_profiles[ii] = get_profiles(ii, p)
         self.mpicomm = mpicomm_bak
         for iprofile, profile in enumerate(list_profiles):
             mpiroot_worker = self.mpicomm.rank if profile is not None else None
@@ -511,7 +561,7 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
         if gradient is not None: kwargs['gradient'] = gradient
         return _iterate_over_params(self, params, self._contour_one, chi2=chi2, cl=cl, **kwargs)
 
-    def grid(self, params=None, grid=None, size=1, cl=2, niterations=1, **kwargs):
+    def grid(self, params=None, grid=None, size=1, cl=2, niterations=1, continuation=False, **kwargs):
         """
         Compute best fits on grid for :attr:`likelihood`.
         The following attributes are added to :attr:`profiles`:
@@ -536,6 +586,13 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
         niterations : int, default=1
             Number of iterations, i.e. of runs of the profiler from independent starting points.
 
+        continuation : bool, default=False
+            If ``True``, grid points are optimized in sweeps outward from the global best fit (in :attr:`profiles`, if any, e.g. from :meth:`maximize`,
+            else from the grid center), each grid point being started from the best fit of its neighbor one step closer to the global best fit,
+            with initial step sizes given by its covariance (or that of :attr:`profiles`).
+            Only the first grid point is optimized from ``niterations`` starting points (including the global best fit, if any).
+            Grid points of each sweep are distributed over processes as soon as they are idle.
+
         **kwargs : dict
             Optional arguments for specific profiler.
         """
@@ -592,22 +649,89 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
 
         chi2, gradient = self._get_vchi2(chi2=chi2, aux=dict(point=get_point(0)))
 
-        with TaskManager(nprocs_per_task=nprocs_per_param, use_all_nprocs=True, mpicomm=self.mpicomm) as tm:
-            self.mpicomm = tm.mpicomm
-            for ipoint in tm.iterate(range(nsamples)):
-                self.derived = None
-                point = get_point(ipoint)
-                if gradient is not None:
-                    kwargs['gradient'] = lambda x: gradient(x, point)
-                if varied_params:
-                    profile = Profiles.concatenate([self._maximize_one(start, lambda x: chi2(x, point), varied_params, **kwargs) for start in start])
-                    try:
-                        logposterior = profile.bestfit.logposterior.max()
-                    except AttributeError:
-                        logposterior = -np.inf
+        def maximize_point(ipoint, start, varied_params):
+            # Return log-posterior, best fit and covariance (if any) at grid point ``ipoint``
+            self.derived = None
+            point = get_point(ipoint)
+            if gradient is not None:
+                kwargs['gradient'] = lambda x: gradient(x, point)
+            bestfit, covariance = None, None
+            if varied_params:
+                profile = Profiles.concatenate([self._maximize_one(start, lambda x: chi2(x, point), varied_params, **kwargs) for start in start])
+                try:
+                    logposterior = profile.bestfit.logposterior.max()
+                except AttributeError:
+                    logposterior = -np.inf
                 else:
-                    logposterior = -0.5 * chi2(jnp.array([], dtype='f8'), point)
-                states[ipoint] = logposterior
+                    bestfit = profile.bestfit.choice(params=varied_params, return_type='nparray')
+                    if 'covariance' in profile:
+                        covariance = profile.covariance.view(params=varied_params)
+            else:
+                logposterior = -0.5 * chi2(jnp.array([], dtype='f8'), point)
+            return logposterior, bestfit, covariance
+
+        if continuation:
+            shape = grid.shape
+            center_start, center_covariance = start, None
+            # Global best fit, in transformed coordinates
+            profiles = self.profiles
+            if profiles is not None and 'bestfit' in profiles:
+                bestfit = profiles.bestfit.choice(params=self.varied_params, return_type='nparray')
+                bestfit = (bestfit - self._params_transform_loc) / self._params_transform_scale
+                distance = sum(((flat_grid[param] - self._params_transform_loc[iparam]) / self._params_transform_scale[iparam] - bestfit[iparam])**2 for param, iparam in zip(grid_params, grid_indices))
+                center = np.unravel_index(np.argmin(distance), shape)
+                center_start = [bestfit[varied_indices]] + start[:niterations - 1]  # still niterations starting points
+                if 'covariance' in profiles:
+                    covariance = profiles.covariance.view(params=self.varied_params, fill='proposal') / np.outer(self._params_transform_scale, self._params_transform_scale)
+                    # Covariance of varied parameters at fixed grid parameters
+                    center_covariance = utils.inv(utils.inv(covariance)[np.ix_(varied_indices, varied_indices)])
+            else:
+                center = tuple(s // 2 for s in shape)
+            # Each grid point is started from the best fit of its neighbor one step closer to the center
+            sweeps, parents = {}, {}
+            for index in np.ndindex(*shape):
+                offset = np.array(index) - center
+                ipoint = np.ravel_multi_index(index, shape)
+                parents[ipoint] = None
+                if np.any(offset):
+                    idim = np.argmax(np.abs(offset))
+                    parent = list(index)
+                    parent[idim] -= np.sign(offset[idim])
+                    parents[ipoint] = np.ravel_multi_index(tuple(parent), shape)
+                sweeps.setdefault(np.sum(np.abs(offset)), []).append(ipoint)
+            size = self.mpicomm.size - (self.mpicomm.size > 1)  # rank 0 is manager
+            nprocs_per_param = max(size // max(len(sweep) for sweep in sweeps.values()), 1)
+            results = {}
+            with TaskManager(nprocs_per_task=nprocs_per_param, use_all_nprocs=True, schedule='dynamic', mpicomm=self.mpicomm) as tm:
+                self.mpicomm = tm.mpicomm
+                for isweep in sorted(sweeps):
+                    sweep_results = {}
+                    for ipoint in tm.iterate(sweeps[isweep]):
+                        parent = parents[ipoint]
+                        if parent is None:
+                            point_start, covariance = center_start, center_covariance
+                        else:
+                            point_start, covariance = results[parent][1:]
+                            point_start = [point_start] if point_start is not None else start
+                        point_varied_params = varied_params
+                        if covariance is not None:
+                            point_varied_params = varied_params.deepcopy()
+                            for param, std in zip(point_varied_params, np.diag(covariance)**0.5):
+                                param.update(proposal=std)
+                        logposterior, bestfit, point_covariance = maximize_point(ipoint, point_start, point_varied_params)
+                        if bestfit is None and parent is not None:  # failed, pass parent's to next points
+                            bestfit = results[parent][1]
+                        if point_covariance is None: point_covariance = covariance
+                        sweep_results[ipoint] = (logposterior, bestfit, point_covariance)
+                    for state in tm.basecomm.allgather(sweep_results if tm.mpicomm.rank == 0 else {}):
+                        results.update(state)
+            states = {ipoint: result[0] for ipoint, result in results.items()}
+
+        else:
+            with TaskManager(nprocs_per_task=nprocs_per_param, use_all_nprocs=True, mpicomm=self.mpicomm) as tm:
+                self.mpicomm = tm.mpicomm
+                for ipoint in tm.iterate(range(nsamples)):
+                    states[ipoint] = maximize_point(ipoint, start, varied_params)[0]
 
         self.mpicomm = mpicomm_bak
         states = self.mpicomm.gather(states, root=0)
@@ -650,6 +774,10 @@ class BaseProfiler(BaseClass, metaclass=RegisteredProfiler):
         niterations : int, default=1
             Number of iterations, i.e. of runs of the profiler from independent starting points.
 
+        continuation : bool, default=False
+            If ``True``, grid points are optimized in sweeps outward from the global best fit, each started from the best fit
+            of its neighbor one step closer to the global best fit, see :meth:`grid`.
+
         **kwargs : dict
             Optional arguments for specific profiler.
         """
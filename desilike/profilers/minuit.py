@@ -115,6 +115,10 @@ class MinuitProfiler(BaseProfiler):
             Number of iterations, i.e. of runs of the profiler from independent starting points.
             If ``None``, defaults to :attr:`mpicomm.size - 1` (if > 0, else 1).
 
+        batch : bool, default=False
+            If ``True``, run all maximizations in lock-step with a :mod:`jax` BFGS minimizer vectorized over starting points,
+            see :meth:`BaseProfiler.maximize`.
+
         max_iterations : int, default=int(1e5)
             Maximum number of likelihood evaluations.
         """
@@ -247,6 +251,10 @@ class MinuitProfiler(BaseProfiler):
         niterations : int, default=1
             Number of iterations, i.e. of runs of the profiler from independent starting points.
 
+        continuation : bool, default=False
+            If ``True``, grid points are optimized in sweeps outward from the global best fit, each started from the best fit
+            of its neighbor one step closer to the global best fit, see :meth:`BaseProfiler.grid`.
+
         max_iterations : int, default=int(1e5)
             Maximum number of likelihood evaluations.
         """
@@ -277,6 +285,10 @@ class MinuitProfiler(BaseProfiler):
         niterations : int, default=1
             Number of iterations, i.e. of runs of the profiler from independent starting points.
 
+        continuation : bool, default=False
+            If ``True``, grid points are optimized in sweeps outward from the global best fit, each started from the best fit
+            of its neighbor one step closer to the global best fit, see :meth:`BaseProfiler.grid`.
+
         max_iterations : int, default=int(1e5)
             Maximum number of likelihood evaluations.
         """
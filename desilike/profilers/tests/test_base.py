@@ -36,8 +36,15 @@ def test_profilers():
         assert profiles.bestfit['LRG.loglikelihood'].param.derived
         assert profiles.bestfit.logposterior.param.latex() == '\mathcal{L}'
         assert profiles.bestfit.logposterior.param.derived
+        if Profiler is MinuitProfiler and not kwargs:
+            profiles_batch = Profiler(likelihood, seed=42).maximize(niterations=4, batch=True)
+            assert profiles_batch.bestfit.logposterior.size == 4
+            assert np.allclose(profiles_batch.bestfit.logposterior.max(), profiles.bestfit.logposterior.max(), atol=0.1)
         profiler.profile(params=['df'], size=4)
         profiler.grid(params=['df', 'dm'], size=(2, 2))
+        logposterior = profiler.profiles.grid.logposterior
+        profiler.grid(params=['df', 'dm'], size=(2, 2), continuation=True)
+        assert np.allclose(profiler.profiles.grid.logposterior, logposterior, rtol=1e-3, atol=1e-2)
         if Profiler is MinuitProfiler:
             profiler.interval(params=['df'])
             profiler.contour(params=['df', 'dm'], cl=1, size=10)
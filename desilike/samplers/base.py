@@ -1,4 +1,6 @@
+import os
 import sys
+import time
 import numbers
 import functools
 import logging
@@ -9,7 +11,7 @@ import numpy as np
 
 from desilike import utils, mpi, PipelineError
 from desilike.utils import BaseClass, TaskManager, is_path
-from desilike.samples import Chain, Samples, load_source
+from desilike.samples import Chain, Samples, SampleStore, load_source
 from desilike.samples import diagnostics as sample_diagnostics
 from desilike.parameter import ParameterPriorError
 from desilike.jax import jit
@@ -72,7 +74,7 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
     nwalkers = 1
     _check_same_input = False
 
-    def __init__(self, likelihood, rng=None, seed=None, max_tries=1000, chains=None, ref_scale=1., save_fn=None, mpicomm=None):
+    def __init__(self, likelihood, rng=None, seed=None, max_tries=1000, chains=None, ref_scale=1., save_fn=None, save_append=False, mpicomm=None):
         """
         Initialize posterior sampler.
 
@@ -100,6 +102,11 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
         save_fn : str, Path, default=None
             If not ``None``, save samples to this location.
 
+        save_append : bool, default=False
+            If ``True``, ``save_fn`` are :class:`SampleStore` directories, to which only new samples are appended at each save
+            (instead of rewriting full chains); chains are then memory-mapped.
+            To resume, pass the same path in ``chains``, see also ``tail`` and ``burnin`` options of :func:`load_source`.
+
         mpicomm : mpi.COMM_WORLD, default=None
             MPI communicator. If ``None``, defaults to ``likelihood``'s :attr:`BaseLikelihood.mpicomm`.
         """
@@ -130,6 +137,7 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
         if self.mpicomm.rank != 0:
             self.chains = [None] * nchains
         self.save_fn = save_fn
+        self.save_append = bool(save_append)
         if save_fn is not None:
             if is_path(save_fn):
                 self.save_fn = [str(save_fn).replace('*', '{}').format(i) for i in range(self.nchains)]
@@ -140,6 +148,7 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
         self._set_rng(rng=rng, seed=seed)
         self.diagnostics = {}
         self.derived = None
+        self._running_covariances = {}
 
     @bcast_values
     def logposterior(self, values):
@@ -233,12 +242,15 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
 
         #self.likelihood.mpicomm = mpi.COMM_SELF
         self.likelihood()  # initialize before jit
+        pipeline = self.likelihood.runtime_info.pipeline
+        # Ahead-of-time compiled pipeline (see BasePipeline.compile): no need to trace and compile at startup
+        aot = bool(getattr(pipeline, '_compiled', None))
         vlikelihood = self.likelihood
         from desilike import vmap
         try:
             import jax
             _vlikelihood = vmap(vlikelihood, backend='jax', errors='return', return_derived=True)
-            _vlikelihood(get_start())
+            if not aot: _vlikelihood(get_start())
             #raise ValueError
         except:
             if self.mpicomm.rank == 0:
@@ -249,19 +261,54 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
             if self.mpicomm.rank == 0:
                 self.log_info('Successfully vmap input likelihood.')
             vlikelihood = _vlikelihood
-        try:
-            import jax
-            _vlikelihood = jax.jit(vlikelihood)
-            _vlikelihood(get_start())
-            #raise ValueError
-        except:
+        monitor = self.likelihood.runtime_info.monitor
+        if aot:
+            # Batch sizes that were not compiled ahead-of-time are jitted when first encountered
+            vlikelihood = jax.jit(vlikelihood)
             if self.mpicomm.rank == 0:
-                self.log_info('Could *not* jit input likelihood.')
+                self.log_info('Using ahead-of-time compiled likelihood.')
         else:
-            if self.mpicomm.rank == 0:
-                self.log_info('Successfully jit input likelihood.')
-            vlikelihood = _vlikelihood
-        vlikelihood = vmap(vlikelihood, backend='mpi', errors='return')
+            try:
+                import jax
+                _vlikelihood = jax.jit(vlikelihood)
+                t0 = time.time()
+                _vlikelihood(get_start())
+                #raise ValueError
+            except:
+                if self.mpicomm.rank == 0:
+                    self.log_info('Could *not* jit input likelihood.')
+            else:
+                compile_time = time.time() - t0
+                if self.mpicomm.rank == 0:
+                    self.log_info('Successfully jit input likelihood (compilation took {:.2f} s).'.format(compile_time))
+                monitor.increment('jax_compile')
+                monitor.increment('jax_compile_time', compile_time)
+                jvlikelihood = _vlikelihood
+
+                @functools.wraps(jvlikelihood)
+                def vlikelihood(*args, **kwargs):
+                    if not getattr(self, '_profile', False):
+                        return jvlikelihood(*args, **kwargs)
+                    # Keep track of time spent in the jitted likelihood, see BasePipeline.profile_report
+                    t0 = time.time()
+                    toret = jax.block_until_ready(jvlikelihood(*args, **kwargs))
+                    monitor.increment('jax_run')
+                    monitor.increment('jax_run_time', time.time() - t0)
+                    return toret
+
+        if aot:
+            # Use ahead-of-time compiled functions for matching batch sizes
+            # Distinct name, as vlikelihood is rebound below
+            uncompiled_vlikelihood = vlikelihood
+
+            @functools.wraps(uncompiled_vlikelihood)
+            def vlikelihood(params, **kwargs):
+                compiled = None if kwargs else pipeline.get_compiled(params, return_derived=True)
+                if compiled is not None:
+                    return compiled({name: np.asarray(value, dtype='f8') for name, value in params.items()})
+                return uncompiled_vlikelihood(params, **kwargs)
+
+        vlikelihood = vmap(vlikelihood, backend='mpi', errors='return', monitor=self.likelihood.runtime_info.monitor)
         def _vlikelihood(*args, **kwargs):
             return vlikelihood(*args, **kwargs, mpicomm=self.mpicomm)
         self._vlikelihood = _vlikelihood
@@ -353,6 +400,40 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
         chain.logposterior.param.update(derived=True, latex=utils.outputs_to_latex(chain._logposterior))
         return chain
 
+    def _get_running_covariance(self, *key):
+        # Return running covariance (of :attr:`varied_params`) for ``key``, created if it does not exist
+        if key not in self._running_covariances:
+            self._running_covariances[key] = sample_diagnostics.RunningCovariance(self.varied_params)
+        return self._running_covariances[key]
+
+    def _add_chains(self, chains):
+        # Add new chains to :attr:`chains`, and save them (on rank 0)
+        attrs = {name: getattr(self.likelihood, name, None) for name in ['size', 'nvaried', 'ndof', 'hartlap2007_factor', 'percival2014_factor']}
+        for ichain, (chain, new_chain) in enumerate(zip(self.chains, chains)):
+            if new_chain is None:
+                continue
+            new_chain.attrs.update(attrs)
+            if chain is None:  # new chain, running covariances are outdated
+                self._running_covariances = {key: value for key, value in self._running_covariances.items() if key[-1] != ichain}
+            if self.save_fn is not None and self.save_append:
+                # Only write new points, then memory-map the full chain
+                store = SampleStore(self.save_fn[ichain])
+                if chain is None:  # new chain
+                    store.clear()
+                elif len(chain) > store.size:  # e.g. chain to resume from is not in store
+                    new_chain = Chain.concatenate(chain[store.size:], new_chain)
+                store.append(new_chain)
+                self.chains[ichain] = store.load()
+                continue
+            if chain is None:
+                self.chains[ichain] = new_chain.deepcopy()
+            else:
+                self.chains[ichain] = Chain.concatenate(chain, new_chain)
+            self.chains[ichain].attrs.update(attrs)
+        if self.save_fn is not None and not self.save_append:
+            for ichain, chain in enumerate(self.chains):
+                if chain is not None: chain.save(self.save_fn[ichain])
+
     def run(self, start=None, **kwargs):
         """
         Run chains. Sampling can be interrupted anytime, and resumed by providing
@@ -394,17 +475,7 @@ class BasePosteriorSampler(BaseClass, metaclass=RegisteredSampler):
         self.diagnostics['ncall'] = ncalls
         self.diagnostics['naccepted'] = [chain.size if chain is not None else 0 for chain in chains]
         if self.mpicomm.rank == 0:
-            for ichain, (chain, new_chain) in enumerate(zip(self.chains, chains)):
-                if new_chain is not None:
-                    if chain is None:
-                        self.chains[ichain] = new_chain.deepcopy()
-                    else:
-                        self.chains[ichain] = Chain.concatenate(chain, new_chain)
-                    attrs = {name: getattr(self.likelihood, name, None) for name in ['size', 'nvaried', 'ndof', 'hartlap2007_factor', 'percival2014_factor']}
-                    self.chains[ichain].attrs.update(attrs)
-            if self.save_fn is not None:
-                for ichain, chain in enumerate(self.chains):
-                    if chain is not None: chain.save(self.save_fn[ichain])
+            self._add_chains(chains)
         return self.chains
 
 
@@ -412,7 +483,7 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
 
     """Base class for samplers which can run independent chains in parallel."""
 
-    def run(self, min_iterations=0, max_iterations=sys.maxsize, check_every=300, check=None, **kwargs):
+    def run(self, min_iterations=0, max_iterations=sys.maxsize, check_every=300, check=None, profile=False, **kwargs):
         """
         Run chains. Sampling can be interrupted anytime, and resumed by providing
         the path to the saved chains in ``chains`` argument of :meth:`__init__`.
@@ -438,6 +509,11 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
             If ``True`` or ``None``, convergence checks are run.
             A dictionary of convergence criteria can be provided, see :meth:`check`.
 
+        profile : bool, str, Path, default=False
+            If ``True``, log the profiling report of the likelihood pipeline (see :meth:`BasePipeline.profile_report`) every ``check_every`` iterations.
+            If a path, write it to this file instead.
+            Calls to the jitted likelihood are only timed (waiting for their results) if ``profile``.
+
         **kwargs : dict
             Optional sampler-specific arguments.
         """
@@ -447,6 +523,7 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
         run_check = bool(check) or isinstance(check, dict)
         if run_check and not isinstance(check, dict):
             check = {}
+        self._profile = bool(profile)  # time jitted likelihood calls
 
         def _run_batch(niterations):
             chains, ncalls = [[None] * self.nchains for i in range(2)]
@@ -483,17 +560,17 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
             self.diagnostics['naccepted'] = [chain.size if chain is not None else 0 for chain in chains]
 
             if self.mpicomm.rank == 0:
-                for ichain, (chain, new_chain) in enumerate(zip(self.chains, chains)):
-                    if new_chain is not None:
-                        if chain is None:
-                            self.chains[ichain] = new_chain.deepcopy()
-                        else:
-                            self.chains[ichain] = Chain.concatenate(chain, new_chain)
-                        attrs = {name: getattr(self.likelihood, name, None) for name in ['size', 'nvaried', 'ndof', 'hartlap2007_factor', 'percival2014_factor']}
-                        self.chains[ichain].attrs.update(attrs)
-                if self.save_fn is not None:
-                    for ichain, chain in enumerate(self.chains):
-                        if chain is not None: chain.save(self.save_fn[ichain])
+                self._add_chains(chains)
+
+            if profile:
+                report = self.likelihood.runtime_info.pipeline.profile_report(mpicomm=self.mpicomm)
+                if self.mpicomm.rank == 0:
+                    if isinstance(profile, bool):
+                        self.log_info('Profiling report:\n{}'.format(report))
+                    else:
+                        utils.mkdir(os.path.dirname(profile))
+                        with open(profile, 'w') as file:
+                            file.write(report + '\n')
 
             is_converged = False
             if run_check:
@@ -566,12 +643,16 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
 
         if self.mpicomm.rank == 0:
 
+            key = (nsplits, burnin)
             if 0 < burnin < 1:
                 burnin = int(burnin * self.chains[0].shape[0] + 0.5)
 
             lensplits = (self.chains[0].shape[0] - burnin) // nsplits
 
             split_samples = [chain[burnin + islab * lensplits:burnin + (islab + 1) * lensplits] for islab in range(nsplits) for chain in self.chains]
+            # For Gelman-Rubin, running covariances, only updated with new samples
+            split_running = [self._get_running_covariance('check', *key, islab, ichain).update_window(chain, start=burnin + islab * lensplits, stop=burnin + (islab + 1) * lensplits)
+                             for islab in range(nsplits) for ichain, chain in enumerate(self.chains)]
 
             if any(samples.size < 1 for samples in split_samples):
                 toret = False
@@ -581,13 +662,13 @@ class BaseBatchPosteriorSampler(BasePosteriorSampler):
                 toret = True
 
                 try:
-                    eigen_gr = sample_diagnostics.gelman_rubin(split_samples, self.varied_params, method='eigen', check_valid='ignore').max() - 1
+                    eigen_gr = sample_diagnostics.gelman_rubin(split_running, method='eigen', check_valid='ignore').max() - 1
                 except ValueError:
                     eigen_gr = np.nan
                 toret &= diagnostics.add_test('eigen_gr', 'max eigen Gelman-Rubin - 1', eigen_gr, limits=(min_eigen_gr, max_eigen_gr), **kw)
 
                 try:
-                    diag_gr = sample_diagnostics.gelman_rubin(split_samples, self.varied_params, method='diag').max() - 1
+                    diag_gr = sample_diagnostics.gelman_rubin(split_running, method='diag').max() - 1
                 except ValueError:
                     diag_gr = np.nan
                 toret &= diagnostics.add_test('diag_gr', 'max diag Gelman-Rubin - 1', diag_gr, limits=(min_diag_gr, max_diag_gr), **kw)
@@ -1,10 +1,11 @@
 import numpy as np
 
 from desilike import mpi
-from desilike.base import vmap
 from desilike.parameter import ParameterPriorError, Samples
+from desilike.samples import SampleStore
 from desilike.utils import BaseClass, expand_dict
 from .base import RegisteredSampler
+from .utils import evaluate_samples
 
 
 class GridSampler(BaseClass, metaclass=RegisteredSampler):
@@ -12,7 +13,7 @@ class GridSampler(BaseClass, metaclass=RegisteredSampler):
     """Evalue calculator on a grid."""
     name = 'grid'
 
-    def __init__(self, calculator, mpicomm=None, save_fn=None, **kwargs):
+    def __init__(self, calculator, mpicomm=None, save_fn=None, mpi_schedule='static', store=None, store_chunk_size=None, **kwargs):
         r"""
         Initialize grid.
 
@@ -27,6 +28,17 @@ class GridSampler(BaseClass, metaclass=RegisteredSampler):
         save_fn : str, Path, default=None
             If not ``None``, save samples to this location.
 
+        mpi_schedule : str, default='static'
+            'static' to split samples evenly between processes, 'dynamic' to send them to idle processes
+            (better load-balancing if calculation time varies much across the parameter space), see :func:`vmap`.
+
+        store : str, Path, SampleStore, default=None
+            If not ``None``, path to (or) :class:`SampleStore` where evaluations are appended on the fly.
+            Points already in the store are not evaluated again, such that an interrupted run can be resumed.
+
+        store_chunk_size : int, default=None
+            Number of points evaluated between two updates of ``store``. Defaults to 10 times the number of processes.
+
         size : int, dict, default=1
             A dictionary mapping parameter name to grid size for this parameter.
             Can be a single value, used for all parameters.
@@ -47,6 +59,11 @@ class GridSampler(BaseClass, metaclass=RegisteredSampler):
         self.mpicomm = mpicomm
         self.varied_params = self.calculator.varied_params
         self.save_fn = save_fn
+        self.mpi_schedule = mpi_schedule
+        self.store = None
+        if self.mpicomm.rank == 0 and store is not None:
+            self.store = store if isinstance(store, SampleStore) else SampleStore(store)
+        self.store_chunk_size = store_chunk_size
         self.set_grid(**kwargs)
 
     @property
@@ -107,13 +124,10 @@ class GridSampler(BaseClass, metaclass=RegisteredSampler):
         if kwargs: self.set_grid(**kwargs)
 
         #self.calculator.mpicomm = mpi.COMM_SELF
-        vcalculate = vmap(self.calculator, backend='mpi', return_derived=True)
-        derived = vcalculate(self.samples.to_dict() if self.mpicomm.rank == 0 else {}, mpicomm=self.mpicomm)[1]
+        self.samples = evaluate_samples(self.calculator, self.samples, mpicomm=self.mpicomm, mpi_schedule=self.mpi_schedule,
+                                        store=self.store, store_chunk_size=self.store_chunk_size)
 
         if self.mpicomm.rank == 0:
-            for param in self.calculator.all_params.select(fixed=True, derived=False):
-                self.samples[param] = np.full(self.samples.shape, param.value, dtype='f8')
-            self.samples.update(derived)
             if self.save_fn is not None:
                 self.samples.save(self.save_fn)
         else:
@@ -422,10 +422,13 @@ class MCMCSampler(BaseBatchPosteriorSampler):
                 n_slow = sum(len(b) for b in blocks[:first_fast_block_index])
                 n_fast = len(self.varied_params) - n_slow
                 nsteps_drag = int(oversample_factors[first_fast_block_index] * n_fast / n_slow + 0.5)
+                # Keep states of slow calculators at the current and proposed slow points
+                slow = self.likelihood.runtime_info.pipeline.set_slow_cache(list(itertools.chain(*blocks[first_fast_block_index:])), cache_size=2)
                 if self.mpicomm.rank == 0:
                     self.log_info('Dragging:')
                     self.log_info('1 step: {}'.format(blocks[:first_fast_block_index]))
                     self.log_info('{:d} steps: {}'.format(nsteps_drag, blocks[first_fast_block_index:]))
+                    self.log_info('Caching states of slow calculators {}.'.format([calculator.__class__.__name__ for calculator in slow]))
         elif np.any(oversample_factors > 1):
             if self.mpicomm.rank == 0:
                 self.log_info('Oversampling with factors:')
@@ -468,9 +471,14 @@ class MCMCSampler(BaseBatchPosteriorSampler):
                 burnin = self.learn_check['burnin']
                 learn = self.check(**self.learn_check, diagnostics=self.learn_diagnostics, quiet=True)
             if learn and self.mpicomm.rank == 0:
-                chain = Chain.concatenate([chain.remove_burnin(burnin) for chain in self.chains])
-                if chain.size > 1:
-                    covariance = chain.covariance(params=self.varied_params)
+                # Running covariances, updated with new samples only
+                running, size = [], 0
+                for ichain, chain in enumerate(self.chains):
+                    start = int((burnin * len(chain) if 0 < burnin < 1 else burnin) + 0.5)
+                    running.append(self._get_running_covariance('learn', burnin, ichain).update_window(chain, start=start))
+                    size += chain[start:].size
+                if size > 1:
+                    covariance = sum(running).covariance()
         covariance = self.mpicomm.bcast(covariance, root=0)
         if covariance is not None:
             try:
@@ -3,10 +3,11 @@ import numpy as np
 from scipy.stats import qmc
 from scipy.stats.qmc import Sobol, Halton, LatinHypercube
 
-from desilike.base import vmap
 from desilike.parameter import ParameterPriorError, Samples
+from desilike.samples import SampleStore
 from desilike.utils import BaseClass
 from .base import RegisteredSampler
+from .utils import evaluate_samples
 
 
 class RQuasiRandomSequence(qmc.QMCEngine):
@@ -51,7 +52,7 @@ class QMCSampler(BaseClass, metaclass=RegisteredSampler):
     """Quasi Monte-Carlo sequences, using :mod:`scipy.qmc` (+ RQuasiRandomSequence)."""
     name = 'qmc'
 
-    def __init__(self, calculator, samples=None, mpicomm=None, engine='rqrs', save_fn=None, **kwargs):
+    def __init__(self, calculator, samples=None, mpicomm=None, engine='rqrs', save_fn=None, mpi_schedule='static', store=None, store_chunk_size=None, **kwargs):
         """
         Initialize QMC sampler.
 
@@ -72,6 +73,17 @@ class QMCSampler(BaseClass, metaclass=RegisteredSampler):
         save_fn : str, Path, default=None
             If not ``None``, save samples to this location.
 
+        mpi_schedule : str, default='static'
+            'static' to split samples evenly between processes, 'dynamic' to send them to idle processes
+            (better load-balancing if calculation time varies much across the parameter space), see :func:`vmap`.
+
+        store : str, Path, SampleStore, default=None
+            If not ``None``, path to (or) :class:`SampleStore` where evaluations are appended on the fly.
+            Points already in the store are not evaluated again, such that an interrupted run can be resumed.
+
+        store_chunk_size : int, default=None
+            Number of points evaluated between two updates of ``store``. Defaults to 10 times the number of processes.
+
         seed : int, default=None
             Random seed.
 
@@ -89,6 +101,11 @@ class QMCSampler(BaseClass, metaclass=RegisteredSampler):
         if self.mpicomm.rank == 0 and samples is not None:
             self.samples = samples if isinstance(samples, Samples) else Samples.load(samples)
         self.save_fn = save_fn
+        self.mpi_schedule = mpi_schedule
+        self.store = None
+        if self.mpicomm.rank == 0 and store is not None:
+            self.store = store if isinstance(store, SampleStore) else SampleStore(store)
+        self.store_chunk_size = store_chunk_size
 
     @property
     def mpicomm(self):
@@ -101,7 +118,9 @@ class QMCSampler(BaseClass, metaclass=RegisteredSampler):
     def run(self, niterations=300):
         """
         Run sampling. Sampling can be interrupted anytime, and resumed by providing
-        the path to the saved samples in ``samples`` argument of :meth:`__init__`.
+        the path to the saved samples in ``samples`` argument of :meth:`__init__`,
+        or, if ``store`` was provided to :meth:`__init__`, by simply running again
+        (provided the QMC sequence is reproducible, e.g. 'rqrs' engine, or fixed ``seed``).
 
         Parameters
         ----------
@@ -122,13 +141,10 @@ class QMCSampler(BaseClass, metaclass=RegisteredSampler):
             samples = qmc.scale(self.engine.random(n=niterations), lower, upper)
             samples = Samples(samples.T, params=self.varied_params)
 
-        vcalculate = vmap(self.calculator, backend='mpi', return_derived=True)
-        derived = vcalculate(samples.to_dict() if self.mpicomm.rank == 0 else {}, mpicomm=self.mpicomm)[1]
+        samples = evaluate_samples(self.calculator, samples if self.mpicomm.rank == 0 else None, mpicomm=self.mpicomm, mpi_schedule=self.mpi_schedule,
+                                   store=self.store, store_chunk_size=self.store_chunk_size)
 
         if self.mpicomm.rank == 0:
-            for param in self.calculator.all_params.select(fixed=True, derived=False):
-                samples[param] = np.full(samples.shape, param.value, dtype='f8')
-            samples.update(derived)
             if self.samples is None:
                 self.samples = samples
             else:
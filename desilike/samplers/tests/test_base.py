@@ -124,6 +124,30 @@ def test_fixed():
         sampler.run()
 
 
+def test_store():
+
+    import shutil
+    from desilike.samples import SampleStore
+
+    likelihood = Likelihood()
+    store_dir = './_tests/store'
+    shutil.rmtree(store_dir, ignore_errors=True)
+    sampler = QMCSampler(likelihood, store=store_dir, store_chunk_size=4)
+    samples = sampler.run(niterations=10)
+    store = SampleStore(store_dir)
+    assert store.size == 10
+    assert np.allclose(store.load()['loglikelihood'], samples['loglikelihood'])
+    # Resume, with more points
+    sampler = QMCSampler(likelihood, store=store_dir)
+    samples2 = sampler.run(niterations=20)
+    assert store.size == 20
+    assert np.allclose(samples2['loglikelihood'][:10], samples['loglikelihood'])
+    sampler = GridSampler(likelihood, size=3, store=store_dir)
+    samples = sampler.run()
+    assert samples.shape == (3, 3) and store.size == 29
+    assert np.all(store.lookup(samples))
+
+
 def test_importance():
 
     from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
@@ -606,6 +630,7 @@ if __name__ == '__main__':
     test_samplers()
     #test_nautilus()
     #test_fixed()
+    #test_store()
     #test_importance()
     #test_error()
     #test_mcmc()
@@ -32,3 +32,86 @@ def python_to_numpy_random_state(pystate):
         cached_gaussian if has_gauss else 0.0
     )
     return npstate
+
+
+def evaluate_samples(calculator, samples, mpicomm, mpi_schedule='static', store=None, store_chunk_size=None):
+    """
+    Evaluate ``calculator`` at input ``samples`` (on rank 0), and return these samples,
+    with fixed and derived parameters added (on rank 0, ``None`` on other ranks).
+
+    Parameters
+    ----------
+    calculator : BaseCalculator
+        Input calculator.
+
+    samples : Samples
+        Samples (on rank 0) of ``calculator``'s varied parameters.
+
+    mpicomm : mpi.COMM_WORLD
+        MPI communicator.
+
+    mpi_schedule : str, default='static'
+        MPI scheduling, see :func:`vmap`.
+
+    store : SampleStore, default=None
+        If not ``None``, store (on rank 0) where evaluations are appended on the fly.
+        Points already in ``store`` are not evaluated again.
+
+    store_chunk_size : int, default=None
+        Number of points evaluated between two updates of ``store``.
+        Defaults to 10 times the number of processes.
+
+    Returns
+    -------
+    samples : Samples
+    """
+    import numpy as np
+    from desilike.base import vmap
+
+    vcalculate = vmap(calculator, backend='mpi', mpi_schedule=mpi_schedule, return_derived=True)
+
+    def evaluate(samples):
+        derived = vcalculate(samples.to_dict() if mpicomm.rank == 0 else {}, mpicomm=mpicomm)[1]
+        if mpicomm.rank == 0:
+            for param in calculator.all_params.select(fixed=True, derived=False):
+                samples[param] = np.full(samples.shape, param.value, dtype='f8')
+            samples.update(derived)
+            return samples
+        return None
+
+    if mpicomm.bcast(store is None, root=0):
+        return evaluate(samples)
+
+    if store_chunk_size is None:
+        store_chunk_size = 10 * mpicomm.size
+    store_chunk_size = max(int(store_chunk_size), 1)
+    todo, shape, names = None, None, None
+    if mpicomm.rank == 0:
+        shape, names = samples.shape, samples.names()
+        samples = samples.ravel()
+        todo = np.flatnonzero(~store.lookup(samples, params=names))
+        calculator.log_info('{:d} / {:d} points already in store {}.'.format(samples.size - todo.size, samples.size, store.dirname))
+    ntodo = mpicomm.bcast(todo.size if mpicomm.rank == 0 else None, root=0)
+    for start in range(0, ntodo, store_chunk_size):
+        chunk = evaluate(samples[todo[start:start + store_chunk_size]] if mpicomm.rank == 0 else None)
+        if mpicomm.rank == 0:
+            store.append(chunk)
+    if mpicomm.rank == 0:
+        stored = store.load()
+        index_in_samples, index_in_store = stored.match(samples, params=names)
+        index = np.zeros(samples.size, dtype='i8')
+        index[index_in_samples[0]] = index_in_store[0]
+        missing = np.ones(samples.size, dtype='?')
+        missing[index_in_samples[0]] = False
+        toret = stored[index]
+        if missing.any():  # should not happen; make missing evaluations visible
+            calculator.log_warning('{:d} / {:d} points not found in store {}.'.format(missing.sum(), samples.size, store.dirname))
+            for array in toret:
+                name = array.param.basename
+                if name in names: continue
+                fill = -np.inf if name in ['loglikelihood', 'logprior', 'logposterior'] else np.nan
+                toret[array.param] = np.where(missing.reshape((-1,) + (1,) * (array.ndim - 1)), fill, array)
+            for name in names:
+                toret[name] = samples[name]
+        return toret.reshape(shape)
+    return None
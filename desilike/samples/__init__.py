@@ -1,5 +1,6 @@
 """Classes and functions dedicated to handling samples drawn from likelihood."""
 
+import os
 import glob
 
 import numpy as np
@@ -7,14 +8,15 @@ import numpy as np
 from ..parameter import ParameterCollection, Samples
 from .chain import Chain
 from .profiles import Profiles, ParameterBestFit, ParameterCovariance, ParameterProfiles, ParameterContours, ParameterGrid
+from .store import SampleStore
 from . import diagnostics, utils
 from .utils import BaseClass, is_path
 
 
-__all__ = ['Samples', 'Chain', 'Profiles', 'ParameterBestFit', 'ParameterCovariance', 'ParameterContours', 'ParameterProfiles', 'ParameterGrid', 'diagnostics']
+__all__ = ['Samples', 'Chain', 'Profiles', 'ParameterBestFit', 'ParameterCovariance', 'ParameterContours', 'ParameterProfiles', 'ParameterGrid', 'SampleStore', 'diagnostics']
 
 
-def load_source(source, choice=None, cov=None, burnin=None, params=None, default=False, return_type=None):
+def load_source(source, choice=None, cov=None, burnin=None, tail=None, params=None, default=False, return_type=None):
     """
     Internal function that from a source (:class:`Chain`, :class:`Profiles`, :class:`ParameterCovariance`, or path to these objects),
     return best fit, mean, or covariance matrix.
@@ -34,6 +36,10 @@ def load_source(source, choice=None, cov=None, burnin=None, params=None, default
         If input is chains, remove burnin:
         if between 0 and 1, remove that fraction of samples;
         else, remove ``burnin`` first points.
+        Chains saved as :class:`SampleStore` (directories) are memory-mapped, and only the remaining points are read.
+
+    tail : int, default=None
+        If input is chains, keep only the last ``tail`` points (after burnin removal), e.g. to resume sampling.
 
     params : list, ParameterCollection, default=None
         Parameters to compute best fit / mean / covariance for. Defaults to all parameters.
@@ -55,15 +61,31 @@ def load_source(source, choice=None, cov=None, burnin=None, params=None, default
     if is_not_sequence: fns = [source]
     else: fns = source
 
+    def get_start(size):
+        start = 0
+        if burnin is not None:
+            start = burnin * size if 0 < burnin < 1 else burnin
+            start = int(start + 0.5)
+        if tail is not None:
+            start = max(start, size - int(tail))
+        return start
+
     sources = []
     for fn in fns:
         if is_path(fn):
-            sources += [BaseClass.load(ff) for ff in glob.glob(fn)]
+            for ff in glob.glob(str(fn)):
+                if os.path.isdir(ff):  # SampleStore: only read (lazily) what is needed
+                    store = SampleStore(ff)
+                    sources.append((store.load(start=get_start(store.size)), True))
+                else:
+                    sources.append((BaseClass.load(ff), False))
         else:
-            sources.append(fn)
+            sources.append((fn, False))
 
-    if burnin is not None:
-        sources = [source.remove_burnin(burnin) if hasattr(source, 'remove_burnin') else source for source in sources]
+    if burnin is not None or tail is not None:
+        sources = [source[get_start(len(source)):] if not trimmed and hasattr(source, 'remove_burnin') else source for source, trimmed in sources]
+    else:
+        sources = [source for source, trimmed in sources]
 
     if choice is not None or cov is not None:
         if not all(type(source) is type(sources[0]) for source in sources):
@@ -16,8 +16,10 @@ def gelman_rubin(chains, params=None, nsplits=None, statistic='mean', method='ei
 
     Parameters
     ----------
-    chains : list, Chain
+    chains : list, Chain, RunningCovariance
         List of or single :class:`Chain` instance(s).
+        Can also be a list of :class:`RunningCovariance` instances (one for each chain),
+        in which case ``params``, ``nsplits`` and ``statistic`` are ignored.
 
     params : list, ParameterCollection
         Parameters to compute Gelman-Rubin statistics for.
@@ -57,6 +59,17 @@ def gelman_rubin(chains, params=None, nsplits=None, statistic='mean', method='ei
     """
     if not utils.is_sequence(chains):
         chains = [chains]
+    if all(isinstance(chain, RunningCovariance) for chain in chains):
+        if len(chains) < 2:
+            raise ValueError('Provide a list of at least 2 running covariances to estimate Gelman-Rubin')
+        sizes = [chain.size for chain in chains]
+        if any(size < 2 for size in sizes):
+            raise ValueError('Not enough samples ({}) to estimate Gelman-Rubin'.format(sizes))
+        means = np.array([chain.mean for chain in chains])
+        covs = np.array([chain.covariance() for chain in chains])
+        wsums = np.array([chain.sum_weight for chain in chains])
+        w2sums = np.array([chain.sum_weight2 for chain in chains])
+        return _gelman_rubin(means, covs, wsums, w2sums, isscalar=False, method=method, return_matrices=return_matrices, check_valid=check_valid)
     nchains = len(chains)
     if nchains < 2:
         if nsplits is None or nchains * nsplits < 2:
@@ -73,12 +86,19 @@ def gelman_rubin(chains, params=None, nsplits=None, statistic='mean', method='ei
     if statistic == 'mean':
 
         def statistic(chain, params):
-            return [chain.mean(param) for param in params]
+            values, aweight, fweight = _get_values(chain, params)
+            return np.average(values, weights=aweight * fweight, axis=-1)
 
     means = np.asarray([statistic(chain, params) for chain in chains])
     covs = np.asarray([chain.covariance(params) for chain in chains])
     wsums = np.asarray([chain.weight.sum() for chain in chains])
     w2sums = np.asarray([(chain.weight * chain.aweight).sum() for chain in chains])
+    return _gelman_rubin(means, covs, wsums, w2sums, isscalar=isscalar, method=method, return_matrices=return_matrices, check_valid=check_valid)
+
+
+def _gelman_rubin(means, covs, wsums, w2sums, isscalar=False, method='eigen', return_matrices=False, check_valid='raise'):
+    # Gelman-Rubin statistics from chain means, covariances, sums of weights and sums of weight * aweight
+    nchains = len(means)
     # W = "within"
     Wn1 = np.average(covs, weights=wsums, axis=0)
     Wn = np.average(((wsums - w2sums / wsums) / wsums)[:, None, None] * covs, weights=wsums, axis=0)
@@ -130,16 +150,21 @@ def autocorrelation(chains, params=None):
         chains = [chains]
 
     if params is None: params = chains[0].params(varied=True)
-    if is_parameter_sequence(params):
-        return np.array([autocorrelation(chains, param) for param in params])
+    isscalar = not is_parameter_sequence(params)
+    if isscalar: params = [params]
 
-    toret = 0
+    x = []
     for chain in chains:
-        value = chain[params].ravel()
-        weight = chain.weight.ravel()
-        x = (value - np.average(value, weights=weight)) * weight
-        toret += _autocorrelation_1d(x)
-    return toret / len(chains)
+        values, aweight, fweight = _get_values(chain, params)
+        weight = aweight * fweight
+        x.append((values - np.average(values, weights=weight, axis=-1)[:, None]) * weight)
+    if all(xx.shape == x[0].shape for xx in x):  # all parameters x chains at once
+        toret = np.mean(_autocorrelation_nd(np.array(x)), axis=0)
+    else:
+        toret = sum(_autocorrelation_nd(xx) for xx in x) / len(x)
+    if isscalar:
+        return toret[0]
+    return toret
 
 
 def integrated_autocorrelation_time(chains, params=None, criterion='sokal', min_corr=None, reliable=50, check_valid='warn', **kwargs):
@@ -197,9 +222,23 @@ def integrated_autocorrelation_time(chains, params=None, criterion='sokal', min_
 
     if params is None: params = chains[0].params(varied=True)
 
-    if is_parameter_sequence(params):
-        return np.array([integrated_autocorrelation_time(chains, param, criterion=criterion, reliable=reliable, check_valid=check_valid, **kwargs) for param in params])
+    sizes = [chain.size for chain in chains]
+    if not all(size == sizes[0] for size in sizes):
+        raise ValueError('Input chains must have same length, found {}'.format(sizes))
+    if any(size < 2 for size in sizes):
+        raise ValueError('Not enough samples ({}) to estimate autocorrelation time'.format(sizes))
 
+    isscalar = not is_parameter_sequence(params)
+    if isscalar: params = [params]
+    corrs = autocorrelation(chains, params)  # all parameters at once
+    toret = np.array([_integrated_autocorrelation_time_from_corr(corr, sizes[0], param=param, criterion=criterion, reliable=reliable, check_valid=check_valid, **kwargs) for param, corr in zip(params, corrs)])
+    if isscalar:
+        return toret[0]
+    return toret
+
+
+def _integrated_autocorrelation_time_from_corr(corr, size, param=None, criterion='sokal', reliable=50, check_valid='warn', **kwargs):
+    # Integrated autocorrelation time from normalized autocorrelation corr, see :func:`integrated_autocorrelation_time`
     # Automated windowing procedure following Sokal (1989)
     def auto_window(taus, c):
         m = np.arange(len(taus)) < c * taus
@@ -207,14 +246,7 @@ def integrated_autocorrelation_time(chains, params=None, criterion='sokal', min_
             return np.argmin(m)
         return len(taus) - 1
 
-    sizes = [chain.size for chain in chains]
-    if not all(size == sizes[0] for size in sizes):
-        raise ValueError('Input chains must have same length, found {}'.format(sizes))
-    if any(size < 2 for size in sizes):
-        raise ValueError('Not enough samples ({}) to estimate autocorrelation time'.format(sizes))
-
-    size = chains[0].size
-    corr = autocorrelation(chains, params)
+    corr = np.array(corr)
     toret = None
     if criterion == 'min_corr':
         min_corr = kwargs.get('min_corr', 0.)
@@ -249,7 +281,7 @@ def integrated_autocorrelation_time(chains, params=None, criterion='sokal', min_
     else:
         raise ValueError('could not understand {}; criterion must be provided to stop integration of correlation time'.format(criterion))
     if reliable * toret > size:
-        msg = 'The chain is shorter than {:d} times the integrated autocorrelation time for {}. Use this estimate with caution and run a longer chain!\n'.format(reliable, params)
+        msg = 'The chain is shorter than {:d} times the integrated autocorrelation time for {}. Use this estimate with caution and run a longer chain!\n'.format(reliable, param)
         msg += 'N/{:d} = {:.0f};\ntau: {}'.format(reliable, size / reliable, toret)
         if check_valid == 'raise':
             raise ValueError(msg)
@@ -260,6 +292,12 @@ def integrated_autocorrelation_time(chains, params=None, criterion='sokal', min_
     return toret
 
 
+def _get_values(chain, params):
+    # Return array of parameter values of shape (number of parameter components, chain size), aweight and fweight
+    values = np.concatenate([np.asarray(chain[param][()]).reshape(chain.size, -1) for param in params], axis=-1).T  # [()] to take order 0 derivatives
+    return values, np.asarray(chain.aweight).ravel(), np.asarray(chain.fweight).ravel()
+
+
 def _autocorrelation_1d(x):
     """
     Estimate the normalized autocorrelation function.
@@ -275,23 +313,51 @@ def _autocorrelation_1d(x):
     acf : array
         The autocorrelation function of the time series.
     """
-    from numpy import fft
     x = np.atleast_1d(x)
     if x.ndim != 1:
         raise ValueError('Invalid dimensions for 1D autocorrelation function, found {:d}'.format(x.ndim))
-    if x.size < 2:
-        raise ValueError('Not enough samples to estimate autocorrelation, found {:d}'.format(x.size))
+    return _autocorrelation_nd(x)
 
-    n = 2**(2 * len(x) - 1).bit_length()
+
+def _autocorrelation_nd(x):
+    """
+    Estimate the normalized autocorrelation function along the last axis of ``x``,
+    with a single (batched) FFT for all other axes.
+
+    Parameters
+    ----------
+    x : array
+        Time series, of shape (..., size).
+
+    Returns
+    -------
+    acf : array
+        The autocorrelation functions, of same shape as ``x``.
+    """
+    from numpy import fft
+    x = np.asarray(x)
+    size = x.shape[-1]
+    if size < 2:
+        raise ValueError('Not enough samples to estimate autocorrelation, found {:d}'.format(size))
+
+    n = 2**(2 * size - 1).bit_length()
 
     # Compute the FFT and then (from that) the auto-correlation function
-    f = fft.fft(x, n=n)
-    acf = fft.ifft(f * np.conjugate(f))[:len(x)].real
+    f = fft.rfft(x, n=n, axis=-1)
+    acf = fft.irfft(f * np.conjugate(f), n=n, axis=-1)[..., :size]
 
-    acf /= acf[0]
+    acf /= acf[..., :1]
     return acf
 
 
+def _lagged_products(x, y, nlags):
+    # Return sum_t x_t y_{t+k} for k < nlags, along the last axis, with FFTs
+    from numpy import fft
+    size = x.shape[-1]
+    n = 2**(2 * size - 1).bit_length()
+    return fft.irfft(np.conjugate(fft.rfft(x, n=n, axis=-1)) * fft.rfft(y, n=n, axis=-1), n=n, axis=-1)[..., :min(nlags, size)]
+
+
 def geweke(chains, params=None, first=0.1, last=0.5):
     """
     Estimate Geweke statistics, i.e. the difference of chain averages in the first and last samples,
@@ -321,22 +387,252 @@ def geweke(chains, params=None, first=0.1, last=0.5):
         chains = [chains]
 
     if params is None: params = chains[0].params(varied=True)
-    if is_parameter_sequence(params):
-        return np.array([geweke(chains, param, first=first, last=last) for param in params])
+    isscalar = not is_parameter_sequence(params)
+    if isscalar: params = [params]
+
+    def mean_var(values, aweight, fweight):
+        # Same as np.cov(value, aweights=aweight, fweights=fweight), for all parameters at once
+        weight = aweight * fweight
+        v1, v2 = np.sum(weight), np.sum(weight * aweight)
+        mean = np.average(values, weights=weight, axis=-1)
+        var = np.sum(weight * (values - mean[:, None])**2, axis=-1) / (v1 - v2 / v1)
+        return mean, var
 
     toret = []
     for chain in chains:
-        # params is single param
-        value, aweight, fweight = chain[params].ravel(), chain.aweight.ravel(), chain.fweight.ravel()
-        ifirst, ilast = int(first * value.size + 0.5), int(last * value.size + 0.5)
-        value_first, value_last = value[:ifirst], value[ilast:]
-        if value_first.size < 2 or value_last.size < 2:
-            raise ValueError('Not enough samples ({:d}) to estimate geweke'.format(value.size))
-        aweight_first, aweight_last = aweight[:ifirst], aweight[ilast:]
-        fweight_first, fweight_last = fweight[:ifirst], fweight[ilast:]
-        diff = np.abs(np.average(value_first, weights=aweight_first * fweight_first) - np.average(value_last, weights=aweight_last * fweight_last))
-        # np.cov is 0-d
-        diff /= (np.cov(value_first, aweights=aweight_first, fweights=fweight_first) + np.cov(value_last, aweights=aweight_last, fweights=fweight_last))**0.5
-        toret.append(diff)
-
-    return np.array(toret)
+        values, aweight, fweight = _get_values(chain, params)
+        size = values.shape[-1]
+        ifirst, ilast = int(first * size + 0.5), int(last * size + 0.5)
+        if ifirst < 2 or size - ilast < 2:
+            raise ValueError('Not enough samples ({:d}) to estimate geweke'.format(size))
+        mean_first, var_first = mean_var(values[:, :ifirst], aweight[:ifirst], fweight[:ifirst])
+        mean_last, var_last = mean_var(values[:, ilast:], aweight[ilast:], fweight[ilast:])
+        toret.append(np.abs(mean_first - mean_last) / (var_first + var_last)**0.5)
+
+    toret = np.array(toret).T  # (number of parameters, number of chains)
+    if isscalar:
+        return toret[0]
+    return toret
+
+
+class RunningCovariance(utils.BaseClass):
+    r"""
+    Running (weighted) mean and covariance, updated with new samples (and down-dated with removed samples)
+    in :math:`O(n)`, with :math:`n` the number of new (or removed) samples, following Welford / Chan et al. updates.
+    Covariance is the same as :meth:`Chain.covariance` of the accumulated samples.
+
+    .. code-block:: python
+
+        running = RunningCovariance(params)
+        running.update(chain[:100])
+        running.update(chain[100:200])
+        running.update(chain[:50], remove=True)
+        running.covariance()  # chain[50:200].covariance(params)
+
+    """
+    def __init__(self, params):
+        """
+        Initialize :class:`RunningCovariance`.
+
+        Parameters
+        ----------
+        params : list, ParameterCollection
+            Parameters to accumulate mean and covariance for.
+        """
+        self.params = list(params)
+        self.clear()
+
+    def clear(self):
+        """Remove all samples."""
+        self.size, self.sum_weight, self.sum_weight2, self.mean, self.m2 = 0, 0., 0., 0., 0.
+        self.start = self.stop = 0
+        return self
+
+    def update(self, chain, remove=False):
+        """
+        Add (or remove, if ``remove``) samples.
+
+        Parameters
+        ----------
+        chain : Chain
+            Samples to add or remove.
+
+        remove : bool, default=False
+            If ``True``, remove these samples, which should have been added before.
+        """
+        if not chain.size:
+            return self
+        values, aweight, fweight = _get_values(chain, self.params)
+        weight = aweight * fweight
+        sum_weight, sum_weight2 = np.sum(weight), np.sum(weight * aweight)
+        mean = np.average(values, weights=weight, axis=-1)
+        diff = values - mean[:, None]
+        m2 = (diff * weight).dot(diff.T)
+        size = values.shape[-1]
+        if remove:  # merging with negative weights
+            size, sum_weight, sum_weight2, m2 = -size, -sum_weight, -sum_weight2, -m2
+        new_sum_weight = self.sum_weight + sum_weight
+        self.size += size
+        if self.size <= 0 or new_sum_weight <= 0.:
+            return self.clear()
+        delta = mean - self.mean
+        self.mean = self.mean + delta * sum_weight / new_sum_weight
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * self.sum_weight * sum_weight / new_sum_weight
+        self.sum_weight, self.sum_weight2 = new_sum_weight, self.sum_weight2 + sum_weight2
+        return self
+
+    def update_window(self, chain, start=0, stop=None):
+        """
+        Slide window of accumulated samples to ``chain[start:stop]``,
+        adding and removing only the samples that enter or leave the window, if possible.
+        ``chain`` is assumed to only grow (new samples appended) between calls.
+
+        Parameters
+        ----------
+        chain : Chain
+            Chain.
+
+        start : int, default=0
+            Start of window.
+
+        stop : int, default=None
+            End of window. Defaults to the chain length.
+        """
+        start, stop, _ = slice(start, stop).indices(len(chain))
+        if start < self.start or stop < self.stop or start >= self.stop:  # no overlap, restart from scratch
+            self.clear()
+            self.update(chain[start:stop])
+        else:
+            self.update(chain[self.start:start], remove=True)
+            self.update(chain[self.stop:stop])
+        self.start, self.stop = start, stop
+        return self
+
+    def __iadd__(self, other):
+        sum_weight = self.sum_weight + other.sum_weight
+        if sum_weight <= 0.:
+            return self
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.sum_weight / sum_weight
+        self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * self.sum_weight * other.sum_weight / sum_weight
+        self.sum_weight, self.sum_weight2 = sum_weight, self.sum_weight2 + other.sum_weight2
+        self.size += other.size
+        return self
+
+    def __add__(self, other):
+        new = self.copy()
+        new += other
+        return new
+
+    def __radd__(self, other):
+        if other == 0: return self.copy()
+        return self.__add__(other)
+
+    def covariance(self, ddof=1):
+        """Return covariance matrix (as computed by :func:`np.cov` with ``aweights`` and ``fweights``)."""
+        return np.atleast_2d(self.m2 / (self.sum_weight - ddof * self.sum_weight2 / self.sum_weight))
+
+
+class IncrementalAutocorrelation(utils.BaseClass):
+    r"""
+    Autocorrelation and integrated autocorrelation time, updated with new chain segments
+    rather than recomputed from scratch: each update costs :math:`O((n + \mathrm{max\_lag}) \log(n + \mathrm{max\_lag}))`,
+    with :math:`n` the number of new samples.
+    Autocorrelation is only estimated up to lag ``max_lag``.
+
+    .. code-block:: python
+
+        iact = IncrementalAutocorrelation(params)
+        for ... :  # run sampler
+            iact.update(new_chains)  # new segments of each chain
+            print(iact.integrated_autocorrelation_time())
+
+    """
+    def __init__(self, params, max_lag=10000):
+        """
+        Initialize :class:`IncrementalAutocorrelation`.
+
+        Parameters
+        ----------
+        params : list, ParameterCollection
+            Parameters to compute autocorrelation statistics for.
+
+        max_lag : int, default=10000
+            Maximum lag for the autocorrelation. Should be significantly larger than the autocorrelation time.
+        """
+        self.params = list(params)
+        self.max_lag = int(max_lag)
+        self.chains = []
+
+    def update(self, chains):
+        """
+        Update statistics with new chain segments.
+
+        Parameters
+        ----------
+        chains : list, Chain
+            List of or single :class:`Chain` instance(s): new segments, in the same order at each call.
+        """
+        if not utils.is_sequence(chains):
+            chains = [chains]
+        if not self.chains:
+            self.chains = [None] * len(chains)
+        if len(chains) != len(self.chains):
+            raise ValueError('Provide {:d} chain segments, found {:d}'.format(len(self.chains), len(chains)))
+        for ichain, chain in enumerate(chains):
+            values, aweight, fweight = _get_values(chain, self.params)
+            weight = aweight * fweight
+            # x = (value - mean) * weight, and sum_t x_t x_{t+k} = A_A - mean * (A_B + B_A) + mean^2 * B_B, with A = value * weight and B = weight
+            new = np.concatenate([values * weight, weight[None, :]], axis=0)
+            state = self.chains[ichain]
+            if state is None:
+                state = self.chains[ichain] = {'size': 0, 'sum_weight': 0., 'sum_value': 0., 'tail': new[:, :0], 'products': 0.}
+            tail = state['tail']
+            z = np.concatenate([tail, new], axis=-1)
+            products = np.array([_lagged_products(z, z[-1:], self.max_lag), _lagged_products(z[-1:], z, self.max_lag), _lagged_products(z, z, self.max_lag)])
+            if tail.shape[-1]:
+                tail_products = np.array([_lagged_products(tail, tail[-1:], self.max_lag), _lagged_products(tail[-1:], tail, self.max_lag), _lagged_products(tail, tail, self.max_lag)])
+                products[..., :tail_products.shape[-1]] -= tail_products  # remove pairs already accounted for
+            nlags = products.shape[-1]
+            if np.ndim(state['products']):
+                state['products'][..., :nlags] += products
+                products = state['products']
+            elif nlags < self.max_lag:  # pad to max_lag
+                products = np.concatenate([products, np.zeros(products.shape[:-1] + (self.max_lag - nlags,), dtype=products.dtype)], axis=-1)
+            state['products'] = products
+            state['size'] += values.shape[-1]
+            state['sum_weight'] += np.sum(weight)
+            state['sum_value'] = state['sum_value'] + np.sum(values * weight, axis=-1)
+            state['tail'] = z[:, -self.max_lag:]
+
+    @property
+    def size(self):
+        """Number of samples in each chain."""
+        return [state['size'] for state in self.chains]
+
+    def autocorrelation(self):
+        """Return autocorrelation (averaged over all chains), of shape (number of parameters, min(max_lag, chain size))."""
+        if not self.chains:
+            raise ValueError('Provide chains to estimate autocorrelation')
+        sizes = self.size
+        if any(size < 2 for size in sizes):
+            raise ValueError('Not enough samples ({}) to estimate autocorrelation'.format(sizes))
+        toret = 0
+        nlags = min(self.max_lag, min(sizes))
+        for state in self.chains:
+            (AB, BA, AA), BB = state['products'][..., :-1, :nlags], state['products'][2, -1:, :nlags]
+            mean = (state['sum_value'] / state['sum_weight'])[:, None]
+            acf = AA - mean * (AB + BA) + mean**2 * BB
+            toret += acf / acf[..., :1]
+        return toret / len(self.chains)
+
+    def integrated_autocorrelation_time(self, criterion='sokal', reliable=50, check_valid='warn', **kwargs):
+        """
+        Return integrated autocorrelation time (averaged over all chains), see :func:`integrated_autocorrelation_time`
+        for the description of input arguments.
+        """
+        sizes = self.size
+        if not all(size == sizes[0] for size in sizes):
+            raise ValueError('Input chains must have same length, found {}'.format(sizes))
+        corrs = self.autocorrelation()
+        return np.array([_integrated_autocorrelation_time_from_corr(corr, sizes[0], param=param, criterion=criterion, reliable=reliable, check_valid=check_valid, **kwargs) for param, corr in zip(self.params, corrs)])
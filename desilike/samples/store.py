@@ -0,0 +1,205 @@
+"""Append-only, on-disk store for samples (e.g. calculator evaluations, chains)."""
+
+import os
+import json
+
+import numpy as np
+
+from desilike.parameter import Parameter, Samples
+
+from . import utils
+from .utils import BaseClass
+
+
+def _json_default(obj):
+    # Convert numpy types for the JSON header
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('object of type {} cannot be saved in the header'.format(type(obj).__name__))
+
+
+class SampleStore(BaseClass):
+    """
+    Append-only store of samples on disk, typically calculator evaluations (input parameters and derived quantities) or chains.
+
+    Samples are saved in directory :attr:`dirname`, as one raw binary file per parameter (with per-point values stored contiguously),
+    plus a JSON header holding parameters, derivatives, dtypes and per-point shapes.
+    This is also the format used by :meth:`Samples.save` with ``columnar=True``.
+    New points (rows along the first axis of samples) are appended with :meth:`append`, such that samples can be saved on the fly
+    and resumed after an interruption: incomplete points (e.g. if the job is killed while writing) are discarded.
+    Samples can be read back (in part) as memory maps, see :meth:`load`.
+
+    Note
+    ----
+    I/O is performed on the process calling the methods only; with MPI, typically use it on rank 0.
+    """
+    _header_fn = 'header.json'
+
+    def __init__(self, dirname):
+        """
+        Initialize store.
+
+        Parameters
+        ----------
+        dirname : str, Path
+            Directory where samples are saved. If it already contains samples, they are used as a starting point.
+        """
+        self.dirname = str(dirname)
+        self.header = None
+        fn = os.path.join(self.dirname, self._header_fn)
+        if os.path.isfile(fn):
+            with open(fn, 'r') as file:
+                self.header = json.load(file)
+
+    def _get_column_fn(self, icolumn):
+        return os.path.join(self.dirname, 'data.{:d}.bin'.format(icolumn))
+
+    @staticmethod
+    def _get_itemsize(column):
+        return np.dtype(column['dtype']).itemsize * int(np.prod(column['shape'], dtype='i8'))
+
+    def names(self):
+        """Return parameter names in store."""
+        if self.header is None: return []
+        return [Parameter.from_state(column['param']).name for column in self.header['data']]
+
+    @property
+    def size(self):
+        """Number of (complete) points in store."""
+        if self.header is None:
+            return 0
+        toret = None
+        for icolumn, column in enumerate(self.header['data']):
+            fn = self._get_column_fn(icolumn)
+            size = os.path.getsize(fn) // self._get_itemsize(column) if os.path.isfile(fn) else 0
+            toret = size if toret is None else min(toret, size)
+        return toret or 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """Remove all samples from store."""
+        if self.header is not None:
+            for icolumn in range(len(self.header['data'])):
+                fn = self._get_column_fn(icolumn)
+                if os.path.isfile(fn): os.remove(fn)
+            os.remove(os.path.join(self.dirname, self._header_fn))
+        self.header = None
+
+    def _write_header(self, samples):
+        header = {'__class__': utils.serialize_class(samples.__class__), **samples.__getstate__()}
+        if self.header is None:
+            header['data'] = []
+            for array in samples:
+                value = np.asarray(array.value)
+                header['data'].append({'param': array.param.__getstate__(), 'derivs': array.derivs, 'dtype': value.dtype.str, 'shape': value.shape[1:]})
+        else:  # only update attributes
+            header['data'] = self.header['data']
+        utils.mkdir(self.dirname)
+        fn = os.path.join(self.dirname, self._header_fn)
+        tmp_fn = fn + '.tmp'
+        with open(tmp_fn, 'w') as file:
+            json.dump(header, file, default=_json_default, indent=1)
+        os.replace(tmp_fn, fn)  # atomic
+        with open(fn, 'r') as file:  # to get same types as when reading
+            self.header = json.load(file)
+
+    def append(self, samples):
+        """
+        Append input samples to store, along their first axis.
+        On first call, parameters, derivatives, dtypes and per-point shapes are fixed for all subsequent calls;
+        other attributes (e.g. :attr:`Samples.attrs`) are updated.
+
+        Parameters
+        ----------
+        samples : Samples
+            Samples to append.
+        """
+        if not samples.shape:
+            samples = samples.reshape(1)
+        if not samples.size:
+            return
+        if self.header is not None and set(samples.names()) != set(self.names()):
+            raise ValueError('cannot append samples to store {} as parameters do not match: {} != {}'.format(self.dirname, samples.names(), self.names()))
+        self._write_header(samples)
+        names = self.names()
+        size = self.size
+        for icolumn, (name, column) in enumerate(zip(names, self.header['data'])):
+            value = np.asarray(samples[name].value)
+            if value.shape[1:] != tuple(column['shape']):
+                raise ValueError('cannot append {} with shape {} to store {} (expected per-point shape {})'.format(name, value.shape[1:], self.dirname, column['shape']))
+            value = np.ascontiguousarray(value, dtype=column['dtype'])
+            fn = self._get_column_fn(icolumn)
+            with open(fn, 'ab') as file:
+                file.truncate(size * self._get_itemsize(column))  # remove incomplete points, if any
+                file.write(value.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+
+    def load(self, start=None, stop=None, mmap=True):
+        """
+        Return samples in store.
+
+        Parameters
+        ----------
+        start : int, default=None
+            Index of first point to read. Can be negative, e.g. -100 to read the last 100 points.
+
+        stop : int, default=None
+            Index of last point (excluded) to read.
+
+        mmap : bool, default=True
+            If ``True``, arrays are (copy-on-write) memory maps, i.e. only read from disk when accessed;
+            else they are loaded in memory.
+
+        Returns
+        -------
+        samples : Samples
+        """
+        if self.header is None:
+            return Samples()
+        start, stop, _ = slice(start, stop).indices(self.size)
+        size = max(stop - start, 0)
+        state = {name: value for name, value in self.header.items() if name != 'data'}
+        cls = utils.import_class(*state.pop('__class__', utils.serialize_class(Samples)))
+        state['data'] = []
+        for icolumn, column in enumerate(self.header['data']):
+            shape = (size,) + tuple(column['shape'])
+            itemsize = self._get_itemsize(column)
+            if not size:
+                value = np.empty(shape, dtype=column['dtype'])
+            elif mmap:
+                value = np.memmap(self._get_column_fn(icolumn), dtype=column['dtype'], mode='c', offset=start * itemsize, shape=shape)
+            else:
+                with open(self._get_column_fn(icolumn), 'rb') as file:
+                    file.seek(start * itemsize)
+                    value = np.fromfile(file, dtype=column['dtype'], count=int(np.prod(shape, dtype='i8'))).reshape(shape)
+            state['data'].append({'value': value, 'param': column['param'], 'derivs': column['derivs']})
+        return cls.from_state(state)
+
+    def lookup(self, samples, params=None):
+        """
+        Return mask of input samples (flattened) that are already in store.
+
+        Parameters
+        ----------
+        samples : Samples
+            Samples to look up.
+
+        params : list, default=None
+            Parameters to use to match samples, see :meth:`Samples.match`. Defaults to all parameters of ``samples`` that are not derived.
+
+        Returns
+        -------
+        mask : array
+            Boolean array, ``True`` if point is in store.
+        """
+        samples = samples.ravel()
+        mask = np.zeros(samples.size, dtype='?')
+        if self.size and samples.size:
+            if params is None: params = samples.names(derived=False)
+            mask[self.load().ravel().match(samples, params=params)[0][0]] = True
+        return mask
@@ -32,9 +32,9 @@ def test_misc():
     pb.update(prior=ParameterPrior(dist='norm', loc=1.))
     pb = Parameter.from_state(pb.__getstate__())
     chain['logposterior'] = np.zeros(chain.shape, dtype='f8')
-    for ff in ['chain.npy', 'chain.npz']:
+    for ff, columnar in [('chain.npy', False), ('chain.npz', False), ('chain_columns', True)]:
         fn = os.path.join(chain_dir, ff)
-        chain.save(fn)
+        chain.save(fn, columnar=columnar)
         chain2 = Chain.load(fn)
         assert chain2.params() == chain.params()
         assert chain2 == chain
@@ -88,6 +88,24 @@ def test_stats():
     assert diagnostics.gelman_rubin(chains, ['like.a'], method='eigen').shape == (1,)
     assert np.ndim(diagnostics.integrated_autocorrelation_time(chains, 'like.a')) == 0
     assert diagnostics.geweke(chains, params=['like.a'] * 2, first=0.25, last=0.75).shape == (2, len(chains))
+    assert np.allclose(diagnostics.geweke(chains, params=params)[1], diagnostics.geweke(chains, params='like.b'))
+    assert np.allclose(diagnostics.autocorrelation(chains, params=params)[2], diagnostics.autocorrelation(chains, params='like.c'))
+    chains = [chain[:, iwalker] for iwalker in range(chain.shape[1])]
+    iact = diagnostics.IncrementalAutocorrelation(params, max_lag=len(chain))
+    for start, stop in [(0, 100), (100, 1000), (1000, len(chain))]:
+        iact.update([chain[start:stop] for chain in chains])
+    assert np.allclose(iact.autocorrelation(), diagnostics.autocorrelation(chains, params=params))
+    assert np.allclose(iact.integrated_autocorrelation_time(check_valid='ignore'), diagnostics.integrated_autocorrelation_time(chains, params=params, check_valid='ignore'))
+    running = diagnostics.RunningCovariance(params)
+    running.update(chains[0][:100])
+    running.update(chains[0][100:200])
+    running.update(chains[0][:50], remove=True)
+    assert np.allclose(running.covariance(), chains[0][50:200].covariance(params))
+    running = [diagnostics.RunningCovariance(params).update_window(chain, start=10, stop=200) for chain in chains]
+    running = [run.update_window(chain, start=100, stop=1000) for run, chain in zip(running, chains)]
+    assert np.allclose(sum(running).covariance(), Chain.concatenate([chain[100:1000] for chain in chains]).covariance(params))
+    for method in ['eigen', 'diag']:
+        assert np.allclose(diagnostics.gelman_rubin(running, method=method), diagnostics.gelman_rubin([chain[100:1000] for chain in chains], params, method=method))
     print(chain.to_stats(tablefmt='latex_raw'))
     print(chain.to_stats(tablefmt='list_latex'))
     assert isinstance(chain.to_stats(tablefmt='list')[0], list)
@@ -185,6 +203,31 @@ def test_solved():
     print(chain.sample_solved().to_stats(tablefmt='pretty'))
 
 
+def test_store():
+    import shutil
+    from desilike.samples import SampleStore, load_source
+
+    store_dir = os.path.join('_chains', 'chain_store')
+    shutil.rmtree(store_dir, ignore_errors=True)
+    params = ['like.a', 'like.b', 'like.c', 'like.d']
+    chain = get_chain(params, nwalkers=4, size=100)[-1]
+    store = SampleStore(store_dir)
+    store.append(chain[:60])
+    store.append(chain[60:])
+    assert store.size == 100
+    chain2 = Chain.load(store_dir)
+    assert isinstance(chain2, Chain) and chain2._loglikelihood == 'LRG.loglikelihood'
+    assert chain2 == chain
+    chain2 = load_source(store_dir, burnin=0.5)[0]
+    assert chain2 == chain[50:]
+    chain2 = load_source(store_dir, burnin=0.5, tail=10)[0]
+    assert chain2 == chain[-10:]
+    # Incomplete write
+    with open(os.path.join(store_dir, 'data.0.bin'), 'ab') as file:
+        file.write(b'abc')
+    assert SampleStore(store_dir).size == 100
+
+
 def test_cholesky():
     ndim = 4
     cov = np.random.uniform(size=(ndim, ndim))
@@ -206,4 +249,5 @@ if __name__ == '__main__':
     test_misc()
     test_stats()
     test_solved()
+    test_store()
     # test_cholesky()
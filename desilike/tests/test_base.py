@@ -294,6 +294,192 @@ def test_vmap():
             print(toret)
 
 
+def test_batch():
+
+    from desilike import LikelihoodFisher, vmap
+
+    params = {'a': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}, 'ref': {'dist': 'norm', 'loc': 0., 'scale': 1.}},
+              'b': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}, 'ref': {'dist': 'norm', 'loc': 0., 'scale': 1.}}}
+    likelihood = LikelihoodFisher(center=[0., 0.], params=params, hessian=-np.eye(2)).to_likelihood()
+    likelihood()
+    assert likelihood.runtime_info.pipeline.batchable
+
+    size = (4, 3)
+    params = {param.name: param.ref.sample(size=size, random_state=42) for param in likelihood.varied_params}
+    toret, derived = vmap(likelihood, return_derived=True)(params)
+    assert toret.shape == derived.shape == size
+    for index in np.ndindex(size):
+        assert np.allclose(likelihood({name: value[index] for name, value in params.items()}), toret[index])
+
+    for mpi_schedule in ['static', 'dynamic']:
+        toret2 = vmap(likelihood, backend='mpi', mpi_schedule=mpi_schedule, mpi_batch_size=2)(params)
+        if likelihood.mpicomm.rank == 0:
+            assert np.allclose(toret2, toret)
+
+
+def test_cache():
+
+    from desilike import LikelihoodFisher
+
+    params = {'a': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}},
+              'b': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}}}
+    likelihood = LikelihoodFisher(center=[0., 0.], params=params, hessian=-np.eye(2)).to_likelihood()
+    likelihood.runtime_info.cache_size = 2
+    ref = [likelihood(a=a) for a in [0.1, 0.2]]
+    monitor = likelihood.runtime_info.monitor
+    nmisses = monitor.count('misses')
+    assert np.allclose(likelihood(a=0.1), ref[0])
+    assert monitor.count('hits') == 1 and monitor.count('misses') == nmisses
+    likelihood(a=0.3)  # 0.2 is least recently used, removed from cache
+    assert np.allclose(likelihood(a=0.2), ref[1])
+    assert monitor.count('hits') == 1 and monitor.count('misses') == nmisses + 2
+
+
+def test_slow_cache():
+
+    from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, DirectPowerSpectrumTemplate
+
+    theory = KaiserTracerPowerSpectrumMultipoles(template=DirectPowerSpectrumTemplate(z=0.5))
+    theory()
+    pipeline = theory.runtime_info.pipeline
+    slow = pipeline.set_slow_cache(['b1', 'sn0'])
+    cosmo = theory.template.cosmo
+    assert cosmo in slow and theory not in slow
+    # __getstate__ of the template is not its full state: no cache
+    assert theory.template not in slow and theory.template.runtime_info.cache_size == 0
+    ref = [theory(h=h, b1=1.).copy() for h in [0.68, 0.7]]
+    monitor = cosmo.runtime_info.monitor
+    nhits, nmisses = monitor.count('hits'), monitor.count('misses')
+    for b1 in [1.2, 1.4]:  # e.g. dragging
+        for h in [0.68, 0.7]:
+            theory(h=h, b1=b1)
+    assert monitor.count('hits') == nhits + 4 and monitor.count('misses') == nmisses
+    for h, power in zip([0.68, 0.7], ref):
+        assert np.allclose(theory(h=h, b1=1.), power)
+
+
+def test_profile_report():
+
+    from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
+
+    theory = KaiserTracerPowerSpectrumMultipoles(template=ShapeFitPowerSpectrumTemplate(z=0.5))
+    theory()
+    pipeline = theory.runtime_info.pipeline
+    pipeline.reset_monitor()
+    for b1 in [1., 1.2, 1.4]:
+        theory(b1=b1)
+    theory(b1=1.4)
+    monitor = theory.template.runtime_info.monitor
+    assert monitor.count('calls') == 4 and monitor.count('skips') == 4
+    assert theory.runtime_info.monitor.counter == 3 and theory.runtime_info.monitor.get('time', average=None).size == 3
+    report = pipeline.profile_report(percentiles=(50, 95))
+    assert 'ShapeFitPowerSpectrumTemplate' in report and 'p95[ms]' in report
+
+
+def test_precision_factor():
+
+    from desilike.likelihoods.base import chi2, chi2_factor, precision_factor
+
+    rng = np.random.RandomState(seed=42)
+    sizes = [4, 6]
+    blocks = []
+    for size in sizes:
+        mat = rng.uniform(-1., 1., size=(size, size))
+        blocks.append(mat.dot(mat.T) + size * np.eye(size))
+    precision = np.zeros((sum(sizes),) * 2, dtype='f8')
+    precision[:4, :4], precision[4:, 4:] = blocks
+    flatdiff = rng.normal(size=(3, sum(sizes)))
+    ref = chi2(flatdiff, precision)
+    factors = precision_factor(precision, sizes=sizes)
+    assert len(factors) == 2
+    assert np.allclose(sum(chi2_factor(flatdiff[..., sl], factor) for sl, factor in factors), ref)
+    precision[0, -1] = precision[-1, 0] = 0.1
+    factors = precision_factor(precision, sizes=sizes)
+    assert len(factors) == 1
+    assert np.allclose(chi2_factor(flatdiff, factors[0][1]), chi2(flatdiff, precision))
+    # Singular (positive semi-definite) precision
+    deriv = rng.normal(size=(1, sum(sizes)))
+    precision = blocks[1] - blocks[1].dot(deriv[:, 4:].T).dot(deriv[:, 4:].dot(blocks[1])) / deriv[:, 4:].dot(blocks[1]).dot(deriv[:, 4:].T)
+    factors = precision_factor(precision)
+    assert np.allclose(chi2_factor(flatdiff[..., 4:], factors[0][1]), chi2(flatdiff[..., 4:], precision))
+    factors = precision_factor(np.diag(blocks[0]))
+    assert np.allclose(chi2_factor(flatdiff[..., :4], factors[0][1]), chi2(flatdiff[..., :4], np.diag(blocks[0])))
+    # Not positive semi-definite
+    import pytest
+    precision = np.diag([1., -1.])
+    with pytest.warns(UserWarning):
+        precision_factor(precision)
+    with pytest.raises(np.linalg.LinAlgError):
+        precision_factor(precision, check_valid='raise')
+    # Factors are recomputed when a new precision matrix is set
+    from desilike import LikelihoodFisher
+    likelihood = LikelihoodFisher(center=[0., 0.], params=['a', 'b'], hessian=-np.eye(2)).to_likelihood()
+    likelihood(a=1., b=0.)
+    assert np.allclose(likelihood.loglikelihood, -0.5)
+    factors = likelihood.precision_factor
+    assert likelihood.precision_factor is factors  # cached
+    likelihood.precision = 4. * np.eye(2)
+    assert likelihood.precision_factor is not factors
+    likelihood(a=2., b=0.)
+    assert np.allclose(likelihood.loglikelihood, -0.5 * 4. * 2.**2)
+
+
+def test_compile():
+
+    from desilike import LikelihoodFisher, vmap
+    from desilike.jax import jax, set_compilation_cache
+
+    names = ['jax_compilation_cache_dir', 'jax_persistent_cache_min_compile_time_secs', 'jax_persistent_cache_min_entry_size_bytes']
+    bak = {name: getattr(jax.config, name) for name in names if hasattr(jax.config, name)}
+    set_compilation_cache('_tests/jax_cache')
+    try:
+        params = {'a': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}, 'ref': {'dist': 'norm', 'loc': 0., 'scale': 1.}},
+                  'b': {'value': 0., 'prior': {'dist': 'norm', 'loc': 0., 'scale': 10.}, 'ref': {'dist': 'norm', 'loc': 0., 'scale': 1.}}}
+        likelihood = LikelihoodFisher(center=[0., 0.], params=params, hessian=-np.eye(2)).to_likelihood()
+        pipeline = likelihood.runtime_info.pipeline
+        pipeline.compile(batch_sizes=[1, 4])
+        params = {param.name: param.ref.sample(size=4, random_state=42) for param in likelihood.varied_params}
+        compiled = pipeline.get_compiled(params)
+        assert compiled is not None
+        assert pipeline.get_compiled({name: value[:3] for name, value in params.items()}) is None
+        (toret, derived), errors = compiled(params)
+        assert not errors
+        assert np.allclose(toret, vmap(likelihood)(params))
+    finally:  # compilation cache settings are global
+        for name, value in bak.items():
+            jax.config.update(name, value)
+
+
+def test_solve_linear():
+
+    from desilike.observables.galaxy_clustering import TracerPowerSpectrumMultipolesObservable
+    from desilike.likelihoods import ObservablesGaussianLikelihood
+    from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles
+
+    def get_likelihood():
+        theory = KaiserTracerPowerSpectrumMultipoles()
+        for param in theory.params.select(basename=['sn*']):
+            param.update(derived='.marg')
+        observable = TracerPowerSpectrumMultipolesObservable(klim={0: [0.05, 0.2, 0.01], 2: [0.05, 0.2, 0.01]},
+                                                             data='_pk/data.npy', covariance='_pk/mock_*.npy',
+                                                             theory=theory)
+        return ObservablesGaussianLikelihood(observables=[observable])
+
+    likelihood, reference = get_likelihood(), get_likelihood()
+    monitor = likelihood.runtime_info.monitor
+    likelihood(b1=1.5)
+    assert likelihood.fisher.linear
+    assert 'b1' not in likelihood.fisher.depends  # derivatives w.r.t. shot noise do not depend on b1
+    assert (monitor.count('solve_hits'), monitor.count('solve_misses')) == (0, 1)
+    for ib1, b1 in enumerate([1.6, 1.8]):
+        loglikelihood = likelihood(b1=b1)  # derivatives and projected precision from cache
+        assert (monitor.count('solve_hits'), monitor.count('solve_misses')) == (ib1 + 1, 1)
+        reference(b1=1.5)
+        reference.fisher.cache = (None, None)
+        assert np.allclose(reference(b1=b1), loglikelihood)  # without cache
+        assert reference.runtime_info.monitor.count('solve_hits') == 0
+
+
 if __name__ == '__main__':
 
     setup_logging()
@@ -305,4 +491,10 @@ if __name__ == '__main__':
     #test_copy()
     #test_cosmo()
     #test_install()
-    test_vmap()
+    #test_vmap()
+    #test_batch()
+    #test_cache()
+    test_compile()
+    #test_slow_cache()
+    #test_profile_report()
+    #test_solve_linear()
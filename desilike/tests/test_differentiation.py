@@ -124,6 +124,51 @@ def test_differentiation():
     print(diff(sn0=50.)['power'])
 
 
+def test_sparse_grid():
+
+    from desilike.differentiation import deriv_grid, sparse_deriv_grid
+    grids = [(np.linspace(-2., 2., 5), np.array([2, 1, 0, 1, 2]), 2)] * 3
+
+    def is_needed(orders, total_order=2):
+        return sum(orders) <= total_order
+
+    deriv = deriv_grid(grids)
+    sparse = sparse_deriv_grid(grids, is_needed)
+    assert set(map(tuple, sparse)) == set(map(tuple, deriv))
+    sparse = sparse_deriv_grid(grids, lambda orders: is_needed(orders, total_order=1))
+    assert len(sparse) == 1 + 3 * 2
+
+    from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
+    from desilike import Differentiation
+    theory = KaiserTracerPowerSpectrumMultipoles(template=ShapeFitPowerSpectrumTemplate(z=1.4))
+    theory.init.params['power'] = {'derived': True}
+    theory()
+    diff = Differentiation(theory, method='finite', order=3)
+    sdiff = Differentiation(theory, method='finite', order=3, total_order=3, cross_order={'*': 2, 'b1': 3})
+    assert len(sdiff._grid_samples) < len(diff._grid_samples)
+    power, spower = diff()['power'], sdiff()['power']
+    for deriv in spower.derivs:
+        assert len(deriv) == 1 or deriv.total() <= 2  # cross_order is the minimum for both parameters
+        assert np.allclose(spower[deriv], power[deriv])
+
+
+def test_batch():
+
+    from desilike.theories.galaxy_clustering import KaiserTracerPowerSpectrumMultipoles, ShapeFitPowerSpectrumTemplate
+    from desilike import Differentiation
+    theory = KaiserTracerPowerSpectrumMultipoles(template=ShapeFitPowerSpectrumTemplate(z=1.4))
+    theory.init.params['power'] = {'derived': True}
+    theory()
+    diff = Differentiation(theory, method='auto', order=2)
+    power = diff()['power']
+    assert all(batch_calculate is not None for batch_calculate in diff._batch_calculate.values())
+    assert isinstance(np.asarray(theory.power), np.ndarray)  # no jax tracer left
+    diff._batch_calculate = {key: None for key in diff._batch_calculate}  # point-by-point calculation
+    ref = diff()['power']
+    for deriv in ref.derivs:
+        assert np.allclose(power[deriv], ref[deriv])
+
+
 def test_solve():
 
     from desilike.likelihoods import ObservablesGaussianLikelihood
@@ -520,6 +565,8 @@ if __name__ == '__main__':
     setup_logging()
     #test_misc()
     #test_differentiation()
+    #test_sparse_grid()
+    #test_batch()
     #test_solve()
     test_fisher_galaxy()
     #test_fisher_cmb()
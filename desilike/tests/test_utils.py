@@ -65,6 +65,10 @@ def test_task_manager():
         for task in tm.iterate(range(10)):
             print(tm.basecomm.rank, task)
 
+    for schedule in ['static', 'dynamic']:
+        with TaskManager(nprocs_per_task=1, schedule=schedule) as tm:
+            assert np.allclose(tm.map(lambda x: x**2, range(10)), np.arange(10)**2)
+
 
 if __name__ == '__main__':
 
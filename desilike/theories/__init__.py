@@ -1 +1 @@
-from .primordial_cosmology import Cosmoprimo
\ No newline at end of file
+from .primordial_cosmology import Cosmoprimo, TabulatedCosmoprimo
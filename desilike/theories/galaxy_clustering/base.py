@@ -48,7 +48,7 @@ class BaseTheoryCorrelationFunctionFromPowerSpectrumMultipoles(BaseTheoryCorrela
     """Base class for theory correlation function from power spectrum multipoles."""
     _initialize_with_namespace = True
 
-    def initialize(self, s=None, power=None, interp_order=1, **kwargs):
+    def initialize(self, s=None, power=None, interp_order=1, fftlog_rtol=1e-6, **kwargs):
         if s is None: s = np.linspace(20., 200, 101)
         self.s = np.array(s, dtype='f8')
         self.interp_order = {'linear': 1, 'cubic': 3}.get(interp_order, interp_order)
@@ -59,22 +59,41 @@ class BaseTheoryCorrelationFunctionFromPowerSpectrumMultipoles(BaseTheoryCorrela
             from .full_shape import KaiserTracerPowerSpectrumMultipoles
             power = KaiserTracerPowerSpectrumMultipoles()
         self.power = power
-        self.k = np.logspace(-4., 3., 2048)
         self.power.init.update(**kwargs)
         kin = self.power.init.get('k', None)
+        kmin, kmax, nk = 1e-4, 1e3, 2048
         # Important to have high enough sampling, otherwise wiggles can be seen at small s
-        if kin is None: self.kin = np.geomspace(self.k[0], 0.6, int(300. / self.interp_order + 0.5))  # kmax = 1. may be better
+        if kin is None: self.kin = np.geomspace(kmin, 0.6, int(300. / self.interp_order + 0.5))  # kmax = 1. may be better
         else: self.kin = np.array(kin, dtype='f8')
         self.power.init['k'] = self.kin
+        sigma_damp = 10.
+        if fftlog_rtol is not None:
+            # Shrink the FFTlog grid, keeping the same log-spacing:
+            # at low k, a factor 10 margin w.r.t. the largest s; at high k, up to the point where high-k damping is fftlog_rtol
+            dlogk = np.log(kmax / kmin) / (nk - 1)
+            kmin = max(kmin, 0.1 / np.max(self.s))
+            kmax = min(kmax, max(self.kin[-1] * (1. + sigma_damp * np.sqrt(2. * np.log(1. / fftlog_rtol))), 10. / np.min(self.s)))
+            nk = int(np.ceil(np.log(kmax / kmin) / dlogk)) + 1
+            nk += nk % 2
+        self.k = np.geomspace(kmin, kmax, nk)
         mask = self.k > self.kin[-1]
         self.logk_high = np.log10(self.k[mask] / self.kin[-1])
-        self.damp_high = np.exp(-(self.k[mask] / self.kin[-1] - 1.)**2 / (2. * (10.)**2))
+        self.damp_high = np.exp(-(self.k[mask] / self.kin[-1] - 1.)**2 / (2. * sigma_damp**2))
         #self.k_high = self.k[mask] / self.kin[-1]
         #self.damp = np.exp(-(self.k / 10.)**2)
         self.k_mid = self.k[~mask]
+        # Interpolation is linear in the input power spectrum: precompute the (banded) interpolation matrix
+        matrix = np.asarray(interp1d(np.log10(self.k_mid), np.log10(self.kin), np.eye(self.kin.size, dtype='f8'), method=self.interp_order))
+        self.interp_mid = utils.sparsify_matrix(matrix, max_density=1.)
         self.ells = self.power.ells
         from cosmoprimo import PowerToCorrelation
         self.fftlog = PowerToCorrelation(self.k, ell=self.ells, q=0, lowring=True)
+        # Linear interpolation from FFTlog output separations (which depend on ell) to s
+        sfft = np.asarray(self.fftlog(np.zeros((len(self.ells), self.k.size), dtype='f8'))[0])
+        sfft = np.broadcast_to(sfft, (len(self.ells), sfft.shape[-1]))
+        interp_s = [utils.sparsify_matrix(utils.matrix_lininterp(ss, self.s).T, max_density=1.) for ss in sfft]
+        nnz = max(indices.shape[-1] for indices, values in interp_s)
+        self.interp_s = tuple(np.array([np.pad(array, [(0, 0), (0, nnz - array.shape[-1])]) for array in arrays]) for arrays in zip(*interp_s))
         self.set_params()
 
     def set_params(self):
@@ -126,14 +145,15 @@ class BaseTheoryCorrelationFunctionFromPowerSpectrumMultipoles(BaseTheoryCorrela
     """
     @jit(static_argnums=[0])
     def get_corr(self, power):  # least terrible solution, others fail when pk2[-2] ~ 0 and pk2[-1] < 0
-        tmp = []
-        for pk in power:
-            slope_high = (pk[-1] - pk[-2]) / np.log10(self.kin[-1] / self.kin[-2])
-            interp = interp1d(np.log10(self.k_mid), np.log10(self.kin), pk, method=self.interp_order)
-            tmp.append(jnp.concatenate([interp, (pk[-1] + slope_high * self.logk_high) * self.damp_high], axis=-1))
-            #tmp.append(jnp.concatenate([interp, (pk[-1] + slope_high * self.logk_high)], axis=-1) * self.damp)
-        s, corr = self.fftlog(jnp.vstack(tmp))
-        return jnp.array([jnp.interp(self.s, ss, cc) for ss, cc in zip(s, corr)])
+        # power of shape (..., len(ells), len(kin)), with optional batch dimensions; all transformed in one FFTlog call
+        power = jnp.asarray(power)
+        slope_high = (power[..., -1:] - power[..., -2:-1]) / np.log10(self.kin[-1] / self.kin[-2])
+        interp = utils.sparse_dot(self.interp_mid, power)
+        tmp = jnp.concatenate([interp, (power[..., -1:] + slope_high * self.logk_high) * self.damp_high], axis=-1)
+        #tmp = jnp.concatenate([interp, (power[..., -1:] + slope_high * self.logk_high)], axis=-1) * self.damp
+        s, corr = self.fftlog(tmp)
+        indices, values = self.interp_s
+        return jnp.sum(values * corr[..., np.arange(len(self.ells))[:, None, None], indices], axis=-1)
 
     def calculate(self):
         self.corr = self.get_corr(self.power.power)
@@ -190,6 +210,63 @@ class BaseTheoryCorrelationFunctionFromPowerSpectrumMultipoles(BaseTheoryCorrela
         return fig
 
 
+class ProjectionToPoles(object):
+    r"""
+    Projection of wedges, sampled on a :math:`\mu`-grid, onto Legendre multipoles.
+    Legendre polynomials and :math:`\mu`-integration weights are precomputed as a single tensor :attr:`wmu`, of shape ``(len(ells), len(mu))``.
+    Use :meth:`get` to get a cached instance, shared between all theories (e.g. different tracers and redshifts) with the same projection settings.
+    """
+    _instances = {}
+
+    def __init__(self, mu=20, method='leggauss', ells=(0, 2, 4)):
+        r"""
+        Initialize projection.
+
+        Parameters
+        ----------
+        mu : int, array, default=20
+            Number of :math:`\mu`-bins in :math:`[0, 1]` or, if ``method`` is 'trapz', array of :math:`\mu`.
+
+        method : str, default='leggauss'
+            Integration method, 'leggauss' or 'trapz'.
+
+        ells : tuple, default=(0, 2, 4)
+            Output multipoles.
+        """
+        self.ells = tuple(ells)
+        self.mu, wmu = utils.weights_mu(mu, method=method)
+        self.mu, wmu = np.asarray(self.mu), np.asarray(wmu)
+        self.wmu = np.array([wmu * (2 * ell + 1) * special.legendre(ell)(self.mu) for ell in self.ells])
+
+    @classmethod
+    def get(cls, mu=20, method='leggauss', ells=(0, 2, 4)):
+        """Return projection for input settings (see :meth:`__init__`), from cache if already computed."""
+        key = (tuple(np.ravel(mu).tolist()) if np.ndim(mu) else int(mu), method, tuple(ells))
+        if key not in cls._instances:
+            cls._instances[key] = cls(mu=mu, method=method, ells=ells)
+        return cls._instances[key]
+
+    @jit(static_argnums=[0])
+    def __call__(self, pkmu):
+        """
+        Project ``pkmu`` onto multipoles.
+        ``pkmu`` is of shape ``(..., nk, nmu)`` (same for all multipoles), with an optional axis of size 1 or ``len(ells)`` before ``nk``;
+        output is of shape ``(..., len(ells), nk)``.
+        """
+        return project_to_poles(pkmu, self.wmu)
+
+
+@jit
+def project_to_poles(pkmu, wmu):
+    r"""Project ``pkmu`` onto multipoles, given Legendre polynomials times :math:`\mu`-weights ``wmu``, see :class:`ProjectionToPoles`."""
+    pkmu = jnp.asarray(pkmu)
+    if pkmu.ndim == 2:
+        return jnp.einsum('km,lm->lk', pkmu, wmu)
+    if pkmu.shape[-3] == 1:
+        return jnp.einsum('...km,lm->...lk', pkmu[..., 0, :, :], wmu)
+    return jnp.einsum('...lkm,lm->...lk', pkmu, wmu)
+
+
 class BaseTheoryPowerSpectrumMultipolesFromWedges(BaseTheoryPowerSpectrumMultipoles):
 
     """Base class for theory correlation function multipoles computed from theory power spectrum multipoles."""
@@ -200,12 +277,14 @@ class BaseTheoryPowerSpectrumMultipolesFromWedges(BaseTheoryPowerSpectrumMultipo
 
     def set_k_mu(self, k, mu=20, method='leggauss', ells=(0, 2, 4)):
         self.k = np.asarray(k, dtype='f8')
-        self.mu, wmu = utils.weights_mu(mu, method=method)
-        self.wmu = np.array([wmu * (2 * ell + 1) * special.legendre(ell)(self.mu) for ell in ells])
+        self.projection = ProjectionToPoles.get(mu=mu, method=method, ells=ells)
+        self.mu, self.wmu = self.projection.mu, self.projection.wmu
 
-    @jit(static_argnums=[0])
     def to_poles(self, pkmu):
-        return jnp.sum(pkmu * self.wmu[:, None, :], axis=-1)
+        projection = getattr(self, 'projection', None)
+        if projection is None:  # e.g. calculator restored from its state, with wmu only
+            return project_to_poles(pkmu, self.wmu)
+        return projection(pkmu)
 
 
 @jit
@@ -4,6 +4,8 @@ from scipy import optimize
 from cosmoprimo import Cosmology, CosmologyError, constants  # constants is imported by e.g. theories.galaxy_clustering.base
 
 from desilike.base import BaseCalculator
+from desilike.jax import numpy as jnp
+from desilike.jax import interp1d
 
 
 class BasePrimordialCosmology(BaseCalculator):
@@ -83,6 +85,7 @@ class Cosmoprimo(BasePrimordialCosmology):
     """Primordial cosmology calculation, based on :mod:`cosmoprimo`."""
     config_fn = 'primordial_cosmology.yaml'
     _likelihood_catch_errors = (CosmologyError,)
+    _cache_state = True
 
     def initialize(self, fiducial=None, **kwargs):
         """
@@ -125,6 +128,12 @@ class Cosmoprimo(BasePrimordialCosmology):
     def get(self):
         return self.cosmo
 
+    def __getstate__(self):
+        state = {}
+        if 'cosmo' in self.__dict__:
+            state['cosmo'] = self.cosmo
+        return state
+
     def __getattr__(self, name):
         if 'cosmo' in self.__dict__:
             return get_from_cosmo(self.cosmo, name)
@@ -136,3 +145,166 @@ class Cosmoprimo(BasePrimordialCosmology):
     @classmethod
     def install(cls, installer):
         installer.pip('git+https://github.com/cosmodesi/cosmoprimo')
+
+
+class TabulatedCosmoprimo(BasePrimordialCosmology):
+    r"""
+    Primordial cosmology tabulated on fixed grids: background distances, :math:`r_{\mathrm{drag}}`, :math:`\sigma_{8}(z)` and linear power spectra.
+    Since its state only contains arrays, it can be emulated with :class:`~desilike.emulators.Emulator`, e.g.:
+
+    >>> emulator = Emulator(TabulatedCosmoprimo(fiducial='DESI'), engine=MLPEmulatorEngine())
+    >>> emulator.set_samples()
+    >>> emulator.fit()
+    >>> cosmo = emulator.to_calculator()
+    >>> template = DirectPowerSpectrumTemplate(z=1., cosmo=cosmo)
+
+    The (emulated) calculator implements the subset of the :class:`cosmoprimo.Cosmology` interface used by desilike's theories
+    (:meth:`get_background`, :meth:`get_thermodynamics`, :meth:`get_fourier`), with :mod:`jax` interpolation of the tables:
+    no :class:`cosmoprimo.Cosmology` instance is created when evaluating the emulated calculator.
+    """
+    _likelihood_catch_errors = (CosmologyError,)
+    _cache_state = True
+
+    def initialize(self, cosmo=None, fiducial=None, z=None, k=None, z_pk=None, of=('delta_cb', 'theta_cb'), **kwargs):
+        r"""
+        Initialize :class:`TabulatedCosmoprimo`.
+
+        Parameters
+        ----------
+        cosmo : Cosmoprimo, default=None
+            Cosmology calculator to tabulate. Defaults to ``Cosmoprimo(fiducial=fiducial, **kwargs)``.
+
+        fiducial : str, tuple, dict, cosmoprimo.Cosmology
+            Specifications for fiducial cosmology, see :meth:`Cosmoprimo.initialize`.
+
+        z : array, default=None
+            Redshifts where to tabulate background quantities. Defaults to ``np.linspace(0., 10., 121)``.
+
+        k : array, default=None
+            Wavenumbers (in :math:`h/\mathrm{Mpc}`) where to tabulate linear power spectra. Defaults to ``np.logspace(-4., 2., 300)``.
+
+        z_pk : array, default=None
+            Redshifts (at least 4) where to tabulate linear power spectra and :math:`\sigma_{8}(z)`. Defaults to ``np.linspace(0., 3., 31)``.
+
+        of : tuple, default=('delta_cb', 'theta_cb')
+            Perturbations for which to tabulate (auto and cross) power spectra and :math:`\sigma_{8}(z)`.
+
+        **kwargs : dict
+            Optionally, dictionary of parameters to update ``fiducial`` with, see :meth:`Cosmoprimo.initialize`.
+        """
+        self.z = np.linspace(0., 10., 121) if z is None else np.array(z, dtype='f8')
+        self.k = np.logspace(-4., 2., 300) if k is None else np.array(k, dtype='f8')
+        self.z_pk = np.linspace(0., 3., 31) if z_pk is None else np.array(z_pk, dtype='f8')
+        self.of = tuple(of)
+        if cosmo is None:
+            cosmo = Cosmoprimo(fiducial=fiducial, **kwargs)
+        self.cosmo = cosmo
+
+    @property
+    def _pairs(self):
+        return [(of1, of2) for iof, of1 in enumerate(self.of) for of2 in self.of[iof:]]
+
+    def calculate(self):
+        ba, fo = self.cosmo.get_background(), self.cosmo.get_fourier()
+        for name in ['h', 'Omega0_m', 'n_s', 'rs_drag']:
+            setattr(self, name, getattr(self.cosmo, name))
+        for name in ['efunc', 'comoving_radial_distance', 'comoving_angular_distance']:
+            setattr(self, name + '_table', getattr(ba, name)(self.z))
+        self.sigma8_table = np.array([fo.sigma8_z(self.z_pk, of=of) for of in self.of])
+        self.pk_table = np.array([fo.pk_interpolator(of=pair, non_linear=False)(self.k, z=self.z_pk) for pair in self._pairs])
+
+    def get(self):
+        return self
+
+    def __getstate__(self):
+        state = {}
+        for name in ['z', 'k', 'z_pk', 'of', 'h', 'Omega0_m', 'n_s', 'rs_drag', 'efunc_table', 'comoving_radial_distance_table', 'comoving_angular_distance_table', 'sigma8_table', 'pk_table']:
+            state[name] = getattr(self, name)
+        return state
+
+    def _interp_z(self, z, table, zgrid=None):
+        if zgrid is None: zgrid = self.z
+        return interp1d(jnp.asarray(z, dtype='f8'), zgrid, table, method='cubic')
+
+    def get_background(self):
+        """Return background section, i.e. this instance."""
+        return self
+
+    def get_thermodynamics(self):
+        """Return thermodynamics section, i.e. this instance."""
+        return self
+
+    def get_fourier(self):
+        """Return Fourier section, i.e. this instance."""
+        return self
+
+    def efunc(self, z):
+        r"""Function giving :math:`E(z)`, where the Hubble parameter is defined as :math:`H(z) = H_{0} E(z)`, unitless."""
+        return self._interp_z(z, self.efunc_table)
+
+    def hubble_function(self, z):
+        r"""Hubble function, in :math:`\mathrm{km}/\mathrm{s}/\mathrm{Mpc}`."""
+        return 100. * self.h * self.efunc(z)
+
+    def comoving_radial_distance(self, z):
+        r"""Comoving radial distance, in :math:`\mathrm{Mpc}/h`."""
+        return self._interp_z(z, self.comoving_radial_distance_table)
+
+    def comoving_angular_distance(self, z):
+        r"""Comoving angular distance, in :math:`\mathrm{Mpc}/h`."""
+        return self._interp_z(z, self.comoving_angular_distance_table)
+
+    def angular_diameter_distance(self, z):
+        r"""Proper angular diameter distance, in :math:`\mathrm{Mpc}/h`."""
+        return self.comoving_angular_distance(z) / (1. + jnp.asarray(z))
+
+    def luminosity_distance(self, z):
+        r"""Luminosity distance, in :math:`\mathrm{Mpc}/h`."""
+        return self.comoving_angular_distance(z) * (1. + jnp.asarray(z))
+
+    def pk_interpolator(self, non_linear=False, of='delta_m', **kwargs):
+        """
+        Return linear power spectrum interpolator.
+
+        Parameters
+        ----------
+        non_linear : bool, default=False
+            Only linear power spectrum is tabulated.
+
+        of : str, tuple, default='delta_m'
+            Perturbed quantities, among :attr:`of`.
+
+        **kwargs : dict
+            Optional arguments for :class:`cosmoprimo.PowerSpectrumInterpolator2D`.
+
+        Returns
+        -------
+        interp : PowerSpectrumInterpolator2D
+        """
+        from cosmoprimo.interpolator import PowerSpectrumInterpolator2D
+        if non_linear:
+            raise ValueError('only linear power spectrum is tabulated')
+        of = (of, of) if isinstance(of, str) else tuple(of)
+        pairs = self._pairs
+        for pair in [of, of[::-1]]:
+            if pair in pairs:
+                return PowerSpectrumInterpolator2D(self.k, self.z_pk, self.pk_table[pairs.index(pair)], **kwargs)
+        raise ValueError('power spectrum of {} is not tabulated; available are {}'.format(of, pairs))
+
+    def sigma_rz(self, r, z, of='delta_m', **kwargs):
+        r"""Return the r.m.s. of ``of`` perturbations in sphere of :math:`r \mathrm{Mpc}/h`."""
+        return self.pk_interpolator(non_linear=False, of=of, **kwargs).sigma_rz(r, z)
+
+    def sigma8_z(self, z, of='delta_m'):
+        r"""Return the r.m.s. of ``of`` perturbations in sphere of :math:`8 \mathrm{Mpc}/h`."""
+        if of not in self.of:
+            raise ValueError('sigma8 of {} is not tabulated; available are {}'.format(of, self.of))
+        return self._interp_z(z, self.sigma8_table[self.of.index(of)], zgrid=self.z_pk)
+
+    def growth_rate(self, z):
+        r"""Growth rate :math:`f(z)`, as the ratio of :math:`\sigma_{8}(z)` of velocity divergence to density perturbations."""
+        for of in self.of:
+            theta = of.replace('delta', 'theta')
+            if of.startswith('delta') and theta in self.of:
+                return self.sigma8_z(z, of=theta) / self.sigma8_z(z, of=of)
+        raise ValueError('growth rate requires sigma8 of delta and theta perturbations; available are {}'.format(self.of))
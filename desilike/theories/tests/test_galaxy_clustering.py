@@ -10,6 +10,12 @@ def test_integ():
     topoles = BaseTheoryPowerSpectrumMultipolesFromWedges(mu=8)
     mu, wmu = topoles.mu, topoles.wmu
     assert np.isclose(np.sum(wmu), 1.)
+    pkmu = np.random.RandomState(seed=42).uniform(size=(3, 1, len(topoles.k), len(mu)))
+    assert np.allclose(topoles.to_poles(pkmu), np.sum(pkmu * wmu[:, None, :], axis=-1))
+    assert np.allclose(topoles.to_poles(pkmu[0, 0]), np.sum(pkmu[0, 0] * wmu[:, None, :], axis=-1))
+    assert BaseTheoryPowerSpectrumMultipolesFromWedges(mu=8).projection is topoles.projection
+    del topoles.projection  # e.g. emulated calculator, restored from state with wmu only
+    assert np.allclose(topoles.to_poles(pkmu), np.sum(pkmu * wmu[:, None, :], axis=-1))
     template = StandardPowerSpectrumTemplate()
     pk_trapz = KaiserTracerPowerSpectrumMultipoles(template=template, mu=100, method='trapz')()
     pk_leggauss = KaiserTracerPowerSpectrumMultipoles(template=template, mu=20, method='leggauss')()
@@ -1192,6 +1198,20 @@ def test_pk_to_xi():
     """
 
 
+def test_pk_to_xi_batch():
+    from desilike.theories.galaxy_clustering import KaiserTracerCorrelationFunctionMultipoles
+
+    theory = KaiserTracerCorrelationFunctionMultipoles(fftlog_rtol=None)
+    theory_adaptive = KaiserTracerCorrelationFunctionMultipoles()
+    assert theory_adaptive.k.size < theory.k.size
+    corr, corr_adaptive = theory(), theory_adaptive()
+    assert np.allclose(theory.s**2 * corr_adaptive, theory.s**2 * corr, rtol=0., atol=1e-3 * np.max(np.abs(theory.s**2 * corr)))
+    power = np.array([theory.power.power, 2. * theory.power.power])
+    corr = theory.get_corr(power)
+    assert corr.shape == (2,) + theory.corr.shape
+    assert np.allclose(corr[0], theory.corr) and np.allclose(corr[1], 2. * theory.corr)
+
+
 def test_ap_diff():
 
     from matplotlib import pyplot as plt
@@ -1703,6 +1723,7 @@ if __name__ == '__main__':
     #test_emulator_wigglesplit()
     #test_png()
     #test_pk_to_xi()
+    #test_pk_to_xi_batch()
     #test_ap_diff()
     #test_ptt()
     #test_freedom()
@@ -1,7 +1,7 @@
 import numpy as np
 
 from desilike import setup_logging
-from desilike.theories import Cosmoprimo
+from desilike.theories import Cosmoprimo, TabulatedCosmoprimo
 
 
 def test_omegak():
@@ -65,8 +65,36 @@ def test_parameterization():
     print(cosmo.runtime_info.pipeline.derived['sigma8_m'])
 
 
+def test_tabulated():
+    from desilike.emulators import Emulator, TaylorEmulatorEngine
+
+    cosmo = TabulatedCosmoprimo(fiducial='DESI')
+    cosmo()
+    fiducial = cosmo.cosmo.cosmo
+    z = np.linspace(0.1, 3., 10)
+    for name in ['efunc', 'comoving_radial_distance', 'comoving_angular_distance', 'luminosity_distance']:
+        assert np.allclose(getattr(cosmo, name)(z), getattr(fiducial, name)(z), rtol=1e-5)
+    assert np.allclose(cosmo.rs_drag, fiducial.rs_drag)
+    assert np.allclose(cosmo.get_fourier().sigma8_z(z, of='delta_cb'), fiducial.get_fourier().sigma8_z(z, of='delta_cb'), rtol=1e-5)
+    k = np.logspace(-3., 0., 20)
+    assert np.allclose(cosmo.get_fourier().pk_interpolator(of='delta_cb').to_1d(z=1.)(k), fiducial.get_fourier().pk_interpolator(of='delta_cb').to_1d(z=1.)(k), rtol=1e-4)
+
+    for param in cosmo.all_params:
+        if param.basename not in ['h', 'omega_cdm']: param.update(fixed=True)
+    emulator = Emulator(cosmo, engine=TaylorEmulatorEngine(order=2))
+    emulator.set_samples()
+    emulator.fit()
+    emulated = emulator.to_calculator()
+    params = {'h': 0.68, 'omega_cdm': 0.121}
+    cosmo(**params)
+    emulated(**params)
+    assert np.allclose(emulated.efunc(z), cosmo.efunc(z), rtol=1e-4)
+    assert np.allclose(emulated.growth_rate(z), cosmo.growth_rate(z), rtol=1e-3)
+
+
 if __name__ == '__main__':
 
     setup_logging()
     test_omegak()
-    #test_parameterization()
\ No newline at end of file
+    #test_parameterization()
+    #test_tabulated()
\ No newline at end of file
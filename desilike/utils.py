@@ -344,6 +344,9 @@ class BaseClass(object, metaclass=BaseMetaClass):
     @classmethod
     def load(cls, filename, fallback_class=None):
         filename = str(filename)
+        if os.path.isdir(filename):  # SampleStore
+            from desilike.samples.store import SampleStore
+            return SampleStore(filename).load()
         state = np.load(filename, allow_pickle=True)
         if (cls is BaseClass or fallback_class is not None):
             is_npz = filename.endswith('.npz')
@@ -657,6 +660,48 @@ def matrix_lininterp(xin, xout):
     return toret
 
 
+def sparsify_matrix(matrix, rtol=0., max_density=0.5):
+    """
+    Return sparse representation of 2D ``matrix``, in ELLPACK format:
+    for each row, the indices of (at most ``nnz``) non-zero columns and the corresponding values (zero-padded).
+
+    Parameters
+    ----------
+    matrix : array
+        2D array.
+
+    rtol : float, default=0.
+        Entries with absolute value less than or equal to ``rtol`` times the maximum absolute value of the row are considered zero.
+
+    max_density : float, default=0.5
+        If ``nnz`` is larger than ``max_density`` times the number of columns, return ``None``: dense product is more efficient.
+
+    Returns
+    -------
+    sparse : tuple, None
+        Tuple of indices and values, of shape ``(nrows, nnz)``, to be used with :func:`sparse_dot`.
+    """
+    matrix = np.asarray(matrix)
+    absmatrix = np.abs(matrix)
+    nonzero = absmatrix > rtol * np.max(absmatrix, axis=-1)[:, None]
+    nnz = max(np.max(np.sum(nonzero, axis=-1)), 1)
+    if nnz > max_density * matrix.shape[1]:
+        return None
+    indices = np.zeros((matrix.shape[0], nnz), dtype='i8')
+    values = np.zeros((matrix.shape[0], nnz), dtype=matrix.dtype)
+    for irow, mask in enumerate(nonzero):
+        index = np.flatnonzero(mask)
+        indices[irow, :index.size] = index
+        values[irow, :index.size] = matrix[irow, index]
+    return indices, values
+
+
+def sparse_dot(sparse, array):
+    """Return product of sparse matrix (output of :func:`sparsify_matrix`) with ``array`` of shape ``(..., ncols)``."""
+    indices, values = sparse
+    return jnp.sum(values * array[..., indices], axis=-1)
+
+
 def subspace(X, precision=None, npcs=None, chi2min=None, fweights=None, aweights=None):
     r"""
     Project input values ``X`` to a subspace.
@@ -742,10 +787,14 @@ class Monitor(BaseClass):
             mem.start() # restart monitoring
             ...
             dt = mem.get('time')  # elapsed time
+            dts = mem.get('time', average=None)  # elapsed time for each of the last (at most max_samples) data points
+            p90 = mem.percentile('time', 90)  # 90th percentile of elapsed time
+            mem.increment('hits')  # increment counter 'hits'
+            nhits = mem.count('hits')
             mem.reset()  # reset, i.e. forget about previous monitoring and start
 
     """
-    def __init__(self, quantities='time'):
+    def __init__(self, quantities='time', max_samples=1000):
         """
         Initialize monitor.
 
@@ -753,10 +802,14 @@ class Monitor(BaseClass):
         ----------
         quantities : str, default='time'
             Quantities to monitor: 'time', 'mem' (requires package psutil to be installed).
+
+        max_samples : int, default=1000
+            Number of last data points to keep, for :meth:`percentile`.
         """
         if not is_sequence(quantities):
             quantities = (quantities,)
         self.quantities = list(quantities)
+        self.max_samples = int(max_samples)
         self.reset()
 
     def time(self):
@@ -780,7 +833,10 @@ class Monitor(BaseClass):
         """Stop monitoring."""
         stop = {quantity: getattr(self, quantity)() for quantity in self.quantities}
         self._counter += 1
-        self._diffs = {quantity: stop[quantity] - self._start[quantity] + diff for quantity, diff in self._diffs.items()}
+        for quantity, diff in self._diffs.items():
+            diff = stop[quantity] - self._start[quantity]
+            self._diffs[quantity] += diff
+            self._samples[quantity].append(diff)
         self._start = stop
 
     @property
@@ -789,17 +845,40 @@ class Monitor(BaseClass):
         return self._counter
 
     def get(self, quantity, average=True):
-        """Return time series of quantity ('time' or 'mem'), or, if ``average`` is ``True``, its average."""
+        """
+        Return total of quantity ('time' or 'mem') or, if ``average`` is ``True``, its average;
+        if ``average`` is ``None``, return values for the last (at most :attr:`max_samples`) data points.
+        """
+        if average is None:
+            return np.array(self._samples[quantity], dtype='f8')
         if average:
             if self._counter == 0:
                 return np.nan
             return self._diffs[quantity] / self._counter
         return self._diffs[quantity]
 
+    def percentile(self, quantity, q):
+        """Return percentile(s) ``q`` (between 0 and 100) of quantity ('time' or 'mem') over the last (at most :attr:`max_samples`) data points."""
+        samples = self.get(quantity, average=None)
+        if not samples.size:
+            return np.full(np.shape(q), np.nan)
+        return np.percentile(samples, q)
+
+    def increment(self, name, value=1):
+        """Increment counter ``name`` (e.g. cache 'hits' or 'misses') by ``value``."""
+        self._counts[name] = self._counts.get(name, 0) + value
+
+    def count(self, name):
+        """Return value of counter ``name`` (0 if never incremented)."""
+        return self._counts.get(name, 0)
+
     def reset(self):
         """Reset, i.e. forget about previous monitoring and start."""
+        from collections import deque
         self._diffs = {quantity: 0. for quantity in self.quantities}
+        self._samples = {quantity: deque(maxlen=self.max_samples) for quantity in self.quantities}
         self._counter = 0
+        self._counts = {}
         self.start()
 
     def __enter__(self):
@@ -1049,10 +1128,11 @@ class TaskManager(BaseClass):
     The main function is ``iterate`` which iterates through a set of tasks,
     distributing the tasks in parallel over the available ranks.
 
-    Tasks are assigned deterministically, there is no manager process.
+    With ``schedule = 'static'``, tasks are assigned deterministically, there is no manager process.
+    With ``schedule = 'dynamic'``, rank 0 is a manager process, which sends tasks to workers as soon as they are idle.
     """
     @CurrentMPIComm.enable
-    def __init__(self, nprocs_per_task=1, use_all_nprocs=True, mpicomm=None):
+    def __init__(self, nprocs_per_task=1, use_all_nprocs=True, schedule='static', mpicomm=None):
         """
         Initialize :class:`TaskManager`.
 
@@ -1066,35 +1146,55 @@ class TaskManager(BaseClass):
             if `nprocs_per_task` does not divide the total number of processes
             evenly; default is `False`.
 
+        schedule : str, default='static'
+            'static' to split tasks evenly between workers beforehand.
+            'dynamic' to have rank 0 (which does not compute any task) send tasks one by one to idle workers;
+            this is better for load-balancing when task duration varies much.
+            'dynamic' falls back to 'static' if there is a single process.
+
         mpicomm : MPI communicator, default=None
             The global communicator that will be split so each worker
             has a subset of processes available; default is COMM_WORLD.
         """
         self.basecomm = mpicomm
+        self.schedule = str(schedule)
+        if self.schedule not in ['static', 'dynamic']:
+            raise ValueError('schedule must be one of ["static", "dynamic"], found {}'.format(self.schedule))
         self.worker = -1
-        if nprocs_per_task > self.basecomm.size:
-            raise ValueError('cannot attribute {:d} processes per task given {:d} total processes'.format(nprocs_per_task, self.basecomm.size))
+        # With dynamic scheduling, rank 0 is the manager
+        self._dynamic = self.schedule == 'dynamic' and self.basecomm.size > 1
+        offset = int(self._dynamic)
+        size, rank = self.basecomm.size - offset, self.basecomm.rank - offset
+        if nprocs_per_task > size:
+            raise ValueError('cannot attribute {:d} processes per task given {:d} total processes'.format(nprocs_per_task, size))
         if use_all_nprocs:
-            for isplit, split in enumerate(np.array_split(np.arange(self.basecomm.size), max(self.basecomm.size // nprocs_per_task, 1))):
-                if split[0] <= self.basecomm.rank <= split[-1]:
+            for isplit, split in enumerate(np.array_split(np.arange(size), max(size // nprocs_per_task, 1))):
+                if split[0] <= rank <= split[-1]:
                     self.worker = isplit
-                    self.self_worker_ranks = list(split)
+                    self.self_worker_ranks = list(split + offset)
         else:
-            for isplit in range(max(self.basecomm.size // nprocs_per_task, 1)):
+            for isplit in range(max(size // nprocs_per_task, 1)):
                 low, up = isplit * nprocs_per_task, (isplit + 1) * nprocs_per_task
-                if low <= self.basecomm.rank < up:
+                if low <= rank < up:
                     self.worker = isplit
-                    self.self_worker_ranks = list(range(low, up))
+                    self.self_worker_ranks = list(range(low + offset, up + offset))
+        if rank < 0:  # manager
+            self.self_worker_ranks = [self.basecomm.rank]
         self.nworkers = isplit + 1
         # split the comm between the workers
-        self.mpicomm = self.basecomm.Split(self.worker, 0)
-        if self.mpicomm.rank == 0:
-            self.log_info('Entering {} with {:d} workers.'.format(self.__class__.__name__, self.nworkers))
+        self.mpicomm = self.basecomm.Split(self.worker + offset, 0)
+        if self.mpicomm.rank == 0 and rank >= 0:
+            self.log_info('Entering {} with {:d} workers ({} scheduling).'.format(self.__class__.__name__, self.nworkers, self.schedule))
 
     @property
     def size(self):
         return self.nworkers
 
+    @property
+    def is_manager(self):
+        """Whether this process is the manager, distributing tasks (with dynamic scheduling)."""
+        return self._dynamic and self.basecomm.rank == 0
+
     def __enter__(self):
         """Enter task manager."""
         return self
@@ -1115,6 +1215,35 @@ class TaskManager(BaseClass):
         if self.mpicomm is not None:
             self.mpicomm.Free()
 
+    def _iterate_indices(self, size, tag=0):
+        # Yield indices of tasks to be computed by this worker
+        if not self._dynamic:
+            if self.worker >= 0:
+                yield from range(self.worker * size // self.nworkers, (self.worker + 1) * size // self.nworkers)
+            return
+        if self.is_manager:
+            status = mpi.Status()
+            itask, nworkers = 0, self.nworkers
+            while nworkers:
+                # Root of an idle worker requests a new task
+                self.basecomm.recv(source=mpi.ANY_SOURCE, tag=tag, status=status)
+                if itask < size:
+                    self.basecomm.send(itask, dest=status.Get_source(), tag=tag)
+                    itask += 1
+                else:
+                    self.basecomm.send(None, dest=status.Get_source(), tag=tag)  # no more tasks
+                    nworkers -= 1
+            return
+        while True:
+            itask = None
+            if self.mpicomm.rank == 0:
+                self.basecomm.send(None, dest=0, tag=tag)
+                itask = self.basecomm.recv(source=0, tag=tag)
+            itask = self.mpicomm.bcast(itask, root=0)
+            if itask is None:
+                break
+            yield itask
+
     def iterate(self, tasks):
         """
         Iterate through a series of tasks in parallel.
@@ -1130,13 +1259,14 @@ class TaskManager(BaseClass):
 
         Returns
         -------
-        tasks : list
+        tasks : list, iterator
             The individual items of `tasks`, iterated through in parallel.
+            With dynamic scheduling, an iterator that yields tasks as they are attributed to this worker.
         """
         tasks = list(tasks)
-        size = len(tasks)
-        start, stop = self.worker * size // self.nworkers, (self.worker + 1) * size // self.nworkers
-        return tasks[start:stop]
+        if not self._dynamic:
+            return [tasks[itask] for itask in self._iterate_indices(len(tasks))]
+        return (tasks[itask] for itask in self._iterate_indices(len(tasks)))
 
     def map(self, func, tasks):
         """
@@ -1163,8 +1293,13 @@ class TaskManager(BaseClass):
         results : list
             The list of the return values of ``function``.
         """
-        results = map(func, self.iterate(tasks))
-        results = self.mpicomm.allgather(results)
-        toret = []
-        for result in results: toret += result
-        return np.asarray(toret)
\ No newline at end of file
+        tasks = list(tasks)
+        results = []
+        for itask in self._iterate_indices(len(tasks)):
+            task = tasks[itask]
+            results.append((itask, func(*task) if isinstance(task, tuple) else func(task)))
+        if self.mpicomm.rank != 0: results = []  # results are the same for all ranks of a worker
+        toret = [None] * len(tasks)
+        for results in self.basecomm.allgather(results):
+            for itask, result in results: toret[itask] = result
+        return np.asarray(toret)